@@ -0,0 +1,335 @@
+# src/benchmarks.py
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import query_cache
+from data_ingestion import load_csv, load_json
+from dq_checks import run_dq_checks
+from feature_engineering import (
+    WRITE_BATCH_SIZE,
+    engineer_features,
+    load_raw_data,
+    register_all_features,
+    write_features_to_iceberg,
+)
+from local_backend import connect_local
+from synthetic_data import generate_dataset
+from transformations import load_dim_customer, load_fact_click_events
+
+# Tables the feature writer touches, in SQLite-compatible DDL
+FEATURE_TABLES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS feature_catalog (
+        feature_id INTEGER PRIMARY KEY,
+        feature_name VARCHAR
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS feature_engineered_iceberg (
+        customer_id INTEGER,
+        feature_id INTEGER,
+        feature_name VARCHAR,
+        feature_value FLOAT,
+        feature_date DATE,
+        created_at TIMESTAMP
+    );
+    """,
+]
+
+BENCH_FEATURES = ("days_since_signup", "days_since_last_activity")
+
+
+class LatencyCursor:
+    """Wraps a cursor and sleeps on every round trip to mimic warehouse network latency."""
+
+    def __init__(self, cursor, latency_ms):
+        self._cursor = cursor
+        self._latency = latency_ms / 1000.0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, params=None):
+        time.sleep(self._latency)
+        return self._cursor.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        time.sleep(self._latency)
+        return self._cursor.executemany(sql, seq_of_params)
+
+
+def make_features_long(n_customers, seed=42):
+    """Build a synthetic long-format frame shaped like engineer_features' output."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for feature_name in BENCH_FEATURES:
+        frames.append(pd.DataFrame({
+            "user_id": np.arange(1, n_customers + 1),
+            "feature_name": feature_name,
+            "feature_value": rng.integers(0, 400, n_customers).astype(float),
+        }))
+    features_long = pd.concat(frames, ignore_index=True)
+    features_long["feature_date"] = pd.Timestamp.today().normalize()
+    return features_long
+
+
+def bench_feature_writes(n_customers, batch_size=WRITE_BATCH_SIZE, latency_ms=0.0, include_row_by_row=True):
+    """Time write_features_to_iceberg batched vs row-at-a-time against an in-memory SQLite stand-in."""
+    features_long = make_features_long(n_customers)
+    modes = [("batched", batch_size)]
+    if include_row_by_row:
+        modes.append(("row_by_row", None))
+
+    results = {"customers": n_customers, "rows": len(features_long), "latency_ms": latency_ms, "modes": {}}
+    for mode, mode_batch_size in modes:
+        conn = connect_local(":memory:")
+        cursor = conn.cursor()
+        for ddl in FEATURE_TABLES_DDL:
+            cursor.execute(ddl)
+        cursor.executemany(
+            "INSERT INTO feature_catalog (feature_id, feature_name) VALUES (%s, %s)",
+            list(enumerate(BENCH_FEATURES, start=1)),
+        )
+        if latency_ms:
+            cursor = LatencyCursor(cursor, latency_ms)
+
+        start = time.perf_counter()
+        write_features_to_iceberg(cursor, features_long.copy(), batch_size=mode_batch_size)
+        conn.commit()
+        elapsed = time.perf_counter() - start
+
+        cursor.execute("SELECT COUNT(*) FROM feature_engineered_iceberg")
+        written = cursor.fetchone()[0]
+        conn.close()
+
+        results["modes"][mode] = {
+            "batch_size": mode_batch_size,
+            "rows_written": written,
+            "seconds": round(elapsed, 4),
+            "rows_per_second": round(written / elapsed, 1) if elapsed else None,
+        }
+    return results
+
+
+def make_feature_inputs(n_customers, active_share=0.7, seed=42):
+    """Synthetic (events_df, customers_df) shaped like load_raw_data's output (one event row per active user)."""
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp.today(tz="UTC").normalize()
+    customers_df = pd.DataFrame({
+        "user_id": np.arange(1, n_customers + 1, dtype="int32"),
+        "signup_date": (today.tz_localize(None) - pd.to_timedelta(rng.integers(0, 1500, n_customers), unit="D")),
+    })
+    active = rng.random(n_customers) < active_share
+    n_active = int(active.sum())
+    events_df = pd.DataFrame({
+        "user_id": customers_df["user_id"].to_numpy()[active],
+        "event_time": today - pd.to_timedelta(rng.integers(0, 90 * 86400, n_active), unit="s"),
+    })
+    return events_df, customers_df
+
+
+def legacy_engineer_features(events_df, customers_df):
+    """The pre-vectorization engineer_features (string keys, three today() calls, pd.melt), kept as a baseline."""
+    customers_df = customers_df.copy()
+    events_df = events_df.copy()
+    customers_df["signup_date"] = pd.to_datetime(customers_df["signup_date"]).dt.tz_localize("UTC")
+    today = pd.Timestamp.today(tz="UTC").normalize()
+    customers_df["days_since_signup"] = (today - customers_df["signup_date"]).dt.days
+    events_df["event_time"] = pd.to_datetime(events_df["event_time"])
+    last_activity = (
+        events_df.groupby("user_id")["event_time"].max().reset_index()
+        .rename(columns={"event_time": "last_event_time"})
+    )
+    last_activity["days_since_last_activity"] = (today - last_activity["last_event_time"]).dt.days
+    customers_df["user_id"] = customers_df["user_id"].astype(str)
+    last_activity["user_id"] = last_activity["user_id"].astype(str)
+    features_df = customers_df[["user_id", "days_since_signup"]].merge(
+        last_activity[["user_id", "days_since_last_activity"]], on="user_id", how="left"
+    )
+    features_df["days_since_last_activity"] = features_df["days_since_last_activity"].fillna(9999)
+    features_long = pd.melt(features_df, id_vars=["user_id"], var_name="feature_name", value_name="feature_value")
+    features_long["feature_date"] = pd.Timestamp.today().normalize()
+    return features_long
+
+
+def _measure(func, *args, **kwargs):
+    """Run func once; return (result, seconds, peak bytes seen by tracemalloc, which excludes Arrow buffers)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_engineer_features(n_customers, include_legacy=True):
+    """Time and peak memory of engineer_features (long and wide) against the legacy implementation."""
+    events_df, customers_df = make_feature_inputs(n_customers)
+    variants = [
+        ("vectorized_long", lambda: engineer_features(events_df, customers_df, output="long")),
+        ("vectorized_wide", lambda: engineer_features(events_df, customers_df, output="wide")),
+    ]
+    if include_legacy:
+        variants.append(("legacy_long", lambda: legacy_engineer_features(events_df, customers_df)))
+
+    results = {"customers": n_customers, "active_users": len(events_df), "variants": {}}
+    for name, func in variants:
+        output, elapsed, peak = _measure(func)
+        results["variants"][name] = {
+            "seconds": round(elapsed, 3),
+            "peak_mb": round(peak / 2**20, 1),
+            "output_rows": len(output),
+            "output_mb": round(output.memory_usage(deep=True).sum() / 2**20, 1),
+        }
+        del output
+    return results
+
+
+def _peak_rss_mb():
+    """Process high-water RSS so far (ru_maxrss is KiB on Linux)."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _count(cursor, table):
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def bench_pipeline(n_customers, n_events, data_dir=None, db_path=None, skew=1.1, events_per_file=1_000_000,
+                   seed=42):
+    """
+    Run ingestion, DQ, transformations and feature engineering end to end on the SQLite stand-in.
+
+    Data is generated with synthetic_data into data_dir (a temp dir when None) and loaded into
+    db_path (a fresh temp database when None), so neither the tracked snapshot nor the local working copy is touched.
+    The query cache is pointed at the scratch directory for the run, so no entries for the
+    throwaway database are left in data/query_cache.
+
+    Returns:
+        dict with per-stage seconds, rows, rows_per_second and peak_rss_mb (process high-water mark),
+        and db_path when the database was given (a temp database is deleted after the run)
+    """
+    scratch_dir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    data_dir = data_dir or os.path.join(scratch_dir, "data")
+
+    results = {"customers": n_customers, "events": n_events, "skew": skew, "stages": {}}
+    if db_path:
+        results["db_path"] = db_path
+    else:
+        db_path = os.path.join(scratch_dir, "bench.db")
+
+    cache_dir = query_cache.QUERY_CACHE_DIR
+    query_cache.QUERY_CACHE_DIR = os.path.join(scratch_dir, "query_cache")
+    try:
+        start = time.perf_counter()
+        dataset = generate_dataset(data_dir, n_customers=n_customers, n_events=n_events, seed=seed, skew=skew,
+                                   events_per_file=events_per_file)
+        results["stages"]["generate"] = {"seconds": round(time.perf_counter() - start, 3), "rows": n_events,
+                                         "peak_rss_mb": _peak_rss_mb()}
+
+        stages = {
+            "my_csv_stage": {"path": dataset["csv_dir"], "extension": ".csv"},
+            "my_json_stage": {"path": dataset["json_dir"], "extension": ".json"},
+        }
+        conn = connect_local(db_path, stages=stages)
+        cursor = conn.cursor()
+
+        def run_features(cur):
+            events_df, customers_df = load_raw_data(cur, full_refresh=True)
+            register_all_features(cur)
+            features_df = engineer_features(events_df, customers_df)
+            write_features_to_iceberg(cur, features_df)
+
+        # (stage name, step, table whose row count measures the stage's output)
+        steps = [
+            ("load_csv", lambda cur: load_csv(cur, full_refresh=True), "raw_customer_demographics"),
+            ("load_json", lambda cur: load_json(cur, full_refresh=True), "raw_clickstream"),
+            ("dq_checks", run_dq_checks, "raw_clickstream"),
+            ("load_dim_customer", load_dim_customer, "dim_customer"),
+            ("load_fact_click_events", load_fact_click_events, "fact_click_events"),
+            ("feature_engineering", run_features, "feature_engineered_iceberg"),
+        ]
+        for name, step, table in steps:
+            start = time.perf_counter()
+            step(cursor)
+            conn.commit()
+            elapsed = time.perf_counter() - start
+            rows = _count(cursor, table)
+            results["stages"][name] = {
+                "seconds": round(elapsed, 3),
+                "rows": rows,
+                "rows_per_second": round(rows / elapsed, 1) if elapsed else None,
+                "peak_rss_mb": _peak_rss_mb(),
+            }
+        conn.close()
+    finally:
+        query_cache.QUERY_CACHE_DIR = cache_dir
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    results["total_seconds"] = round(sum(stage["seconds"] for stage in results["stages"].values()), 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the marketing data pipeline.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    writes = subparsers.add_parser("writes", help="Batched vs row-at-a-time feature writes")
+    writes.add_argument("--customers", type=int, default=100000)
+    writes.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE)
+    writes.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round-trip latency per call")
+    writes.add_argument("--skip-row-by-row", action="store_true")
+
+    features = subparsers.add_parser("features", help="engineer_features time and peak memory")
+    features.add_argument("--customers", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    features.add_argument("--skip-legacy", action="store_true")
+
+    pipeline = subparsers.add_parser("pipeline", help="End-to-end pipeline on synthetic data and the SQLite stand-in")
+    pipeline.add_argument("--customers", type=int, default=10_000)
+    pipeline.add_argument("--events", type=int, default=100_000, help="Click events to generate (10K to 100M)")
+    pipeline.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for per-user activity")
+    pipeline.add_argument("--events-per-file", type=int, default=1_000_000)
+    pipeline.add_argument("--data-dir", help="Keep generated files here instead of a temp dir")
+    pipeline.add_argument("--db", help="SQLite database to load (default: fresh temp database)")
+    pipeline.add_argument("--output", help="Also write the JSON results to this file")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.benchmark == "writes":
+        results = bench_feature_writes(
+            args.customers,
+            batch_size=args.batch_size,
+            latency_ms=args.latency_ms,
+            include_row_by_row=not args.skip_row_by_row,
+        )
+    elif args.benchmark == "features":
+        results = [bench_engineer_features(n, include_legacy=not args.skip_legacy) for n in args.customers]
+    elif args.benchmark == "pipeline":
+        results = bench_pipeline(
+            args.customers,
+            args.events,
+            data_dir=args.data_dir,
+            db_path=args.db,
+            skew=args.skew,
+            events_per_file=args.events_per_file,
+        )
+    print(json.dumps(results, indent=2))
+    if getattr(args, "output", None):
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,305 @@
+import heapq
 import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 from utils import log_to_snowflake
+from watermarks import (
+    ensure_watermark_tables,
+    find_new_or_changed_files,
+    get_file_state,
+    list_stage_files,
+    record_loaded_files,
+)
 
 # External stages and file format names used for COPY INTO commands
 S3_STAGE_CSV = "my_csv_stage"
 S3_STAGE_JSON = "my_json_stage"
+# Clean clickstream Parquet chunks written by json_prevalidation (same columns as raw_clickstream)
+S3_STAGE_CLICKSTREAM_PARQUET = "my_clickstream_parquet_stage"
 
-def load_csv(cursor):
-    step = "load_csv"  # Identifier for logging
+# Snowflake accepts at most 1000 file names in a single COPY INTO ... FILES = (...)
+COPY_FILES_LIMIT = 1000
+
+# Size-balanced file groups copied concurrently, each on its own pooled connection
+COPY_PARALLELISM = 4
+
+# Files that fail are re-copied (alone, on the step's cursor) up to this many times with exponential backoff
+COPY_MAX_RETRIES = 2
+COPY_RETRY_BACKOFF_SECONDS = 2.0
+
+# DB-API error classes raised for a bad statement or bad data; rerunning the same COPY fails the same way
+NON_RETRYABLE_ERRORS = ("ProgrammingError", "IntegrityError", "DataError", "NotSupportedError")
+
+# Staged files are COPYed into a transient load table, then MERGEd into the raw table on its key,
+# so a changed file replaces the rows of its earlier version instead of appending next to them.
+#
+# Keys:
+#   load_table   transient table the COPY writes into (emptied before every load)
+#   key          column the MERGE matches on
+#   columns      raw table columns, in table order
+#   order_by     picks one row per key when a load holds several (newest first, then a full tiebreak)
+#   loaded_at    optional column stamped with the MERGE time on every inserted or updated row, so
+#                downstream steps can pick up exactly the rows loaded since their last run
+RAW_TABLES = {
+    "raw_customer_demographics": {
+        "load_table": "raw_customer_demographics_load",
+        "key": "customer_id",
+        "columns": ("customer_id", "first_name", "last_name", "email", "region", "signup_date"),
+        "order_by": "signup_date DESC, email, first_name, last_name, region",
+    },
+    "raw_clickstream": {
+        "load_table": "raw_clickstream_load",
+        "key": "event_id",
+        "columns": ("event_id", "timestamp", "user_id", "event_type", "page_url", "duration_ms"),
+        "order_by": "timestamp DESC, user_id, event_type, page_url, duration_ms",
+        "loaded_at": "loaded_at",
+    },
+}
+
+
+def _files_clause(files):
+    """Render a FILES = (...) clause for COPY INTO."""
+    return "FILES = (" + ", ".join(f"'{f['file_name']}'" for f in files) + ")"
+
+
+def _balanced_groups(files, max_groups):
+    """
+    Split files into size-balanced groups (largest file first onto the lightest group).
+
+    There are never more than max_groups groups unless COPY_FILES_LIMIT forces more.
+    """
+    if not files:
+        return []
+    n_groups = max(min(max_groups, len(files)), math.ceil(len(files) / COPY_FILES_LIMIT))
+    heap = [(0, i) for i in range(n_groups)]
+    groups = [[] for _ in range(n_groups)]
+    for file in sorted(files, key=lambda f: f["file_size"] or 0, reverse=True):
+        # Full groups are dropped from the heap so no FILES list exceeds the limit
+        while True:
+            total, i = heapq.heappop(heap)
+            if len(groups[i]) < COPY_FILES_LIMIT:
+                break
+        groups[i].append(file)
+        heapq.heappush(heap, (total + (file["file_size"] or 0), i))
+    return [group for group in groups if group]
+
+
+def _parse_copy_results(cursor, files):
+    """
+    Map COPY INTO's result set (one row per file) to {file_name: result}.
+
+    COPY names each file the way LIST does (a full URL on external stages), so rows are matched
+    on the file's stage_path, falling back to its path relative to the stage. Files missing from
+    the result set were skipped by Snowflake's load metadata (already loaded, unchanged) and count
+    as loaded with 0 rows.
+    """
+    columns = [column[0].lower() for column in cursor.description or []]
+    results = {f["file_name"]: {"status": "LOADED", "rows_loaded": 0, "errors_seen": 0, "first_error": None}
+               for f in files}
+    # "Copy executed with 0 files processed." comes back as a single status column
+    if "file" not in columns:
+        return results
+    by_path = {f["file_name"]: f["file_name"] for f in files}
+    by_path.update({f["stage_path"]: f["file_name"] for f in files if f.get("stage_path")})
+    for row in cursor.fetchall():
+        record = dict(zip(columns, row))
+        file_name = by_path.get(str(record["file"]))
+        if file_name is None:
+            logging.warning(f"COPY reported a file that was not requested: {record['file']}")
+            continue
+        results[file_name] = {
+            "status": record["status"],
+            "rows_loaded": record.get("rows_loaded") or 0,
+            "errors_seen": record.get("errors_seen") or 0,
+            "first_error": record.get("first_error"),
+            # A file COPY itself skipped has bad rows; loading it again gives the same result
+            "retryable": False,
+        }
+    return results
 
+
+def _is_retryable(error):
+    """False for statement/data errors (constraint violations, bad SQL), which a retry would only repeat."""
+    if isinstance(error, ValueError):
+        return False
+    return not any(cls.__name__ in NON_RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def _failed_results(files, error):
+    return {f["file_name"]: {"status": "LOAD_FAILED", "rows_loaded": 0, "errors_seen": 1, "first_error": str(error),
+                             "retryable": _is_retryable(error)}
+            for f in files}
+
+
+def _copy_group(cursor, copy_into_sql, files):
+    """COPY one group of files and return per-file results; a statement-level error fails every file in the group."""
     try:
-        # Log start of CSV load (both local logging and Snowflake)
-        log_to_snowflake(cursor, 'INFO', step, 'Starting CSV data load')
-        logging.info("Loading CSV data into raw_customer_demographics...")
+        cursor.execute(copy_into_sql.format(files_clause=_files_clause(files)))
+        return _parse_copy_results(cursor, files)
+    except Exception as e:
+        logging.warning(f"COPY of {len(files)} file(s) failed: {e}")
+        return _failed_results(files, e)
+
+
+def _copy_group_pooled(connection_pool, copy_into_sql, files):
+    """COPY one group on a connection checked out of the pool (committed independently)."""
+    try:
+        with connection_pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                results = _copy_group(cursor, copy_into_sql, files)
+                conn.commit()
+                return results
+            finally:
+                cursor.close()
+    except Exception as e:
+        logging.warning(f"Could not run COPY group on a pooled connection: {e}")
+        return _failed_results(files, e)
+
+
+def _copy_stage_files(cursor, source_name, stage, copy_into_sql, pattern, full_refresh,
+                      connection_pool=None, max_parallel=COPY_PARALLELISM):
+    """
+    Copy staged files into a raw table, either everything (full refresh) or only new/changed files.
+
+    copy_into_sql must contain a {files_clause} placeholder, filled with a FILES = (...) list for
+    each group, and should set ON_ERROR = SKIP_FILE so one bad file does not abort its group.
+    With a connection_pool, size-balanced groups are copied concurrently; otherwise they run in
+    order on cursor. Files that failed for a transient reason (e.g. a dropped connection) are
+    retried with backoff; data and statement errors are not. Files that still fail are left out
+    of the result (and so out of ingestion_file_state) and get picked up again by the next run.
 
+    Returns:
+        (loaded_files, file_results): staged file dicts that loaded, and {file_name: result}
+        for every attempted file (status, rows_loaded, errors_seen, first_error)
+    """
+    ensure_watermark_tables(cursor)
+    staged_files = list_stage_files(cursor, stage, pattern)
+
+    if full_refresh:
+        pending = staged_files
+    else:
+        pending = find_new_or_changed_files(staged_files, get_file_state(cursor, source_name))
+    if not pending:
+        logging.info(f"No new or changed files in @{stage}; skipping COPY for {source_name}.")
+        return [], {}
+
+    groups = _balanced_groups(pending, max_parallel if connection_pool is not None else 1)
+    logging.info(f"Copying {len(pending)} file(s) from @{stage} for {source_name} in {len(groups)} group(s).")
+
+    file_results = {}
+    if connection_pool is not None and len(groups) > 1:
+        # Pooled connections cannot see (or wait on) this step's open transaction, e.g. a TRUNCATE
+        if getattr(cursor, "connection", None) is not None:
+            cursor.connection.commit()
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix=f"copy-{source_name}") as executor:
+            for results in executor.map(lambda group: _copy_group_pooled(connection_pool, copy_into_sql, group), groups):
+                file_results.update(results)
+    else:
+        for group in groups:
+            file_results.update(_copy_group(cursor, copy_into_sql, group))
+
+    # Retry only the files that failed transiently, with exponential backoff
+    by_name = {f["file_name"]: f for f in pending}
+    for attempt in range(COPY_MAX_RETRIES):
+        failed = [by_name[name] for name, result in file_results.items()
+                  if result["status"] == "LOAD_FAILED" and result.get("retryable")]
+        if not failed:
+            break
+        delay = COPY_RETRY_BACKOFF_SECONDS * 2 ** attempt
+        logging.warning(f"Retrying {len(failed)} failed file(s) for {source_name} in {delay:.0f}s "
+                        f"(attempt {attempt + 1}/{COPY_MAX_RETRIES}).")
+        time.sleep(delay)
+        for start in range(0, len(failed), COPY_FILES_LIMIT):
+            file_results.update(_copy_group(cursor, copy_into_sql, failed[start:start + COPY_FILES_LIMIT]))
+
+    still_failed = {name: result for name, result in file_results.items() if result["status"] == "LOAD_FAILED"}
+    for name, result in still_failed.items():
+        message = f"File {name} failed to load into {source_name}: {result['first_error']}"
+        logging.error(message)
+        log_to_snowflake(cursor, 'ERROR', source_name, message, error_details=result["first_error"])
+
+    loaded_files = [f for f in pending if f["file_name"] not in still_failed]
+    return loaded_files, file_results
+
+
+def _prepare_load(cursor, step, table, full_refresh):
+    """
+    Create and empty the table's load table, truncate the raw table on a full refresh, and
+    decide the mode: a source with no recorded file state is loaded as a full refresh, since
+    nothing tells which of the raw table's rows came from which staged file.
+
+    Returns:
+        full_refresh (bool), possibly switched on
+    """
+    config = RAW_TABLES[table]
+    ensure_watermark_tables(cursor)
+    if not full_refresh and not get_file_state(cursor, step):
+        logging.info(f"No ingestion_file_state for {step}; running a full refresh of {table}.")
+        full_refresh = True
+    # Same columns as the raw table, without its key constraint, so a COPY never fails on duplicates
+    cursor.execute(f"CREATE TRANSIENT TABLE IF NOT EXISTS {config['load_table']} LIKE {table};")
+    cursor.execute(f"TRUNCATE TABLE {config['load_table']};")
+    if full_refresh:
+        cursor.execute(f"TRUNCATE TABLE {table};")
+    return full_refresh
+
+
+def _merge_loaded_rows(cursor, table):
+    """
+    MERGE the load table into the raw table on its key (one row per key, picked by order_by),
+    then empty the load table.
+
+    Rows without a key cannot be matched and are inserted as they are, so the raw-table DQ
+    not-null checks still see them. A configured loaded_at column is set to the current time
+    on every row the MERGE touches.
+
+    Returns:
+        (rows inserted, rows updated)
+    """
+    config = RAW_TABLES[table]
+    key, columns = config["key"], config["columns"]
+    updates = [f"target.{column} = source.{column}" for column in columns if column != key]
+    insert_columns, insert_values = list(columns), [f"source.{column}" for column in columns]
+    if config.get("loaded_at"):
+        updates.append(f"target.{config['loaded_at']} = CURRENT_TIMESTAMP()")
+        insert_columns.append(config["loaded_at"])
+        insert_values.append("CURRENT_TIMESTAMP()")
+    merge_sql = f"""
+    MERGE INTO {table} AS target
+    USING (
+        SELECT {", ".join(columns)}
+        FROM (
+            SELECT {", ".join(columns)},
+                   ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY {config["order_by"]}) AS row_num
+            FROM {config["load_table"]}
+        ) AS ranked
+        WHERE row_num = 1 OR {key} IS NULL
+    ) AS source
+    ON target.{key} = source.{key}
+    WHEN MATCHED THEN UPDATE SET
+        {", ".join(updates)}
+    WHEN NOT MATCHED THEN INSERT ({", ".join(insert_columns)})
+    VALUES ({", ".join(insert_values)});
+    """
+    cursor.execute(merge_sql)
+    inserted, updated = cursor.fetchone()[:2]
+    cursor.execute(f"TRUNCATE TABLE {config['load_table']};")
+    return inserted, updated
+
+
+def _summarize_copy(file_results):
+    """(rows loaded, files failed) from _copy_stage_files' per-file results."""
+    rows_loaded = sum(result["rows_loaded"] for result in file_results.values())
+    failed = sum(1 for result in file_results.values() if result["status"] == "LOAD_FAILED")
+    return rows_loaded, failed
+
+
+def load_csv(cursor, full_refresh=False, connection_pool=None, max_parallel=COPY_PARALLELISM):
+    step = "load_csv"  # Identifier for logging
+
+    try:
         # Create target table if it does not exist
         create_table_sql = """
         CREATE TABLE IF NOT EXISTS raw_customer_demographics (
@@ -25,28 +312,38 @@ def load_csv(cursor):
         );
         """
 
-        # Clear existing data to avoid duplicates (idempotency)
-        truncate_sql = "TRUNCATE TABLE raw_customer_demographics;"
-
-        # Copy data from the external CSV stage into Snowflake table
+        # Copy data from the external CSV stage into the load table (MERGEd into the raw table below)
         copy_into_sql = f"""
-        COPY INTO raw_customer_demographics
+        COPY INTO {RAW_TABLES["raw_customer_demographics"]["load_table"]}
         FROM @{S3_STAGE_CSV}/
+        {{files_clause}}
         FILE_FORMAT = csv_format
-        PATTERN = '.*\\.csv';
+        ON_ERROR = SKIP_FILE;
         """
 
         # Execute SQL statements sequentially
         cursor.execute(create_table_sql)
-        cursor.execute(truncate_sql)
-        cursor.execute(copy_into_sql)
+        full_refresh = _prepare_load(cursor, step, "raw_customer_demographics", full_refresh)
+
+        # Log start of CSV load (both local logging and Snowflake); the mode is final only after _prepare_load
+        mode = "full refresh" if full_refresh else "incremental"
+        log_to_snowflake(cursor, 'INFO', step, f'Starting CSV data load ({mode})')
+        logging.info(f"Loading CSV data into raw_customer_demographics ({mode})...")
+        loaded_files, file_results = _copy_stage_files(
+            cursor, step, S3_STAGE_CSV, copy_into_sql, '.*\\.csv', full_refresh,
+            connection_pool=connection_pool, max_parallel=max_parallel,
+        )
+
+        # Rows loaded come from the COPY result set, so no COUNT(*) over the table
+        rows_loaded, files_failed = _summarize_copy(file_results)
+        inserted, updated = _merge_loaded_rows(cursor, "raw_customer_demographics")
 
-        # Query to get number of rows loaded for logging
-        cursor.execute("SELECT COUNT(*) FROM raw_customer_demographics;")
-        rows_loaded = cursor.fetchone()[0]
+        # Remember which files are now in the table so the next run can skip them
+        record_loaded_files(cursor, step, loaded_files, replace_all=full_refresh)
 
         # Log successful load with rows count
-        message = f"CSV file loaded successfully with {rows_loaded} rows."
+        message = (f"CSV load copied {len(loaded_files)} file(s) ({files_failed} failed); {rows_loaded} rows loaded "
+                   f"({inserted} inserted, {updated} updated).")
         log_to_snowflake(cursor, 'INFO', step, message, records_loaded=rows_loaded)
         logging.info(message)
 
@@ -57,14 +354,16 @@ def load_csv(cursor):
         logging.error(error_msg)
         raise  # Re-raise exception to stop further execution
 
-def load_json(cursor):
+def load_json(cursor, full_refresh=False, connection_pool=None, max_parallel=COPY_PARALLELISM, prevalidated=False):
+    """
+    Load clickstream events into raw_clickstream (MERGEd on event_id, see RAW_TABLES).
+
+    prevalidated=True copies the clean Parquet chunks json_prevalidation wrote (validated,
+    normalized and deduplicated before ingestion) instead of the raw JSON files.
+    """
     step = "load_json"  # Identifier for logging
 
     try:
-        # Log start of JSON load (both local logging and Snowflake)
-        log_to_snowflake(cursor, 'INFO', step, 'Starting JSON data load')
-        logging.info("Loading JSON data into raw_clickstream...")
-
         # Create target table if not exists
         create_table_sql = """
         CREATE TABLE IF NOT EXISTS raw_clickstream (
@@ -73,32 +372,49 @@ def load_json(cursor):
             user_id INTEGER,
             event_type VARCHAR,
             page_url VARCHAR,
-            duration_ms INTEGER
+            duration_ms INTEGER,
+            loaded_at TIMESTAMP_LTZ
         );
         """
 
-        # Clear existing data for idempotency
-        truncate_sql = "TRUNCATE TABLE raw_clickstream;"
+        # Tables created before loaded_at existed get the column added in place
+        add_loaded_at_sql = "ALTER TABLE raw_clickstream ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP_LTZ;"
 
-        # Copy data from external JSON stage with case-insensitive matching on column names
+        # Copy data from external JSON stage (or the prevalidated Parquet stage) with case-insensitive matching on column names
+        stage, file_format, pattern = (
+            (S3_STAGE_CLICKSTREAM_PARQUET, "(TYPE = PARQUET)", '.*\\.parquet') if prevalidated
+            else (S3_STAGE_JSON, "json_format", None)
+        )
         copy_into_sql = f"""
-        COPY INTO raw_clickstream
-        FROM @{S3_STAGE_JSON}/
-        FILE_FORMAT = json_format
-        MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE;
+        COPY INTO {RAW_TABLES["raw_clickstream"]["load_table"]}
+        FROM @{stage}/
+        {{files_clause}}
+        FILE_FORMAT = {file_format}
+        MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+        ON_ERROR = SKIP_FILE;
         """
 
         # Execute SQL statements
         cursor.execute(create_table_sql)
-        cursor.execute(truncate_sql)
-        cursor.execute(copy_into_sql)
+        cursor.execute(add_loaded_at_sql)
+        full_refresh = _prepare_load(cursor, step, "raw_clickstream", full_refresh)
+
+        # Log start of JSON load (both local logging and Snowflake); the mode is final only after _prepare_load
+        mode = "full refresh" if full_refresh else "incremental"
+        log_to_snowflake(cursor, 'INFO', step, f'Starting JSON data load ({mode})')
+        logging.info(f"Loading JSON data into raw_clickstream ({mode})...")
+        loaded_files, file_results = _copy_stage_files(
+            cursor, step, stage, copy_into_sql, pattern, full_refresh,
+            connection_pool=connection_pool, max_parallel=max_parallel,
+        )
+        rows_loaded, files_failed = _summarize_copy(file_results)
+        inserted, updated = _merge_loaded_rows(cursor, "raw_clickstream")
 
-        # Query to find rows loaded
-        cursor.execute("SELECT COUNT(*) FROM raw_clickstream;")
-        rows_loaded = cursor.fetchone()[0]
+        record_loaded_files(cursor, step, loaded_files, replace_all=full_refresh)
 
         # Log success with rows loaded info
-        message = f"JSON file loaded successfully with {rows_loaded} rows."
+        message = (f"JSON load copied {len(loaded_files)} file(s) ({files_failed} failed); {rows_loaded} rows loaded "
+                   f"({inserted} inserted, {updated} updated).")
         log_to_snowflake(cursor, 'INFO', step, message, records_loaded=rows_loaded)
         logging.info(message)
 
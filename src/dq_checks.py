@@ -1,5 +1,43 @@
 import logging
 
+# Declarative DQ check registry: table name -> list of checks.
+# Every check for a table is compiled into ONE aggregate query, so adding a check
+# adds a column to that query rather than another full-table scan.
+#
+# Supported check types and their keys:
+#   not_null     column                              -> fails if any NULLs
+#   unique       column                              -> fails if duplicate non-NULL values
+#   row_count    min_rows                            -> fails if fewer rows than min_rows
+#   range        column, min_value and/or max_value  -> fails if any value falls outside the bounds
+#   regex        column, pattern                     -> fails if any non-NULL value does not match
+#   referential  column, ref_table, ref_column       -> fails if any non-NULL value has no parent row
+DQ_CHECKS = {
+    "raw_customer_demographics": [
+        {"check_name": "Null customer_id check", "type": "not_null", "column": "customer_id"},
+        {"check_name": "Unique customer_id check", "type": "unique", "column": "customer_id"},
+        {"check_name": "Row count check", "type": "row_count", "min_rows": 1},
+        {"check_name": "Email format check", "type": "regex", "column": "email",
+         "pattern": "^[^@ ]+@[^@ ]+[.][^@ ]+$"},
+    ],
+    "raw_clickstream": [
+        {"check_name": "Null event_id check", "type": "not_null", "column": "event_id"},
+        {"check_name": "Unique event_id check", "type": "unique", "column": "event_id"},
+        {"check_name": "Clickstream row count check", "type": "row_count", "min_rows": 1},
+        {"check_name": "Null timestamp check", "type": "not_null", "column": "timestamp"},
+        {"check_name": "Duration range check", "type": "range", "column": "duration_ms", "min_value": 0},
+        {"check_name": "Page URL format check", "type": "regex", "column": "page_url", "pattern": "^https?://.+"},
+        # Checked against the raw customers: this step runs before load_dim_customer has merged them
+        {"check_name": "Clickstream user_id in raw_customer_demographics check", "type": "referential",
+         "column": "user_id", "ref_table": "raw_customer_demographics", "ref_column": "customer_id"},
+    ],
+}
+
+
+def register_dq_check(table_name, check):
+    """Add a check to the registry for a table (see DQ_CHECKS for the supported types)."""
+    DQ_CHECKS.setdefault(table_name, []).append(check)
+
+
 def log_dq_result_to_snowflake(cursor, check_name, status, result_value, message):
     """
     Inserts a DQ check result into the Snowflake logging table.
@@ -11,6 +49,22 @@ def log_dq_result_to_snowflake(cursor, check_name, status, result_value, message
     cursor.execute(insert_sql, (check_name, status, result_value, message))
 
 
+def log_dq_results_to_snowflake(cursor, results):
+    """
+    Inserts many DQ check results with a single multi-row INSERT.
+
+    Args:
+        results: list of (check_name, status, result_value, message) tuples
+    """
+    if not results:
+        return
+    insert_sql = """
+    INSERT INTO dq_check_logs (check_name, status, result_value, message)
+    VALUES (%s, %s, %s, %s)
+    """
+    cursor.executemany(insert_sql, results)
+
+
 def send_email_alert(subject, body): ## conceptually placed.
     """
     Example placeholder function to send an email alert.
@@ -30,55 +84,127 @@ def send_email_alert(subject, body): ## conceptually placed.
     pass
 
 
-def run_dq_checks(cursor):
+def _sql_literal(value):
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+def _check_expression(check, ref_alias):
+    """SQL aggregate returning the check's result value (violation count, or row count for row_count)."""
+    check_type = check["type"]
+    column = f"t.{check['column']}" if "column" in check else None
+
+    if check_type == "row_count":
+        return "COUNT(*)"
+    if check_type == "not_null":
+        return f"COALESCE(SUM(CASE WHEN {column} IS NULL THEN 1 ELSE 0 END), 0)"
+    if check_type == "unique":
+        return f"COUNT({column}) - COUNT(DISTINCT {column})"
+    if check_type == "range":
+        bounds = []
+        if check.get("min_value") is not None:
+            bounds.append(f"{column} < {_sql_literal(check['min_value'])}")
+        if check.get("max_value") is not None:
+            bounds.append(f"{column} > {_sql_literal(check['max_value'])}")
+        if not bounds:
+            raise ValueError(f"Range check '{check['check_name']}' needs min_value and/or max_value")
+        return f"COALESCE(SUM(CASE WHEN {' OR '.join(bounds)} THEN 1 ELSE 0 END), 0)"
+    if check_type == "regex":
+        pattern = _sql_literal(check["pattern"])
+        return (f"COALESCE(SUM(CASE WHEN {column} IS NOT NULL "
+                f"AND NOT REGEXP_LIKE({column}, {pattern}) THEN 1 ELSE 0 END), 0)")
+    if check_type == "referential":
+        return (f"COALESCE(SUM(CASE WHEN {column} IS NOT NULL "
+                f"AND {ref_alias}.ref_key IS NULL THEN 1 ELSE 0 END), 0)")
+    raise ValueError(f"Unknown DQ check type '{check_type}' for check '{check.get('check_name')}'")
+
+
+def compile_table_checks(table_name, checks):
+    """
+    Compile all checks for a table into a single aggregate query.
+
+    Referential checks become LEFT JOINs against the DISTINCT parent keys, so the
+    join never multiplies rows and every other aggregate stays correct.
+
+    Returns:
+        SQL string whose single result row holds one value per check, in order
+    """
+    select_items = []
+    joins = []
+    for i, check in enumerate(checks):
+        ref_alias = None
+        if check["type"] == "referential":
+            ref_alias = f"ref_{i}"
+            joins.append(
+                f"LEFT JOIN (SELECT DISTINCT {check['ref_column']} AS ref_key FROM {check['ref_table']}) AS {ref_alias}\n"
+                f"    ON CAST(t.{check['column']} AS VARCHAR) = CAST({ref_alias}.ref_key AS VARCHAR)"
+            )
+        select_items.append(f"{_check_expression(check, ref_alias)} AS check_{i}")
+
+    return (
+        "SELECT\n    " + ",\n    ".join(select_items) + "\n"
+        f"FROM {table_name} AS t\n" + "\n".join(joins)
+    )
+
+
+def evaluate_check(check, value):
+    """Turn a check's raw result value into a (check_name, status, result_value, message) tuple."""
+    value = int(value or 0)
+    name = check["check_name"]
+
+    if check["type"] == "row_count":
+        min_rows = check.get("min_rows", 1)
+        if value < min_rows:
+            return name, "FAILED", value, f"Only {value} row(s) found, expected at least {min_rows}"
+        return name, "PASSED", value, "Rows exist"
+
+    if value > 0:
+        descriptions = {
+            "not_null": f"{value} NULL {check.get('column')}(s) found",
+            "unique": f"{value} duplicate {check.get('column')}(s) found",
+            "range": f"{value} {check.get('column')} value(s) out of range",
+            "regex": f"{value} {check.get('column')} value(s) do not match the expected format",
+            "referential": f"{value} {check.get('column')} value(s) missing from {check.get('ref_table')}",
+        }
+        return name, "FAILED", value, descriptions[check["type"]]
+    return name, "PASSED", 0, "Check passed"
+
+
+def run_table_checks(cursor, table_name, checks):
+    """Run every check for one table in a single pass and return their result tuples."""
+    cursor.execute(compile_table_checks(table_name, checks))
+    row = cursor.fetchone()
+    return [evaluate_check(check, value) for check, value in zip(checks, row)]
+
+
+def run_dq_checks(cursor, checks_by_table=None):
     logging.info("Running data quality checks...")
+    checks_by_table = DQ_CHECKS if checks_by_table is None else checks_by_table
 
+    results = []
     try:
-        # 1. Null customer_id check
-        cursor.execute("SELECT COUNT(*) FROM raw_customer_demographics WHERE customer_id IS NULL")
-        null_count = cursor.fetchone()[0]
-        if null_count > 0:
-            msg = f"{null_count} NULL customer_id(s) found"
-            logging.error(f"DQ Check Failed: {msg}")
-            log_dq_result_to_snowflake(cursor, "Null customer_id check", "FAILED", null_count, msg)
-            # Uncomment below to send alert email
-            # send_email_alert("DQ Check Failed: Null customer_id", msg)
-        else:
-            logging.info("Null check passed: No NULL customer_id.")
-            log_dq_result_to_snowflake(cursor, "Null customer_id check", "PASSED", 0, "No NULLs found")
-
-        # 2. Unique customer_id check
-        cursor.execute("SELECT COUNT(DISTINCT customer_id) FROM raw_customer_demographics")
-        unique_count = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM raw_customer_demographics")
-        total_count = cursor.fetchone()[0]
-
-        if unique_count != total_count:
-            duplicates = total_count - unique_count
-            msg = f"{duplicates} duplicate customer_id(s) found"
-            logging.error(f"DQ Check Failed: {msg}")
-            log_dq_result_to_snowflake(cursor, "Unique customer_id check", "FAILED", duplicates, msg)
-            # Uncomment below to send alert email
-            # send_email_alert("DQ Check Failed: Duplicate customer_id", msg)
-        else:
-            logging.info("Uniqueness check passed: All customer_id values are unique.")
-            log_dq_result_to_snowflake(cursor, "Unique customer_id check", "PASSED", unique_count, "All values unique")
-
-        # 3. Row count > 0
-        if total_count == 0:
-            msg = "No rows found in raw_customer_demographics"
-            logging.error(f"DQ Check Failed: {msg}")
-            log_dq_result_to_snowflake(cursor, "Row count check", "FAILED", 0, msg)
-            # Uncomment below to send alert email
-            # send_email_alert("DQ Check Failed: No rows", msg)
-        else:
-            logging.info(f"Row count check passed: {total_count} rows found.")
-            log_dq_result_to_snowflake(cursor, "Row count check", "PASSED", total_count, "Rows exist")
+        # One aggregate query per table evaluates all of its checks
+        for table_name, checks in checks_by_table.items():
+            if not checks:
+                continue
+            table_results = run_table_checks(cursor, table_name, checks)
+            for check_name, status, result_value, message in table_results:
+                if status == "FAILED":
+                    logging.error(f"DQ Check Failed ({table_name}): {check_name}: {message}")
+                    # Uncomment below to send alert email
+                    # send_email_alert(f"DQ Check Failed: {check_name}", message)
+                else:
+                    logging.info(f"DQ Check passed ({table_name}): {check_name} ({result_value})")
+            results.extend(table_results)
+
+        # All results land in dq_check_logs with one INSERT
+        log_dq_results_to_snowflake(cursor, results)
+        return results
 
     except Exception as e:
         logging.error(f"Error running data quality checks: {e}")
-        log_dq_result_to_snowflake(cursor, "DQ Check Exception", "ERROR", 0, str(e))
+        log_dq_results_to_snowflake(cursor, results + [("DQ Check Exception", "ERROR", 0, str(e))])
         # Uncomment below to send alert email
         # send_email_alert("DQ Check Exception", str(e))
         raise
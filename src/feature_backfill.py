@@ -0,0 +1,249 @@
+# src/feature_backfill.py
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from utils import DEFAULT_BACKEND, PIPELINE_BACKENDS, close_connection_pool, get_backend_connect, get_connection_pool
+from instrumentation import instrument_step, write_metrics_files
+from feature_engineering import (
+    FETCH_BATCH_SIZE,
+    NS_PER_DAY,
+    _days_between,
+    _utc_ns,
+    iter_result_batches,
+    register_all_features,
+    write_features_to_iceberg,
+)
+from feature_registry import ACTIVITY_LOOKBACK_DAYS, MISSING_FEATURE_VALUE
+from query_cache import cached_query
+
+# Feature dates handed to one worker process (and written as one group)
+BACKFILL_CHUNK_DAYS = 7
+
+# Worker processes computing date chunks; 1 computes in-process
+BACKFILL_WORKERS = 4
+
+
+def _date_range(start_date, end_date):
+    """Inclusive list of normalized feature dates (naive, UTC)."""
+    start, end = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+    if end < start:
+        raise ValueError(f"Backfill end date {end.date()} is before start date {start.date()}")
+    return list(pd.date_range(start, end, freq="D"))
+
+
+def load_daily_activity(cursor, start_date, end_date, batch_size=FETCH_BATCH_SIZE):
+    """
+    Latest event per user per event day for every day a backfill over [start_date, end_date] can see.
+
+    Events are streamed once from fact_click_events and reduced per batch, so memory is
+    bounded by users x active days rather than by the raw event volume.
+
+    Returns:
+        DataFrame with user_id (int64), event_day (int64 ns, midnight UTC) and
+        last_event_ns (int64 ns), sorted by event_day
+    """
+    window_start = pd.Timestamp(start_date).normalize() - pd.Timedelta(days=ACTIVITY_LOOKBACK_DAYS)
+    window_end = pd.Timestamp(end_date).normalize()
+    cursor.execute(
+        """
+        SELECT user_id, event_time
+        FROM fact_click_events
+        WHERE event_time >= %(window_start)s
+          AND event_time < %(window_end)s
+        """,
+        {"window_start": window_start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+         "window_end": window_end.strftime("%Y-%m-%dT%H:%M:%SZ")},
+    )
+
+    daily = []
+    for batch in iter_result_batches(cursor, batch_size):
+        user_ids = pd.to_numeric(batch["user_id"], errors="coerce")
+        event_ns, event_missing = _utc_ns(batch["event_time"])
+        valid = user_ids.notna().to_numpy() & ~event_missing
+        events = pd.DataFrame({
+            "user_id": user_ids[valid].astype("int64").to_numpy(),
+            "event_day": event_ns[valid] - event_ns[valid] % NS_PER_DAY,
+            "last_event_ns": event_ns[valid],
+        })
+        daily.append(events.groupby(["user_id", "event_day"], sort=False, as_index=False)["last_event_ns"].max())
+
+    if not daily:
+        return pd.DataFrame({"user_id": pd.Series(dtype="int64"), "event_day": pd.Series(dtype="int64"),
+                             "last_event_ns": pd.Series(dtype="int64")})
+    # The same user-day can appear in several batches
+    daily = pd.concat(daily, ignore_index=True).groupby(["user_id", "event_day"], as_index=False)["last_event_ns"].max()
+    return daily.sort_values("event_day", kind="stable", ignore_index=True)
+
+
+def load_customers(cursor, batch_size=FETCH_BATCH_SIZE):
+    """dim_customer keys and signup dates as int64 ids, int64 UTC ns and a missing-signup mask."""
+    # Same normalized query as load_raw_data, so both share one query cache entry
+    customers = cached_query(cursor, "SELECT customer_id AS user_id, signup_date FROM dim_customer",
+                             tables=("dim_customer",), batch_size=batch_size)
+    customer_ids = pd.to_numeric(customers["user_id"], errors="coerce")
+    has_id = customer_ids.notna().to_numpy()
+    signup_ns, signup_missing = _utc_ns(pd.Series(pd.to_datetime(customers["signup_date"], errors="coerce"))[has_id])
+    return customer_ids[has_id].astype("int64").to_numpy(), signup_ns, signup_missing
+
+
+def compute_backfill_chunk(feature_dates, daily_activity, customer_ids, signup_ns, signup_missing):
+    """
+    Point-in-time features for every (customer, feature_date) pair of one chunk in a single pass.
+
+    A feature row for date D only sees what was true at D's midnight (UTC): customers that
+    had signed up by D, and events strictly before D within the ACTIVITY_LOOKBACK_DAYS window.
+    Per-user last activity is an as-of join of the date grid onto the per-day maxima, which
+    are visible from the day after they happened. Values otherwise match engineer_features(as_of=D).
+
+    Returns:
+        long DataFrame (user_id, feature_name, feature_value, feature_date)
+    """
+    dates_ns = np.array([pd.Timestamp(date).as_unit("ns").value for date in feature_dates], dtype="int64")
+    n_customers = len(customer_ids)
+
+    # One grid row per customer per date, sorted by date as merge_asof requires
+    grid = pd.DataFrame({
+        "feature_ns": np.repeat(dates_ns, n_customers),
+        "user_id": np.tile(customer_ids, len(dates_ns)),
+        "signup_ns": np.tile(signup_ns, len(dates_ns)),
+        "signup_missing": np.tile(signup_missing, len(dates_ns)),
+    })
+    # Not yet a customer on that date (a missing signup_date stays in, as in the daily run)
+    grid = grid[grid["signup_missing"] | (grid["signup_ns"] <= grid["feature_ns"])]
+
+    visible = pd.DataFrame({
+        "visible_ns": daily_activity["event_day"].to_numpy() + NS_PER_DAY,
+        "user_id": daily_activity["user_id"].to_numpy(),
+        "last_event_ns": daily_activity["last_event_ns"].to_numpy(),
+    })
+    # Per-day maxima only grow with the day, so the latest visible day holds the latest event
+    grid = pd.merge_asof(grid, visible, left_on="feature_ns", right_on="visible_ns", by="user_id",
+                         direction="backward")
+
+    feature_ns = grid["feature_ns"].to_numpy()
+    # Unmatched rows come back as NaN; keep the matched ones in int64 so no nanoseconds are rounded away
+    has_activity = grid["last_event_ns"].notna().to_numpy()
+    last_event_ns = grid["last_event_ns"].fillna(0).astype("int64").to_numpy()
+    in_window = has_activity & (last_event_ns >= feature_ns - ACTIVITY_LOOKBACK_DAYS * NS_PER_DAY)
+    days_since_last_activity = np.full(len(grid), float(MISSING_FEATURE_VALUE))
+    days_since_last_activity[in_window] = _days_between(feature_ns[in_window], last_event_ns[in_window])
+
+    signup_missing = grid["signup_missing"].to_numpy()
+    days_since_signup = np.where(signup_missing, np.nan,
+                                 _days_between(feature_ns, grid["signup_ns"].to_numpy()))
+
+    features = {
+        "days_since_signup": days_since_signup,
+        "days_since_last_activity": days_since_last_activity,
+    }
+    n_rows = len(grid)
+    return pd.DataFrame({
+        "user_id": np.tile(grid["user_id"].to_numpy(), len(features)),
+        "feature_name": np.repeat(np.array(list(features), dtype=object), n_rows),
+        "feature_value": np.concatenate(list(features.values())),
+        "feature_date": pd.to_datetime(np.tile(feature_ns, len(features))),
+    })
+
+
+def _chunk_activity(daily_activity, feature_dates):
+    """Only the activity rows a chunk can see: the lookback window before its first date up to its last."""
+    first = pd.Timestamp(feature_dates[0]).as_unit("ns").value - ACTIVITY_LOOKBACK_DAYS * NS_PER_DAY - NS_PER_DAY
+    last = pd.Timestamp(feature_dates[-1]).as_unit("ns").value
+    days = daily_activity["event_day"]
+    return daily_activity[(days >= first) & (days < last)]
+
+
+def _write_chunk(cursor, features_df, feature_map):
+    """Replace each date partition of a computed chunk, committing per date so reruns are idempotent."""
+    rows_written = 0
+    for feature_date, date_df in features_df.groupby("feature_date", sort=True):
+        write_features_to_iceberg(cursor, date_df.copy(), feature_date=feature_date.strftime("%Y-%m-%d"),
+                                  feature_map=feature_map)
+        cursor.connection.commit()
+        rows_written += len(date_df)
+    return rows_written
+
+
+def backfill_features(cursor, start_date, end_date, workers=BACKFILL_WORKERS, chunk_days=BACKFILL_CHUNK_DAYS):
+    """
+    Compute and write point-in-time features for every date in [start_date, end_date].
+
+    fact_click_events and dim_customer are read once; date chunks are computed in a
+    process pool and each date partition is deleted and rewritten, so a failed or repeated
+    backfill can simply be rerun over the same range.
+
+    Returns:
+        number of feature rows written
+    """
+    feature_dates = _date_range(start_date, end_date)
+    chunks = [feature_dates[i:i + chunk_days] for i in range(0, len(feature_dates), chunk_days)]
+    logging.info(f"Backfilling features for {len(feature_dates)} date(s) "
+                 f"({feature_dates[0].date()} to {feature_dates[-1].date()}) in {len(chunks)} chunk(s).")
+
+    register_all_features(cursor)
+    catalog = cached_query(cursor, "SELECT feature_id, feature_name FROM feature_catalog", tables=("feature_catalog",))
+    feature_map = dict(zip(catalog["feature_name"], catalog["feature_id"].tolist()))
+
+    daily_activity = load_daily_activity(cursor, feature_dates[0], feature_dates[-1])
+    customer_ids, signup_ns, signup_missing = load_customers(cursor)
+    logging.info(f"Loaded {len(daily_activity)} user-day activity rows for {len(customer_ids)} customers.")
+
+    rows_written = 0
+    if workers <= 1 or len(chunks) == 1:
+        for chunk in chunks:
+            features_df = compute_backfill_chunk(chunk, _chunk_activity(daily_activity, chunk),
+                                                 customer_ids, signup_ns, signup_missing)
+            rows_written += _write_chunk(cursor, features_df, feature_map)
+    else:
+        # Workers only compute; writes stay on this process's connection
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = {
+                pool.submit(compute_backfill_chunk, chunk, _chunk_activity(daily_activity, chunk),
+                            customer_ids, signup_ns, signup_missing): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                rows_written += _write_chunk(cursor, future.result(), feature_map)
+                chunk = futures[future]
+                logging.info(f"Backfilled {chunk[0].date()} to {chunk[-1].date()}.")
+
+    logging.info(f"Feature backfill completed: {rows_written} rows written for {len(feature_dates)} date(s).")
+    return rows_written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Point-in-time feature backfill over a date range.")
+    parser.add_argument("--start", required=True, help="First feature_date to backfill (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="Last feature_date to backfill (YYYY-MM-DD, inclusive)")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="Worker processes (1 = in-process)")
+    parser.add_argument("--chunk-days", type=int, default=BACKFILL_CHUNK_DAYS, help="Feature dates per worker task")
+    parser.add_argument(
+        "--backend",
+        choices=PIPELINE_BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="Run against Snowflake or the local SQLite stand-in (data/local/marketing_pipeline.db, or PIPELINE_LOCAL_DB).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(start_date, end_date, workers=BACKFILL_WORKERS, chunk_days=BACKFILL_CHUNK_DAYS, backend=None):
+    logging.basicConfig(level=logging.INFO)
+    with get_connection_pool(connect=get_backend_connect(backend)).connection() as conn:
+        cursor = conn.cursor()
+        try:
+            with instrument_step("feature_backfill", cursor) as metrics:
+                backfill_features(metrics["cursor"], start_date, end_date, workers=workers, chunk_days=chunk_days)
+            conn.commit()
+        finally:
+            cursor.close()
+            write_metrics_files()
+    close_connection_pool()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.start, args.end, workers=args.workers, chunk_days=args.chunk_days, backend=args.backend)
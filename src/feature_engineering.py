@@ -1,147 +1,357 @@
 # src/feature_engineering.py
 
+import argparse
+import numpy as np
 import pandas as pd
-from utils import get_snowflake_connection
+from utils import DEFAULT_BACKEND, PIPELINE_BACKENDS, close_connection_pool, get_backend_connect, get_connection_pool
+from instrumentation import instrument_step, write_metrics_files
+from feature_registry import (
+    ACTIVITY_LOOKBACK_DAYS,
+    MISSING_FEATURE_VALUE,
+    UTC_TODAY_SQL,
+    compute_features_in_warehouse,
+    register_catalog_entries,
+)
+from feature_frame import FeatureFrame
+from online_store import ONLINE_STORE_PATH, publish_features, publish_latest_from_warehouse
+from query_cache import cached_query
+from watermarks import ensure_watermark_tables, get_high_watermark, set_high_watermark
 import logging
 from datetime import datetime,  timezone
 
-def register_feature(cursor, feature_metadata):
-    """Upsert metadata info about features in feature_catalog table."""
-    insert_sql = """
-    MERGE INTO feature_catalog AS target
-    USING (SELECT %(feature_name)s AS feature_name) AS source
-    ON target.feature_name = source.feature_name
-    WHEN MATCHED THEN UPDATE SET
-        description = %(description)s,
-        data_type = %(data_type)s,
-        source_table = %(source_table)s,
-        transformation_summary = %(transformation_summary)s,
-        update_frequency = %(update_frequency)s,
-        quality_metrics = %(quality_metrics)s,
-        last_updated_at  = CURRENT_TIMESTAMP()
-    WHEN NOT MATCHED THEN INSERT (
-        feature_name, description, data_type,
-        source_table, transformation_summary,
-        update_frequency, quality_metrics, created_at
-    )
-    VALUES (
-        %(feature_name)s, %(description)s, %(data_type)s,
-        %(source_table)s, %(transformation_summary)s,
-        %(update_frequency)s, %(quality_metrics)s, CURRENT_TIMESTAMP()
-    )
-    """
-    cursor.execute(insert_sql, feature_metadata)
-    logging.info(f"Feature '{feature_metadata['feature_name']}' registered/updated in catalog.")
+# Number of feature rows sent per executemany call in write_features_to_iceberg
+WRITE_BATCH_SIZE = 10000
+
+# Rows per fetchmany() call when streaming query results (Arrow batches are sized by the server)
+FETCH_BATCH_SIZE = 100000
+
+# Persisted user_id -> latest event_time, maintained incrementally from fact_click_events
+LAST_ACTIVITY_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS user_last_activity (
+    user_id NUMBER PRIMARY KEY,
+    last_event_time TIMESTAMP_LTZ,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+LAST_ACTIVITY_WATERMARK = "user_last_activity"
+
+NS_PER_DAY = 86_400 * 10**9
+
+# sql: registry features computed in-warehouse; pandas: engineer_features in Python
+FEATURE_ENGINES = ("sql", "pandas")
+
+# Column order used when binding feature rows positionally
+FEATURE_TABLE_COLUMNS = ("customer_id", "feature_id", "feature_name", "feature_value", "feature_date", "created_at")
 
 def register_all_features(cursor):
-    """Register metadata for all features we engineer (Feature 1 & 2 only). Done manually for now.""" 
-    features = [
-        {
-            "feature_name": "days_since_signup",
-            "description": "Number of days since customer signed up",
-            "data_type": "INTEGER",
-            "source_table": "dim_customer",
-            "transformation_summary": "DATEDIFF(current_date, signup_date)",
-            "update_frequency": "daily",
-            "quality_metrics": "null_pct = 0, value_range: 0+"
-        },
-        {
-            "feature_name": "days_since_last_activity",
-            "description": "Days since last recorded click event",
-            "data_type": "INTEGER",
-            "source_table": "fact_click_events",
-            "transformation_summary": "DATEDIFF(current_date, MAX(event_time)) grouped by customer_id",
-            "update_frequency": "daily",
-            "quality_metrics": "null_pct < 5%"
-        },
-    ]
-    for feature in features:
-        register_feature(cursor, feature)
-
-def load_raw_data(cursor):
-    """Load raw data from Snowflake into pandas DataFrames."""
+    """Register catalog metadata for every feature in feature_registry.FEATURE_REGISTRY with one batched MERGE."""
+    register_catalog_entries(cursor)
+
+def iter_result_batches(cursor, batch_size=FETCH_BATCH_SIZE):
+    """
+    Yield the cursor's current result set as DataFrames of bounded size (lower-case columns).
+
+    Uses the Snowflake connector's Arrow-backed fetch_pandas_batches() when the cursor
+    supports it and falls back to fetchmany() for plain DB-API cursors.
+    """
+    if hasattr(cursor, "fetch_pandas_batches"):
+        try:
+            for batch in cursor.fetch_pandas_batches():
+                batch.columns = [col.lower() for col in batch.columns]
+                yield batch
+            return
+        except NotImplementedError:
+            pass
+        except Exception as e:
+            # Non-Arrow result formats raise before the first batch; anything later is a real error
+            if "arrow" not in str(e).lower():
+                raise
+            logging.info(f"Arrow batches unavailable ({e}); falling back to fetchmany.")
+
+    columns = [desc[0].lower() for desc in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield pd.DataFrame.from_records(rows, columns=columns)
+
+def _compact_events(batch):
+    """Keep only user_id/event_time with compact dtypes (int32 ids, UTC datetime64)."""
+    user_id = pd.to_numeric(batch["user_id"], errors="coerce")
+    event_time = pd.to_datetime(batch["event_time"], utc=True, errors="coerce")
+    valid = user_id.notna() & event_time.notna()
+    return pd.DataFrame({
+        "user_id": user_id[valid].astype("int32"),
+        "event_time": event_time[valid],
+    })
+
+def merge_last_activity(last_activity, batch_last_activity):
+    """Combine two user_id -> latest event_time Series, keeping the later time per user."""
+    if last_activity is None:
+        return batch_last_activity
+    return pd.concat([last_activity, batch_last_activity]).groupby(level=0, sort=False).max()
+
+def _utc_timestamp(value):
+    """A created_at mark (driver value or stored watermark text) as a UTC Timestamp; naive values are UTC."""
+    mark = pd.Timestamp(value)
+    return mark.tz_localize("UTC") if mark.tzinfo is None else mark.tz_convert("UTC")
+
+def refresh_last_activity_state(cursor, full_refresh=False):
+    """
+    Fold click events inserted since the last run into user_last_activity.
+
+    The high-water mark is fact_click_events.created_at (load time), not event_time,
+    so late-arriving events are still picked up. Only rows above the previous mark
+    are aggregated, so a daily run reads one day of clicks instead of the whole window.
+    full_refresh empties the state table and rebuilds it from all of fact_click_events.
+    """
+    cursor.execute(LAST_ACTIVITY_STATE_DDL)
+    ensure_watermark_tables(cursor)
+
+    if full_refresh:
+        cursor.execute("DELETE FROM user_last_activity")
+        previous_mark = None
+    else:
+        previous_mark = get_high_watermark(cursor, LAST_ACTIVITY_WATERMARK)
+
+    # Fix the upper bound first so rows landing during the refresh are left for the next run
+    cursor.execute("SELECT MAX(created_at) FROM fact_click_events")
+    new_mark = cursor.fetchone()[0]
+    if new_mark is None:
+        logging.info("fact_click_events is empty; last-activity state unchanged.")
+        return
+    # Bound in the backend's own text form, but compared as timestamps: Snowflake and SQLite
+    # render created_at differently (offsets, fractional seconds), so text order is not time order
+    new_mark = str(new_mark)
+    if previous_mark is not None and _utc_timestamp(new_mark) <= _utc_timestamp(previous_mark):
+        logging.info("No new click events since the last run; last-activity state unchanged.")
+        return
+
+    delta_filter = "AND created_at > %(previous_mark)s" if previous_mark is not None else ""
+    merge_sql = f"""
+    MERGE INTO user_last_activity AS target
+    USING (
+        SELECT user_id, MAX(event_time) AS last_event_time
+        FROM fact_click_events
+        WHERE user_id IS NOT NULL
+          AND event_time IS NOT NULL
+          AND created_at <= %(new_mark)s
+          {delta_filter}
+        GROUP BY user_id
+    ) AS source
+    ON target.user_id = source.user_id
+    WHEN MATCHED AND source.last_event_time > target.last_event_time THEN
+        UPDATE SET
+            target.last_event_time = source.last_event_time,
+            target.updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN
+        INSERT (user_id, last_event_time)
+        VALUES (source.user_id, source.last_event_time);
+    """
+    cursor.execute(merge_sql, {"previous_mark": previous_mark, "new_mark": new_mark})
+    set_high_watermark(cursor, LAST_ACTIVITY_WATERMARK, new_mark)
+    logging.info(f"Last-activity state refreshed with click events loaded after {previous_mark or 'the beginning'}.")
+
+def load_raw_data(cursor, batch_size=FETCH_BATCH_SIZE, incremental=True, full_refresh=False):
+    """
+    Load raw data from Snowflake into pandas DataFrames.
+
+    Click events are streamed in batches and folded into a running per-user latest
+    event_time, so peak memory is bounded by batch size plus one row per user rather
+    than by the 90-day event volume. The returned events_df therefore holds one row
+    per user (user_id, event_time = latest event).
+
+    With incremental=True the per-user latest event comes from the user_last_activity
+    state table (refreshed with new clicks only) instead of scanning the 90-day window;
+    the result is identical because a user's latest event is inside the window exactly
+    when they have any event inside it.
+    """
     #conn = get_snowflake_connection()
     #cursor = conn.cursor()
 
-    query_events = """
-    SELECT user_id, event_time
-    FROM fact_click_events
-    WHERE event_time >= DATEADD(day, -90, CURRENT_DATE())
-    """
+    if incremental:
+        refresh_last_activity_state(cursor, full_refresh=full_refresh)
+        query_events = f"""
+        SELECT user_id, last_event_time AS event_time
+        FROM user_last_activity
+        WHERE last_event_time >= DATEADD(day, -{ACTIVITY_LOOKBACK_DAYS}, {UTC_TODAY_SQL})
+        """
+    else:
+        query_events = f"""
+        SELECT user_id, event_time
+        FROM fact_click_events
+        WHERE event_time >= DATEADD(day, -{ACTIVITY_LOOKBACK_DAYS}, {UTC_TODAY_SQL})
+        """
     cursor.execute(query_events)
-    events = cursor.fetchall()
-    events_df = pd.DataFrame(events, columns=[desc[0] for desc in cursor.description])
+    last_activity = None
+    for batch in iter_result_batches(cursor, batch_size):
+        events = _compact_events(batch)
+        batch_last = events.groupby("user_id", sort=False)["event_time"].max()
+        last_activity = merge_last_activity(last_activity, batch_last)
+
+    if last_activity is None:
+        events_df = pd.DataFrame({
+            "user_id": pd.Series(dtype="int32"),
+            "event_time": pd.Series(dtype="datetime64[ns, UTC]"),
+        })
+    else:
+        events_df = last_activity.rename_axis("user_id").reset_index(name="event_time")
 
+    # Served from the local query cache while dim_customer is unchanged since the last run
     query_customers = """
     SELECT customer_id AS user_id, signup_date
     FROM dim_customer
     """
-    cursor.execute(query_customers)
-    customers = cursor.fetchall()
-    customers_df = pd.DataFrame(customers, columns=[desc[0] for desc in cursor.description])
+    customers = cached_query(cursor, query_customers, tables=("dim_customer",), batch_size=batch_size)
+    customers_df = pd.DataFrame({
+        "user_id": pd.to_numeric(customers["user_id"], errors="coerce").astype("Int32"),
+        "signup_date": pd.to_datetime(customers["signup_date"], errors="coerce"),
+    })
 
     #cursor.close()
     #conn.close()
 
     return events_df, customers_df
 
-def engineer_features(events_df, customers_df):
-    """Compute Features 1 and 2 only."""
-    customers_df.columns = [col.lower() for col in customers_df.columns]
-    customers_df["signup_date"] = pd.to_datetime(customers_df["signup_date"]).dt.tz_localize("UTC")
-    today = pd.Timestamp.today(tz="UTC").normalize()
-    customers_df["days_since_signup"] = (today - customers_df["signup_date"]).dt.days
+def _utc_ns(timestamps):
+    """Timestamps as int64 UTC nanoseconds plus a mask of missing values (naive input is taken as UTC)."""
+    values = (
+        pd.to_datetime(timestamps, utc=True, errors="coerce")
+        .dt.tz_convert(None)
+        .to_numpy(dtype="datetime64[ns]")
+    )
+    return values.view("int64"), np.isnat(values)
+
+def _days_between(reference_ns, timestamps_ns):
+    """Whole days from each timestamp to the reference (floored like Timedelta.days)."""
+    return (reference_ns - timestamps_ns) // NS_PER_DAY
+
+def engineer_features(events_df, customers_df, as_of=None, output="long"):
+    """
+    Compute Features 1 and 2 only.
 
-    events_df.columns = [col.lower() for col in events_df.columns]
-    events_df["event_time"] = pd.to_datetime(events_df["event_time"])
+    Keys stay integer, and both day differences are taken in numpy against a single
+    reference date (as_of, default today in UTC) so the features are consistent
+    even if the run straddles midnight.
 
-    last_activity = (
-        events_df.groupby("user_id")["event_time"]
+    Args:
+        events_df: DataFrame with user_id, event_time (raw events or one row per user)
+        customers_df: DataFrame with user_id, signup_date
+        as_of: date-like reference date, defaults to today (UTC)
+        output: "long" (user_id, feature_name, feature_value, feature_date; one row per
+                customer per feature), "wide" (one row per customer, one column per feature)
+                or "frame" (the long rows as a compact FeatureFrame)
+    """
+    if output not in ("long", "wide", "frame"):
+        raise ValueError(f"output must be 'long', 'wide' or 'frame', got {output!r}")
+
+    reference_date = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp.today(tz="UTC")
+    if reference_date.tzinfo is not None:
+        reference_date = reference_date.tz_convert("UTC").tz_localize(None)
+    reference_date = reference_date.normalize()
+    reference_ns = reference_date.as_unit("ns").value
+
+    customers_df = customers_df.rename(columns=str.lower)
+    events_df = events_df.rename(columns=str.lower)
+
+    # Integer customer keys (rows without a usable id cannot be joined to events)
+    customer_ids = pd.to_numeric(customers_df["user_id"], errors="coerce")
+    has_id = customer_ids.notna().to_numpy()
+    customer_ids = customer_ids[has_id].astype("int64").to_numpy()
+    signup_ns, signup_missing = _utc_ns(customers_df["signup_date"][has_id])
+    days_since_signup = np.where(signup_missing, np.nan, _days_between(reference_ns, signup_ns))
+
+    # Latest event per user (int64 ns, so the groupby never touches Timestamp objects)
+    event_ids = pd.to_numeric(events_df["user_id"], errors="coerce")
+    event_ns, event_missing = _utc_ns(events_df["event_time"])
+    valid = event_ids.notna().to_numpy() & ~event_missing
+    last_event_ns = (
+        pd.Series(event_ns[valid], index=event_ids[valid].astype("int64").to_numpy())
+        .groupby(level=0, sort=False)
         .max()
-        .reset_index()
-        .rename(columns={"event_time": "last_event_time"})
     )
-    today = pd.Timestamp.today(tz="UTC").normalize()
-    last_activity["days_since_last_activity"] = (
-        today - last_activity["last_event_time"]
-    ).dt.days
-
-    # Fix: Ensure consistent data types for merge
-    customers_df["user_id"] = customers_df["user_id"].astype(str)
-    last_activity["user_id"] = last_activity["user_id"].astype(str)
-
-    # Merge only Feature 1 & 2
-    features_df = customers_df[["user_id", "days_since_signup"]].merge(
-        last_activity[["user_id", "days_since_last_activity"]],
-        on="user_id",
-        how="left"
+    days_since_last = pd.Series(
+        _days_between(reference_ns, last_event_ns.to_numpy()).astype("float64"),
+        index=last_event_ns.index,
     )
 
-    features_df["days_since_last_activity"] = features_df["days_since_last_activity"].fillna(9999)
+    # Align last activity to customers by integer key; no activity in the window -> MISSING_FEATURE_VALUE
+    days_since_last_activity = days_since_last.reindex(customer_ids).fillna(MISSING_FEATURE_VALUE).to_numpy()
 
-    #features_df["days_since_last_activity"].fillna(9999, inplace=True)
+    features = {
+        "days_since_signup": days_since_signup,
+        "days_since_last_activity": days_since_last_activity,
+    }
 
-    # Reshape to long format
-    features_long = pd.melt(
-        features_df,
-        id_vars=["user_id"],
-        var_name="feature_name",
-        value_name="feature_value"
-    )
-    features_long["feature_date"] = pd.Timestamp.today().normalize()
+    if output == "wide":
+        features_wide = pd.DataFrame({"user_id": customer_ids, **features})
+        features_wide["feature_date"] = reference_date
+        return features_wide
+
+    if output == "frame":
+        return FeatureFrame.from_features(customer_ids, features, reference_date)
+
+    # Long format built directly from the arrays (same layout pd.melt produced)
+    n_customers = len(customer_ids)
+    features_long = pd.DataFrame({
+        "user_id": np.tile(customer_ids, len(features)),
+        "feature_name": np.repeat(np.array(list(features), dtype=object), n_customers),
+        "feature_value": np.concatenate(list(features.values())),
+    })
+    features_long["feature_date"] = reference_date
 
     return features_long
-def write_features_to_iceberg(cursor,features_df):
-    """Write the features DataFrame to Snowflake Iceberg table."""
+
+def _iter_batches(rows, batch_size):
+    """Yield consecutive slices of at most batch_size rows."""
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+def _write_feature_frame(cursor, frame, feature_map, batch_size):
+    """Insert a FeatureFrame's rows with executemany, converting only one batch to Python tuples at a time."""
+    insert_sql = """
+    INSERT INTO feature_engineered_iceberg (
+        customer_id, feature_id, feature_name, feature_value, feature_date, created_at
+    )
+    VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    for batch in frame.iter_row_batches(batch_size, feature_map, created_at):
+        cursor.executemany(insert_sql, batch)
+    logging.info(f"Inserted {len(frame)} feature rows in batches of {batch_size}.")
+
+def write_features_to_iceberg(cursor, features_df, batch_size=WRITE_BATCH_SIZE, feature_date=None, feature_map=None):
+    """Write the features DataFrame to Snowflake Iceberg table.
+
+    Rows are shipped with executemany in batches of batch_size, which the Snowflake
+    connector rewrites into one multi-row INSERT per batch. Pass batch_size=None to
+    fall back to the original one INSERT per row path (kept for benchmarking).
+
+    feature_date ("YYYY-MM-DD") replaces that date's partition instead of today's (backfills);
+    feature_map (feature_name -> feature_id) skips the feature_catalog lookup.
+    features_df may also be a FeatureFrame, whose rows are built one batch at a time.
+    """
     #conn = get_snowflake_connection()
     #cursor = conn.cursor()
 
-    # Step 1: Delete today's existing rows
-    cursor.execute("DELETE FROM feature_engineered_iceberg WHERE feature_date = CURRENT_DATE()")
+    # Step 1: Delete the partition's existing rows (today's unless a feature_date is given)
+    if feature_date is None:
+        cursor.execute(f"DELETE FROM feature_engineered_iceberg WHERE feature_date = {UTC_TODAY_SQL}")
+    else:
+        cursor.execute("DELETE FROM feature_engineered_iceberg WHERE feature_date = %(feature_date)s",
+                       {"feature_date": feature_date})
+
+    # Step 2: Get feature_id mapping from feature_catalog (cached until the catalog changes)
+    if feature_map is None:
+        catalog = cached_query(cursor, "SELECT feature_id, feature_name FROM feature_catalog", tables=("feature_catalog",))
+        feature_map = dict(zip(catalog["feature_name"], catalog["feature_id"].tolist()))
 
-    # Step 2: Get feature_id mapping from feature_catalog
-    cursor.execute("SELECT feature_id, feature_name FROM feature_catalog")
-    feature_map = {name: fid for fid, name in cursor.fetchall()}
+    if isinstance(features_df, FeatureFrame):
+        if batch_size is not None:
+            _write_feature_frame(cursor, features_df, feature_map, batch_size)
+            logging.info("Features written to Iceberg table successfully.")
+            return
+        features_df = features_df.to_long()
 
     # Step 3: Add feature_id to DataFrame
     features_df = features_df.rename(columns={"user_id": "customer_id"})
@@ -150,40 +360,107 @@ def write_features_to_iceberg(cursor,features_df):
     features_df["created_at"] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
     # Step 4: Insert feature rows with feature_id
-    insert_sql = """
-    INSERT INTO feature_engineered_iceberg (
-        customer_id, feature_id, feature_name, feature_value, feature_date, created_at
-    )
-    VALUES (
-        %(customer_id)s, %(feature_id)s, %(feature_name)s, %(feature_value)s, %(feature_date)s, %(created_at)s
-    )
-    """
-
-    for _, row in features_df.iterrows():
-        cursor.execute(insert_sql, row.to_dict())
+    if batch_size is None:
+        insert_sql = """
+        INSERT INTO feature_engineered_iceberg (
+            customer_id, feature_id, feature_name, feature_value, feature_date, created_at
+        )
+        VALUES (
+            %(customer_id)s, %(feature_id)s, %(feature_name)s, %(feature_value)s, %(feature_date)s, %(created_at)s
+        )
+        """
+        for _, row in features_df.iterrows():
+            cursor.execute(insert_sql, row.to_dict())
+    else:
+        insert_sql = """
+        INSERT INTO feature_engineered_iceberg (
+            customer_id, feature_id, feature_name, feature_value, feature_date, created_at
+        )
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        # Convert to plain Python values (None for missing) so the driver can bind them
+        feature_rows = features_df[list(FEATURE_TABLE_COLUMNS)].astype(object)
+        feature_rows = feature_rows.where(feature_rows.notna(), None)
+        rows = list(feature_rows.itertuples(index=False, name=None))
+        for batch in _iter_batches(rows, batch_size):
+            cursor.executemany(insert_sql, batch)
+        logging.info(f"Inserted {len(rows)} feature rows in batches of {batch_size}.")
 
     #conn.commit()
     #cursor.close()
     #conn.close()
     logging.info("Features written to Iceberg table successfully.")
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Feature engineering pipeline (features 1 & 2).")
+    parser.add_argument(
+        "--full-scan",
+        action="store_true",
+        help="Recompute last activity from the full 90-day fact_click_events window instead of the state table.",
+    )
+    parser.add_argument(
+        "--rebuild-state",
+        action="store_true",
+        help="Rebuild the user_last_activity state table from all of fact_click_events.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=PIPELINE_BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="Run against Snowflake or the local SQLite stand-in (data/local/marketing_pipeline.db, or PIPELINE_LOCAL_DB).",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=FEATURE_ENGINES,
+        default="sql",
+        help="sql: compute registered features in-warehouse with one INSERT ... SELECT; "
+             "pandas: pull rows into Python and compute with engineer_features.",
+    )
+    parser.add_argument(
+        "--publish-online",
+        action="store_true",
+        help=f"Also publish today's features to the online serving store ({ONLINE_STORE_PATH}, or PIPELINE_ONLINE_STORE).",
+    )
+    return parser.parse_args(argv)
+
+def main(incremental=True, rebuild_state=False, backend=None, engine="sql", publish_online=False):
     logging.basicConfig(level=logging.INFO)
     logging.info("Starting feature engineering pipeline (features 1 & 2 only).")
-    conn = get_snowflake_connection()
-    cursor = conn.cursor()
-
-    events_df, customers_df = load_raw_data(cursor)
-    features_df = engineer_features(events_df, customers_df)
-    write_features_to_iceberg(cursor,features_df)
-
-    
-    register_all_features(cursor)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_connection_pool(connect=get_backend_connect(backend)).connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # Each stage is measured separately so the bottleneck shows up in ingestion_logs
+            if engine == "sql":
+                if incremental:
+                    with instrument_step("feature_refresh_state", cursor) as metrics:
+                        refresh_last_activity_state(metrics["cursor"], full_refresh=rebuild_state)
+                with instrument_step("feature_compute_in_warehouse", cursor) as metrics:
+                    compute_features_in_warehouse(metrics["cursor"], incremental=incremental)
+                if publish_online:
+                    with instrument_step("feature_publish_online", cursor) as metrics:
+                        publish_latest_from_warehouse(metrics["cursor"])
+            else:
+                # Catalog first so every written row gets its feature_id
+                with instrument_step("feature_register_features", cursor) as metrics:
+                    register_all_features(metrics["cursor"])
+                with instrument_step("feature_load_raw_data", cursor) as metrics:
+                    events_df, customers_df = load_raw_data(metrics["cursor"], incremental=incremental, full_refresh=rebuild_state)
+                with instrument_step("feature_engineer_features", log_cursor=cursor):
+                    features_df = engineer_features(events_df, customers_df, output="frame")
+                with instrument_step("feature_write_features", cursor) as metrics:
+                    write_features_to_iceberg(metrics["cursor"], features_df)
+                if publish_online:
+                    with instrument_step("feature_publish_online", log_cursor=cursor):
+                        publish_features(features_df)
+            conn.commit()
+        finally:
+            cursor.close()
+            write_metrics_files()
+    close_connection_pool()
 
     logging.info("Feature engineering pipeline completed successfully.")
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(incremental=not args.full_scan, rebuild_state=args.rebuild_state, backend=args.backend, engine=args.engine,
+         publish_online=args.publish_online)
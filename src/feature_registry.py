@@ -0,0 +1,202 @@
+# src/feature_registry.py
+import logging
+
+# Feature values written for customers a feature cannot be computed for (e.g. no activity in the window)
+MISSING_FEATURE_VALUE = 9999
+
+# Lookback window (days) for activity-based features; older activity counts as "no activity"
+ACTIVITY_LOOKBACK_DAYS = 90
+
+# Today's date in UTC whatever the session's TIMEZONE, so feature_date and day counts match
+# engineer_features (which counts against today in UTC); use it instead of CURRENT_DATE()
+UTC_TODAY_SQL = "CONVERT_TIMEZONE('UTC', CURRENT_TIMESTAMP())::DATE"
+
+# Per-customer relations features can read, LEFT JOINed to dim_customer (alias c) on customer_id.
+# Each source exposes customer_id as VARCHAR (dim_customer's key type). "incremental_sql", when
+# present, is used instead of "sql" in incremental runs (e.g. a maintained state table).
+FEATURE_SOURCES = {
+    "last_activity": {
+        "sql": f"""
+            SELECT CAST(user_id AS VARCHAR) AS customer_id, MAX(event_time) AS last_event_time
+            FROM fact_click_events
+            WHERE event_time >= DATEADD(day, -{ACTIVITY_LOOKBACK_DAYS}, {UTC_TODAY_SQL})
+            GROUP BY user_id
+        """,
+        "incremental_sql": f"""
+            SELECT CAST(user_id AS VARCHAR) AS customer_id, last_event_time
+            FROM user_last_activity
+            WHERE last_event_time >= DATEADD(day, -{ACTIVITY_LOOKBACK_DAYS}, {UTC_TODAY_SQL})
+        """,
+    },
+}
+
+# Declarative feature registry: each feature declares its SQL once, next to its catalog metadata.
+#
+# Keys:
+#   feature_name, description, data_type, source_table,
+#   transformation_summary, update_frequency, quality_metrics   -> feature_catalog columns
+#   expression   SQL over c (dim_customer) and the aliases in sources, one value per customer
+#                (reference date: UTC_TODAY_SQL, not the session-dependent CURRENT_DATE())
+#   sources      FEATURE_SOURCES names the expression reads (joined once per query, shared by features)
+FEATURE_REGISTRY = [
+    {
+        "feature_name": "days_since_signup",
+        "description": "Number of days since customer signed up",
+        "data_type": "INTEGER",
+        "source_table": "dim_customer",
+        "transformation_summary": "DATEDIFF(current_date, signup_date)",
+        "update_frequency": "daily",
+        "quality_metrics": "null_pct = 0, value_range: 0+",
+        "expression": f"DATEDIFF(day, c.signup_date, {UTC_TODAY_SQL})",
+        "sources": (),
+    },
+    {
+        "feature_name": "days_since_last_activity",
+        "description": "Days since last recorded click event",
+        "data_type": "INTEGER",
+        "source_table": "fact_click_events",
+        "transformation_summary": "DATEDIFF(current_date, MAX(event_time)) grouped by customer_id",
+        "update_frequency": "daily",
+        "quality_metrics": "null_pct < 5%",
+        # Whole days elapsed up to today's UTC midnight, matching engineer_features (DATEDIFF(day) counts date
+        # boundaries); the event time is taken to UTC first so the session TIMEZONE does not shift either side
+        "expression": (f"COALESCE(FLOOR(DATEDIFF(second, CONVERT_TIMEZONE('UTC', last_activity.last_event_time)::TIMESTAMP_NTZ, "
+                       f"{UTC_TODAY_SQL}) / 86400.0), {MISSING_FEATURE_VALUE})"),
+        "sources": ("last_activity",),
+    },
+]
+
+# feature_catalog columns carried by every registry entry
+CATALOG_COLUMNS = (
+    "feature_name", "description", "data_type", "source_table",
+    "transformation_summary", "update_frequency", "quality_metrics",
+)
+
+
+def register_sql_feature(feature):
+    """Add (or replace, by feature_name) a feature in the registry (see FEATURE_REGISTRY for the keys)."""
+    missing = [key for key in CATALOG_COLUMNS + ("expression",) if key not in feature]
+    if missing:
+        raise ValueError(f"Feature '{feature.get('feature_name')}' is missing {missing}")
+    unknown = [source for source in feature.get("sources", ()) if source not in FEATURE_SOURCES]
+    if unknown:
+        raise ValueError(f"Feature '{feature['feature_name']}' reads unknown source(s) {unknown}")
+    FEATURE_REGISTRY[:] = [f for f in FEATURE_REGISTRY if f["feature_name"] != feature["feature_name"]]
+    FEATURE_REGISTRY.append(feature)
+
+
+def register_catalog_entries(cursor, features=None):
+    """
+    Upsert catalog metadata for all features with one MERGE (a UNION ALL of bound rows as the source).
+    """
+    features = FEATURE_REGISTRY if features is None else features
+    if not features:
+        return
+
+    params = {}
+    source_rows = []
+    for i, feature in enumerate(features):
+        columns = []
+        for column in CATALOG_COLUMNS:
+            params[f"{column}_{i}"] = feature[column]
+            columns.append(f"%({column}_{i})s AS {column}")
+        source_rows.append("SELECT " + ", ".join(columns))
+
+    update_set = ",\n        ".join(f"{column} = source.{column}" for column in CATALOG_COLUMNS[1:])
+    # Only entries whose metadata changed are rewritten, so last_updated_at tracks real changes
+    # (query_cache keys feature_catalog lookups on it)
+    changed = "\n        OR ".join(f"target.{column} IS DISTINCT FROM source.{column}" for column in CATALOG_COLUMNS[1:])
+    merge_sql = f"""
+    MERGE INTO feature_catalog AS target
+    USING (
+        {" UNION ALL ".join(source_rows)}
+    ) AS source
+    ON target.feature_name = source.feature_name
+    WHEN MATCHED AND (
+        {changed}
+    ) THEN UPDATE SET
+        {update_set},
+        last_updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (
+        {", ".join(CATALOG_COLUMNS)}, created_at
+    )
+    VALUES (
+        {", ".join(f"source.{column}" for column in CATALOG_COLUMNS)}, CURRENT_TIMESTAMP()
+    )
+    """
+    cursor.execute(merge_sql, params)
+    logging.info(f"Registered/updated {len(features)} feature(s) in feature_catalog with one MERGE.")
+
+
+def compile_feature_query(features=None, incremental=True):
+    """
+    Compile all features into one set-based INSERT ... SELECT into feature_engineered_iceberg.
+
+    A wide per-customer row (one column per feature) is built once from dim_customer and the
+    sources the features need, then unpivoted by crossing it with the matching catalog rows,
+    which also supplies feature_id. Rows are stamped with today's UTC date (UTC_TODAY_SQL) as feature_date.
+    """
+    features = FEATURE_REGISTRY if features is None else features
+    source_names = []
+    for feature in features:
+        for source in feature.get("sources", ()):
+            if source not in source_names:
+                source_names.append(source)
+
+    joins = []
+    for name in source_names:
+        source = FEATURE_SOURCES[name]
+        source_sql = source.get("incremental_sql", source["sql"]) if incremental else source["sql"]
+        joins.append(f"LEFT JOIN ({source_sql}) AS {name}\n            ON {name}.customer_id = CAST(c.customer_id AS VARCHAR)")
+
+    wide_columns = ",\n               ".join(
+        f"{feature['expression']} AS feature_{i}" for i, feature in enumerate(features)
+    )
+    unpivot_cases = "\n            ".join(
+        f"WHEN '{feature['feature_name']}' THEN wide.feature_{i}" for i, feature in enumerate(features)
+    )
+    feature_names = ", ".join(f"'{feature['feature_name']}'" for feature in features)
+    newline = "\n        "
+
+    return f"""
+    INSERT INTO feature_engineered_iceberg (
+        customer_id, feature_id, feature_name, feature_value, feature_date, created_at
+    )
+    SELECT
+        wide.customer_id,
+        cat.feature_id,
+        cat.feature_name,
+        CASE cat.feature_name
+            {unpivot_cases}
+        END AS feature_value,
+        {UTC_TODAY_SQL},
+        CURRENT_TIMESTAMP()
+    FROM (
+        SELECT c.customer_id,
+               {wide_columns}
+        FROM dim_customer AS c
+        {newline.join(joins)}
+    ) AS wide
+    CROSS JOIN feature_catalog AS cat
+    WHERE cat.feature_name IN ({feature_names})
+    """
+
+
+def compute_features_in_warehouse(cursor, features=None, incremental=True):
+    """
+    Compute every registered feature in the warehouse and write today's rows to feature_engineered_iceberg.
+
+    Catalog entries are upserted first (one MERGE) so every feature has a feature_id, then
+    today's rows are replaced by a single INSERT ... SELECT; no rows pass through Python.
+
+    Returns:
+        number of feature rows written (cursor rowcount)
+    """
+    features = FEATURE_REGISTRY if features is None else features
+    register_catalog_entries(cursor, features)
+
+    cursor.execute(f"DELETE FROM feature_engineered_iceberg WHERE feature_date = {UTC_TODAY_SQL}")
+    cursor.execute(compile_feature_query(features, incremental=incremental))
+    rows_written = cursor.rowcount
+    logging.info(f"Computed {len(features)} feature(s) in-warehouse; {rows_written} rows written.")
+    return rows_written
@@ -0,0 +1,255 @@
+# src/instrumentation.py
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from utils import log_to_snowflake
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage; steps then report no peak RSS
+    resource = None
+
+# Optional local sinks for per-step metrics (unset = disabled)
+METRICS_JSON_PATH = os.getenv("PIPELINE_METRICS_JSON")
+METRICS_PROM_PATH = os.getenv("PIPELINE_METRICS_PROM")
+
+# tracemalloc slows allocation-heavy Python code, so peak-heap tracking is opt-in (PIPELINE_TRACE_MEMORY=1);
+# the process peak RSS (getrusage) is free and recorded for every step
+TRACE_MEMORY = os.getenv("PIPELINE_TRACE_MEMORY", "0") == "1"
+
+# Characters of each statement kept in the per-query metrics
+SQL_PREVIEW_CHARS = 120
+
+# Statements whose rowcount is rows written; a SELECT's rowcount (rows returned) is kept per query only
+_DML_RE = re.compile(r"\s*(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+_metrics_lock = threading.Lock()
+_run_metrics = []
+_active_steps = 0
+
+
+class InstrumentedCursor:
+    """
+    Wraps a DB-API cursor and records wall time, rowcount and query ID of every execute.
+    The step's rows metric only sums rowcounts of INSERT / UPDATE / DELETE / MERGE statements.
+
+    Snowflake cursors expose the query ID as sfqid; bytes scanned is not on the cursor,
+    but the recorded IDs can be joined to INFORMATION_SCHEMA.QUERY_HISTORY for it.
+    """
+
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, sql, *args):
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            rowcount = getattr(self._cursor, "rowcount", None)
+            rowcount = rowcount if isinstance(rowcount, int) and rowcount >= 0 else None
+            query_id = getattr(self._cursor, "sfqid", None)
+            self._metrics["queries"].append({
+                "sql": " ".join(sql.split())[:SQL_PREVIEW_CHARS],
+                "seconds": round(elapsed, 4),
+                "rowcount": rowcount,
+                "query_id": query_id,
+            })
+            self._metrics["sql_seconds"] += elapsed
+            if rowcount and _DML_RE.match(sql):
+                self._metrics["rows"] += rowcount
+            if query_id:
+                self._metrics["query_ids"].append(query_id)
+
+    def execute(self, sql, params=None):
+        if params is None:
+            return self._timed(self._cursor.execute, sql)
+        return self._timed(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(self._cursor.executemany, sql, seq_of_params)
+
+
+def _start_memory_tracking():
+    global _active_steps
+    with _metrics_lock:
+        _active_steps += 1
+        if not TRACE_MEMORY:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif _active_steps == 1:
+            tracemalloc.reset_peak()
+
+
+def _stop_memory_tracking():
+    """Peak traced bytes since the earliest still-running step started (process-wide, so overlapping steps share it)."""
+    global _active_steps
+    with _metrics_lock:
+        _active_steps -= 1
+        if not TRACE_MEMORY or not tracemalloc.is_tracing():
+            return None
+        _, peak = tracemalloc.get_traced_memory()
+        if _active_steps == 0:
+            tracemalloc.stop()
+        return peak
+
+
+def _peak_rss_bytes():
+    """Process high-water RSS so far (ru_maxrss is KiB on Linux, bytes on macOS), or None without getrusage."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _summary(metrics):
+    slowest = max(metrics["queries"], key=lambda query: query["seconds"], default=None)
+    peak = metrics["peak_memory_bytes"]
+    peak_rss = metrics["peak_rss_bytes"]
+    parts = [
+        f"{metrics['status']} in {metrics['seconds']:.3f}s",
+        f"{len(metrics['queries'])} queries ({metrics['sql_seconds']:.3f}s in SQL)",
+        f"{metrics['rows']} rows written",
+    ]
+    if peak_rss is not None:
+        parts.append(f"peak RSS {peak_rss / 2**20:.1f} MB")
+    if peak is not None:
+        parts.append(f"peak heap {peak / 2**20:.1f} MB")
+    if slowest:
+        parts.append(f"slowest query {slowest['seconds']:.3f}s [{slowest['query_id'] or 'n/a'}]: {slowest['sql'][:60]}")
+    return "; ".join(parts)
+
+
+@contextmanager
+def instrument_step(step_name, cursor=None, log_cursor=None):
+    """
+    Measure one pipeline step.
+
+    Yields a metrics dict; when cursor is given, metrics["cursor"] is an InstrumentedCursor
+    the step should use so its queries are recorded. On exit the metrics are kept for
+    write_metrics_files and sent to ingestion_logs (on log_cursor, defaulting to cursor).
+
+    Usage:
+        with instrument_step("load_csv", cursor) as metrics:
+            load_csv(metrics["cursor"])
+    """
+    metrics = {
+        "step": step_name,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "status": "running",
+        "seconds": None,
+        "sql_seconds": 0.0,
+        "rows": 0,
+        "peak_memory_bytes": None,
+        "peak_rss_bytes": None,
+        "queries": [],
+        "query_ids": [],
+    }
+    if cursor is not None:
+        metrics["cursor"] = InstrumentedCursor(cursor, metrics)
+
+    _start_memory_tracking()
+    start = time.perf_counter()
+    try:
+        yield metrics
+        metrics["status"] = "success"
+    except Exception:
+        metrics["status"] = "failed"
+        raise
+    finally:
+        metrics["seconds"] = round(time.perf_counter() - start, 4)
+        metrics["sql_seconds"] = round(metrics["sql_seconds"], 4)
+        metrics["peak_memory_bytes"] = _stop_memory_tracking()
+        metrics["peak_rss_bytes"] = _peak_rss_bytes()
+        metrics.pop("cursor", None)
+        with _metrics_lock:
+            _run_metrics.append(metrics)
+
+        summary = _summary(metrics)
+        logging.info(f"Step metrics {step_name}: {summary}")
+        log_cursor = log_cursor if log_cursor is not None else cursor
+        if log_cursor is not None:
+            log_to_snowflake(log_cursor, "INFO" if metrics["status"] == "success" else "ERROR",
+                             step_name, f"Step metrics: {summary}", records_loaded=metrics["rows"])
+
+
+def get_run_metrics():
+    """Metrics of every step measured so far in this process (oldest first)."""
+    with _metrics_lock:
+        return list(_run_metrics)
+
+
+def reset_run_metrics():
+    with _metrics_lock:
+        _run_metrics.clear()
+
+
+def _prometheus_text(run_metrics):
+    gauges = [
+        ("pipeline_step_duration_seconds", "Wall time of the pipeline step.", "seconds"),
+        ("pipeline_step_sql_seconds", "Time the step spent waiting on SQL.", "sql_seconds"),
+        ("pipeline_step_rows", "Rows inserted, updated or deleted by the step's DML statements.", "rows"),
+        ("pipeline_step_queries", "SQL statements executed by the step.", None),
+        ("pipeline_step_peak_memory_bytes", "Peak Python heap while the step ran (PIPELINE_TRACE_MEMORY=1).",
+         "peak_memory_bytes"),
+        ("pipeline_step_peak_rss_bytes", "Process peak RSS by the end of the step.", "peak_rss_bytes"),
+        ("pipeline_step_success", "1 if the step succeeded, 0 otherwise.", None),
+    ]
+    # Latest run of each step wins
+    latest = {metrics["step"]: metrics for metrics in run_metrics}
+    lines = []
+    for metric_name, help_text, key in gauges:
+        lines.append(f"# HELP {metric_name} {help_text}")
+        lines.append(f"# TYPE {metric_name} gauge")
+        for step, metrics in latest.items():
+            if metric_name == "pipeline_step_queries":
+                value = len(metrics["queries"])
+            elif metric_name == "pipeline_step_success":
+                value = int(metrics["status"] == "success")
+            else:
+                value = metrics[key]
+            if value is not None:
+                lines.append(f'{metric_name}{{step="{step}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_files(json_path=METRICS_JSON_PATH, prom_path=METRICS_PROM_PATH, run_metrics=None):
+    """
+    Write collected step metrics to the optional local sinks.
+
+    Args:
+        json_path: str or None - one JSON line per run is appended ({"run_at": ..., "steps": [...]})
+        prom_path: str or None - Prometheus textfile-collector file, replaced atomically
+        run_metrics: list or None - defaults to get_run_metrics()
+    """
+    run_metrics = get_run_metrics() if run_metrics is None else run_metrics
+    if not run_metrics:
+        return
+
+    try:
+        if json_path:
+            os.makedirs(os.path.dirname(os.path.abspath(json_path)), exist_ok=True)
+            with open(json_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"run_at": datetime.now(timezone.utc).isoformat(), "steps": run_metrics},
+                                   default=str) + "\n")
+        if prom_path:
+            os.makedirs(os.path.dirname(os.path.abspath(prom_path)), exist_ok=True)
+            tmp_path = f"{prom_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(_prometheus_text(run_metrics))
+            os.replace(tmp_path, prom_path)
+    except OSError as e:
+        logging.error(f"Failed to write step metrics files: {e}")
@@ -0,0 +1,379 @@
+# src/json_prevalidation.py
+import argparse
+import filecmp
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Output root: clean/ holds Parquet chunks (the clickstream Parquet stage), rejects/ one JSONL file per source,
+# manifests/ the size and mtime each source had when its chunks were written
+PREVALIDATION_DIR = os.getenv("PIPELINE_PREVALIDATION_DIR", os.path.join(REPO_ROOT, "data", "prevalidated"))
+
+# Records validated (and written as one Parquet chunk) at a time
+PREVALIDATION_BATCH_SIZE = 100_000
+
+# Bytes read from the source file per block; the parser never holds more than a block plus one record
+READ_BLOCK_BYTES = 8 * 2**20
+
+# A record still undecodable after this many buffered bytes is rejected instead of waiting for more input
+MAX_RECORD_BYTES = 2**20
+
+# page_url is cut (at a query-parameter boundary) to this many characters
+MAX_PAGE_URL_LENGTH = 512
+
+# raw_clickstream columns, in table order, and their Arrow types in the clean chunks
+CLICKSTREAM_SCHEMA = pa.schema([
+    ("event_id", pa.string()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("user_id", pa.int64()),
+    ("event_type", pa.string()),
+    ("page_url", pa.string()),
+    ("duration_ms", pa.int64()),
+])
+
+_COLUMNS = [field.name for field in CLICKSTREAM_SCHEMA]
+_COLUMN_SET = frozenset(_COLUMNS)
+_WHITESPACE = " \t\r\n"
+_DECODER = json.JSONDecoder()
+
+# <name>_00000.parquet chunk names, so one source's chunks are never mistaken for another's (clicks vs clicks_2)
+_CHUNK_NAME = "{name}_{index:05d}.parquet"
+_CHUNK_RE = r"^{name}_\d{{5}}\.parquet$"
+
+
+class InvalidJSONFileError(ValueError):
+    """A JSON-array file whose array is malformed: no record boundary after the error can be trusted."""
+
+
+def iter_json_records(path, block_bytes=READ_BLOCK_BYTES):
+    """
+    Stream records from a JSON-array or newline-delimited JSON file.
+
+    Objects are decoded one at a time with the C-accelerated raw_decode straight from a
+    rolling text buffer, so a multi-GB array is never loaded (or split into lines) whole.
+    A file starting with '[' is parsed as one top-level array (values separated by commas,
+    closed by ']'); a syntax error raises InvalidJSONFileError, since a pretty-printed
+    array cannot be resynchronised on lines. Otherwise every line holds one record and an
+    undecodable line is yielded as a reject.
+
+    Yields:
+        (record, None) for every decoded value, or (None, raw_text) for a newline-delimited line that is not valid JSON
+    """
+    with open(path, encoding="utf-8") as f:
+        buffer, pos, eof, offset = "", 0, False, 0
+
+        def fill():
+            """Drop the consumed text and append the next block; False once the file is exhausted."""
+            nonlocal buffer, pos, eof, offset
+            chunk = f.read(block_bytes)
+            eof = not chunk
+            offset += pos
+            buffer, pos = buffer[pos:] + chunk, 0
+            return not eof
+
+        def peek():
+            """Skip whitespace and return the next character ('' at end of file)."""
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not fill():
+                    return ""
+
+        def decode():
+            """Decode the value at pos, reading on while it may be cut at the block boundary."""
+            nonlocal pos
+            while True:
+                try:
+                    record, end = _DECODER.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if not eof and len(buffer) - pos < MAX_RECORD_BYTES + block_bytes:
+                        fill()
+                        continue
+                    raise
+                if end == len(buffer) and not eof:
+                    # A bare number or literal may continue in the next block
+                    fill()
+                    continue
+                pos = end
+                return record
+
+        def invalid(message):
+            return InvalidJSONFileError(f"{path}: {message} at character {offset + pos}")
+
+        if peek() == "[":
+            pos += 1
+            if peek() == "]":
+                pos += 1
+            else:
+                while True:
+                    try:
+                        record = decode()
+                    except json.JSONDecodeError as e:
+                        raise invalid(f"invalid array element ({e.msg})") from None
+                    yield record, None
+                    separator = peek()
+                    if separator not in (",", "]"):
+                        raise invalid("expected ',' or ']'" if separator else "unterminated array")
+                    pos += 1
+                    if separator == "]":
+                        break
+                    peek()
+            if peek():
+                raise invalid("unexpected data after the top-level array")
+            return
+
+        while peek():
+            try:
+                record = decode()
+            except json.JSONDecodeError:
+                # Malformed: reject up to the end of the line and resynchronise there
+                line_end = buffer.find("\n", pos)
+                line_end = len(buffer) if line_end < 0 else line_end
+                yield None, buffer[pos:line_end]
+                pos = line_end
+                continue
+            yield record, None
+
+
+def _canonical_urls(urls):
+    """
+    Lower-case scheme and host, drop #fragments, and cut URLs longer than MAX_PAGE_URL_LENGTH
+    back to the last complete query parameter that fits.
+    """
+    # Arrow-backed strings run the regexes in C++; the rewrites only touch rows that need them
+    urls = urls.astype("string[pyarrow]").str.strip()
+    has_fragment = urls.str.contains("#", regex=False).fillna(False)
+    if has_fragment.any():
+        urls = urls.mask(has_fragment, urls[has_fragment].str.replace(r"#.*$", "", regex=True))
+    upper_origin = urls.str.contains(r"^[A-Za-z][A-Za-z0-9+.\-]*://[^/?#]*[A-Z]", regex=True).fillna(False)
+    if upper_origin.any():
+        parts = urls[upper_origin].str.extract(r"^(?P<origin>[^/?#]*://[^/?#]*)(?P<rest>.*)$")
+        urls = urls.mask(upper_origin, parts["origin"].str.lower() + parts["rest"])
+
+    too_long = (urls.str.len() > MAX_PAGE_URL_LENGTH).fillna(False)
+    if too_long.any():
+        cut = urls[too_long].str.slice(0, MAX_PAGE_URL_LENGTH)
+        # Drop the partial parameter left at the end ("...&key=val" -> "...")
+        cut = cut.where(~cut.str.contains(r"[?&]", regex=True), cut.str.replace(r"[?&][^?&]*$", "", regex=True))
+        urls = urls.mask(too_long, cut)
+    return urls, too_long
+
+
+def validate_batch(records):
+    """
+    Validate and normalize one batch of decoded records column-wise.
+
+    Keys are matched case-insensitively (like MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE).
+    Rejected: non-objects, missing event_id, unparseable timestamp, non-integer user_id or
+    duration_ms, negative duration, and repeated event_ids within the batch (first kept).
+    A null user_id or duration_ms is kept as NULL, as the raw_clickstream load accepts it;
+    a missing timestamp is rejected on purpose (stricter than the load), since such an
+    event can never be placed in the event_time-bounded fact MERGE or its exports.
+
+    Returns:
+        (clean DataFrame in CLICKSTREAM_SCHEMA order, rejects DataFrame with reason and record,
+         number of page_urls truncated)
+    """
+    is_object = np.array([isinstance(record, dict) for record in records], dtype=bool)
+    # Only records with keys outside the expected lower-case names pay for re-keying
+    objects = [
+        record if record.keys() <= _COLUMN_SET else {str(key).lower(): value for key, value in record.items()}
+        for record, ok in zip(records, is_object) if ok
+    ]
+    frame = pd.DataFrame({column: [record.get(column) for record in objects] for column in _COLUMNS})
+
+    event_id = frame["event_id"].astype("string").str.strip()
+    timestamp = pd.to_datetime(frame["timestamp"].astype("string"), utc=True, errors="coerce", format="ISO8601")
+    user_id = pd.to_numeric(frame["user_id"], errors="coerce")
+    duration_ms = pd.to_numeric(frame["duration_ms"], errors="coerce")
+    page_url, truncated = _canonical_urls(frame["page_url"].astype("string"))
+
+    reasons = pd.Series(pd.NA, index=frame.index, dtype="string")
+    # Later checks overwrite earlier ones, so a reject carries its most basic failure (listed last)
+    checks = [
+        ("duplicate_event_id", event_id.notna() & event_id.duplicated(keep="first")),
+        ("invalid_duration_ms", frame["duration_ms"].notna() & (duration_ms.isna() | (duration_ms < 0) | (duration_ms % 1 != 0))),
+        ("invalid_user_id", frame["user_id"].notna() & (user_id.isna() | (user_id % 1 != 0))),
+        ("invalid_timestamp", timestamp.isna()),
+        ("missing_event_id", event_id.isna() | (event_id == "")),
+    ]
+    for reason, failed in checks:
+        reasons = reasons.mask(failed.fillna(True).astype(bool), reason)
+
+    valid = reasons.isna().to_numpy()
+    clean = pd.DataFrame({
+        "event_id": event_id[valid],
+        "timestamp": timestamp[valid].dt.floor("us"),
+        "user_id": user_id[valid].astype("Int64"),
+        "event_type": frame["event_type"].astype("string").str.strip().str.lower()[valid],
+        "page_url": page_url[valid],
+        "duration_ms": duration_ms[valid].astype("Int64"),
+    })
+
+    rejects = pd.DataFrame({"reason": reasons[~valid].astype(object), "record": [objects[i] for i in np.flatnonzero(~valid)]})
+    if not is_object.all():
+        not_objects = pd.DataFrame({"reason": "not_an_object",
+                                    "record": [record for record, ok in zip(records, is_object) if not ok]})
+        rejects = pd.concat([rejects, not_objects], ignore_index=True)
+    return clean, rejects, int(truncated[valid].sum())
+
+
+def _write_rejects(rejects_file, source, rejects):
+    for reason, record in zip(rejects["reason"], rejects["record"]):
+        rejects_file.write(json.dumps({"source": source, "reason": reason, "record": record}, default=str) + "\n")
+
+
+def _source_signature(path, batch_size):
+    """What the chunks of path depend on: its size and mtime, and how records were batched."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "batch_size": batch_size}
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_chunk(clean_dir, chunk_path, clean):
+    """Write a chunk, leaving an existing identical file untouched so its mtime/etag (and file state) stay the same."""
+    # Dot-prefixed until complete, so a stage listing never picks up a partial chunk
+    tmp_path = os.path.join(clean_dir, f".{os.path.basename(chunk_path)}.tmp")
+    pq.write_table(pa.Table.from_pandas(clean, schema=CLICKSTREAM_SCHEMA, preserve_index=False),
+                   tmp_path, compression="zstd")
+    if os.path.exists(chunk_path) and filecmp.cmp(tmp_path, chunk_path, shallow=False):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, chunk_path)
+
+
+def prevalidate_file(path, out_dir=PREVALIDATION_DIR, batch_size=PREVALIDATION_BATCH_SIZE, name=None):
+    """
+    Parse, validate and normalize one clickstream file into clean Parquet chunks plus a reject file.
+
+    Chunks are written as <out_dir>/clean/<name>_00000.parquet (one per batch, under a temporary
+    name until complete); rejected records go to <out_dir>/rejects/<name>.rejects.jsonl.
+    name defaults to the file name without its extension; a relative path such as "a/clicks"
+    (see prevalidate_dir) puts the outputs in matching subdirectories.
+    A source whose size and mtime match its manifest from the previous run is skipped, and
+    a rewritten chunk identical to the existing one is not replaced, so unchanged chunks keep
+    their names, contents and mtimes and load_json's file state does not copy them again.
+    A JSON array that fails to parse rejects the whole file (no chunks are kept for it).
+
+    Returns:
+        dict with records, clean, rejected, truncated_urls, the chunk paths and skipped
+        (True when the stats are the previous run's, for an unchanged source)
+    """
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+    subdir, name = os.path.split(name)
+    clean_dir = os.path.join(out_dir, "clean", subdir)
+    rejects_dir = os.path.join(out_dir, "rejects", subdir)
+    manifest_dir = os.path.join(out_dir, "manifests", subdir)
+    for directory in (clean_dir, rejects_dir, manifest_dir):
+        os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(manifest_dir, f"{name}.json")
+    chunk_re = re.compile(_CHUNK_RE.format(name=re.escape(name)))
+
+    signature = _source_signature(path, batch_size)
+    manifest = _read_manifest(manifest_path)
+    if (manifest is not None and manifest.get("signature") == signature
+            and all(os.path.exists(chunk) for chunk in manifest["stats"]["chunks"])):
+        logging.info(f"Skipping prevalidation of {path}: unchanged since its chunks were written.")
+        return dict(manifest["stats"], skipped=True)
+
+    stats = {"records": 0, "clean": 0, "rejected": 0, "truncated_urls": 0, "chunks": []}
+    with open(os.path.join(rejects_dir, f"{name}.rejects.jsonl"), "w", encoding="utf-8") as rejects_file:
+
+        def flush(records):
+            clean, rejects, truncated = validate_batch(records)
+            if len(clean):
+                chunk_path = os.path.join(clean_dir, _CHUNK_NAME.format(name=name, index=len(stats["chunks"])))
+                _write_chunk(clean_dir, chunk_path, clean)
+                stats["chunks"].append(chunk_path)
+            _write_rejects(rejects_file, path, rejects)
+            stats["records"] += len(records)
+            stats["clean"] += len(clean)
+            stats["rejected"] += len(rejects)
+            stats["truncated_urls"] += truncated
+
+        batch = []
+        try:
+            for record, raw_text in iter_json_records(path):
+                if raw_text is not None:
+                    _write_rejects(rejects_file, path, pd.DataFrame({"reason": ["invalid_json"], "record": [raw_text]}))
+                    stats["records"] += 1
+                    stats["rejected"] += 1
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+        except InvalidJSONFileError as e:
+            logging.error(f"Rejecting {path}: {e}")
+            rejects_file.seek(0)
+            rejects_file.truncate()
+            _write_rejects(rejects_file, path, pd.DataFrame({"reason": ["invalid_json_file"], "record": [str(e)]}))
+            stats.update(records=stats["records"] + len(batch), clean=0, truncated_urls=0, chunks=[])
+            stats["rejected"] = stats["records"]
+
+    # Chunks past the new count (or of a rejected file) would otherwise be loaded alongside the current ones
+    for stale in os.listdir(clean_dir):
+        stale_path = os.path.join(clean_dir, stale)
+        if chunk_re.match(stale) and stale_path not in stats["chunks"]:
+            os.remove(stale_path)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"source": path, "signature": signature, "stats": stats}, f)
+
+    logging.info(f"Prevalidated {path}: {stats['records']} records, {stats['clean']} clean in "
+                 f"{len(stats['chunks'])} chunk(s), {stats['rejected']} rejected, {stats['truncated_urls']} URLs truncated.")
+    return dict(stats, skipped=False)
+
+
+def prevalidate_dir(input_dir, out_dir=PREVALIDATION_DIR, batch_size=PREVALIDATION_BATCH_SIZE):
+    """
+    Prevalidate every .json file under input_dir, subdirectories included; returns per-file stats keyed by path.
+
+    Outputs are named by the path relative to input_dir, so a/clicks.json and b/clicks.json
+    keep separate chunks, rejects and manifests.
+    """
+    results = {}
+    for root, dirs, names in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                relative = os.path.splitext(os.path.relpath(path, input_dir))[0]
+                results[path] = prevalidate_file(path, out_dir=out_dir, batch_size=batch_size, name=relative)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate clickstream JSON into clean Parquet chunks and a reject file.")
+    parser.add_argument("--input", default=os.path.join(REPO_ROOT, "data", "raw"), help="Directory of clickstream .json files")
+    parser.add_argument("--out", default=PREVALIDATION_DIR, help="Output directory (or PIPELINE_PREVALIDATION_DIR)")
+    parser.add_argument("--batch-size", type=int, default=PREVALIDATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    prevalidate_dir(args.input, out_dir=args.out, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
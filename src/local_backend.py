@@ -0,0 +1,599 @@
+# src/local_backend.py
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from json_prevalidation import PREVALIDATION_DIR
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tracked snapshot of the local warehouse; only ever read, as the seed of the working copy below
+LOCAL_DB_SEED_PATH = os.path.join(REPO_ROOT, "data", "marketing_pipeline.db")
+
+# Default location of the local SQLite stand-in for the Snowflake warehouse (gitignored working copy)
+LOCAL_DB_PATH = os.path.join(REPO_ROOT, "data", "local", "marketing_pipeline.db")
+
+# Local directories standing in for the external S3 stages, and the file extension each one serves
+LOCAL_STAGES = {
+    "my_csv_stage": {"path": os.path.join(REPO_ROOT, "data", "raw"), "extension": ".csv"},
+    "my_json_stage": {"path": os.path.join(REPO_ROOT, "data", "raw"), "extension": ".json"},
+    # Clean Parquet chunks written by json_prevalidation
+    "my_clickstream_parquet_stage": {"path": os.path.join(PREVALIDATION_DIR, "clean"), "extension": ".parquet"},
+}
+
+# Tables that exist up front in Snowflake (created outside this repo) and must be bootstrapped locally
+LOCAL_BOOTSTRAP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS ingestion_logs (
+        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        log_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        log_level VARCHAR,
+        step_name VARCHAR,
+        message VARCHAR,
+        records_loaded INTEGER,
+        error_details VARCHAR
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dq_check_logs (
+        check_name VARCHAR,
+        status VARCHAR,
+        result_value NUMBER,
+        message VARCHAR,
+        run_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS feature_catalog (
+        feature_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        feature_name VARCHAR UNIQUE,
+        description VARCHAR,
+        data_type VARCHAR,
+        source_table VARCHAR,
+        transformation_summary VARCHAR,
+        update_frequency VARCHAR,
+        quality_metrics VARCHAR,
+        created_at TIMESTAMP,
+        last_updated_at TIMESTAMP
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS feature_engineered_iceberg (
+        customer_id INTEGER,
+        feature_id INTEGER,
+        feature_name VARCHAR,
+        feature_value FLOAT,
+        feature_date DATE,
+        created_at TIMESTAMP
+    );
+    """,
+]
+
+# Snowflake-only expressions and their SQLite equivalents
+_DIALECT_REWRITES = [
+    (re.compile(r"CURRENT_DATE\(\)", re.IGNORECASE), "DATE('now')"),
+    # SQLite's 'now' is already UTC, and local timestamps are stored as UTC text
+    (re.compile(r"CONVERT_TIMEZONE\(\s*'UTC'\s*,\s*CURRENT_TIMESTAMP\(\)\s*\)::DATE", re.IGNORECASE), "DATE('now')"),
+    (re.compile(r"CONVERT_TIMEZONE\(\s*'UTC'\s*,\s*([\w.]+)\s*\)::TIMESTAMP_NTZ", re.IGNORECASE), r"\1"),
+    (re.compile(r"CURRENT_TIMESTAMP\(\)", re.IGNORECASE), "CURRENT_TIMESTAMP"),
+    # Column defaults keep milliseconds (SQLite's CURRENT_TIMESTAMP has whole seconds), so load-time
+    # marks such as fact_click_events.created_at separate two loads within the same second
+    (re.compile(r"\bDEFAULT\s+CURRENT_TIMESTAMP\b", re.IGNORECASE), "DEFAULT (STRFTIME('%Y-%m-%d %H:%M:%f', 'now'))"),
+    (re.compile(r"DATEADD\(\s*day\s*,\s*(-?\d+)\s*,\s*DATE\('now'\)\s*\)", re.IGNORECASE), r"DATE('now', '\1 day')"),
+    (re.compile(r"^\s*TRUNCATE\s+TABLE\s+", re.IGNORECASE), "DELETE FROM "),
+    (re.compile(r"\bIS\s+DISTINCT\s+FROM\b", re.IGNORECASE), "IS NOT"),
+]
+
+# database.schema.table -> table (the local database has a single namespace); applied outside
+# string literals only, so values such as 'www.example.com' are left alone
+_THREE_PART_NAME_RE = re.compile(r"\b[A-Za-z_]\w*\.[A-Za-z_]\w*\.([A-Za-z_]\w*)\b")
+_STRING_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+
+_PYFORMAT_NAMED = re.compile(r"%\((\w+)\)s")
+_PYFORMAT_POSITIONAL = re.compile(r"%s")
+
+_LIST_RE = re.compile(r"^\s*LIST\s+@(\w+)/?\s*(?:PATTERN\s*=\s*'(?P<pattern>[^']*)')?\s*;?\s*$", re.IGNORECASE)
+_COPY_RE = re.compile(r"^\s*COPY\s+INTO\s+(?P<table>[\w.]+)\s+FROM\s+@(?P<stage>\w+)/?(?P<options>.*?);?\s*$",
+                      re.IGNORECASE | re.DOTALL)
+_MERGE_HEAD_RE = re.compile(r"^\s*MERGE\s+INTO\s+(?P<target>[\w.]+)\s+(?:AS\s+)?(?P<talias>\w+)\s+USING\s+",
+                            re.IGNORECASE)
+
+# Column headers of Snowflake's COPY INTO result set (one row per file)
+COPY_RESULT_COLUMNS = ("file", "status", "rows_parsed", "rows_loaded", "error_limit", "errors_seen",
+                       "first_error", "first_error_line", "first_error_character", "first_error_column_name")
+
+
+def translate_sql(sql):
+    """Rewrite a Snowflake-flavoured statement so SQLite can execute it."""
+    # Snowflake uses pyformat (%(name)s / %s) bind markers, SQLite uses :name / ?
+    sql = _PYFORMAT_NAMED.sub(r":\1", sql)
+    sql = _PYFORMAT_POSITIONAL.sub("?", sql)
+    for pattern, replacement in _DIALECT_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    # re.split with a capturing group puts the literals at the odd indexes
+    parts = _STRING_LITERAL_RE.split(sql)
+    sql = "".join(part if i % 2 else _THREE_PART_NAME_RE.sub(r"\1", part) for i, part in enumerate(parts))
+    return _rewrite_datediff(sql)
+
+
+_DATEDIFF_RE = re.compile(r"\bDATEDIFF\s*\(", re.IGNORECASE)
+
+
+def _rewrite_datediff(sql):
+    """DATEDIFF(day | second, start, end) -> julianday arithmetic (nested calls included)."""
+    match = _DATEDIFF_RE.search(sql)
+    if not match:
+        return sql
+    open_index = match.end() - 1
+    close_index = _matching_paren(sql, open_index)
+    args = _split_top_level(sql[open_index + 1:close_index])
+    unit = args[0].strip().strip("'\"").lower() if len(args) == 3 else None
+    if unit not in ("day", "days", "d", "second", "seconds", "s"):
+        raise ValueError(f"Only DATEDIFF(day | second, start, end) is supported locally: {sql[match.start():close_index + 1]}")
+    # Dates loaded from the CSV stage stay as YYYY/MM/DD text locally, which SQLite's date functions do not parse
+    start, end = (f"REPLACE({_rewrite_datediff(arg)}, '/', '-')" for arg in args[1:])
+    if unit.startswith("d"):
+        replacement = f"CAST(julianday(DATE({end})) - julianday(DATE({start})) AS INTEGER)"
+    else:
+        replacement = f"CAST(ROUND((julianday({end}) - julianday({start})) * 86400) AS INTEGER)"
+    return sql[:match.start()] + replacement + _rewrite_datediff(sql[close_index + 1:])
+
+
+def _strip_table(name):
+    """Drop database/schema qualifiers (MARKETING_DATE.STAGE_DATE.RAW_CLICKSTREAM -> RAW_CLICKSTREAM)."""
+    return name.split(".")[-1]
+
+
+def _matching_paren(text, open_index):
+    depth = 0
+    quote = None
+    for i in range(open_index, len(text)):
+        char = text[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("Unbalanced parentheses in statement")
+
+
+def _split_top_level(text, separator=","):
+    """Split on separator outside parentheses and quotes."""
+    parts, depth, quote, current = [], 0, None, []
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def parse_merge(sql):
+    """
+    Break a MERGE statement into its parts.
+
+    Returns:
+        dict with target, talias, source (table name or parenthesised subquery), salias, on,
+        and clauses: list of dicts {kind: "update" | "delete" | "insert", condition, ...}
+    """
+    head = _MERGE_HEAD_RE.match(sql)
+    if not head:
+        raise ValueError("Unsupported MERGE statement")
+    rest = sql[head.end():]
+    if rest.startswith("("):
+        close = _matching_paren(rest, 0)
+        source, rest = rest[:close + 1], rest[close + 1:]
+    else:
+        source, rest = rest.split(None, 1)
+
+    alias_on = re.match(r"\s*(?:AS\s+)?(\w+)\s+ON\s+(.*?)\s+(WHEN\s.*)$", rest, re.IGNORECASE | re.DOTALL)
+    if not alias_on:
+        raise ValueError("Could not parse MERGE ... ON ... WHEN clauses")
+    salias, on, clause_text = alias_on.groups()
+
+    clauses = []
+    for match in re.finditer(
+        r"WHEN\s+(?P<not>NOT\s+)?MATCHED(?:\s+AND\s+(?P<cond>.*?))?\s+THEN\s+(?P<action>.*?)(?=\s+WHEN\s+(?:NOT\s+)?MATCHED\b|\s*;?\s*$)",
+        clause_text, re.IGNORECASE | re.DOTALL,
+    ):
+        action = match.group("action").strip().rstrip(";")
+        condition = match.group("cond")
+        if match.group("not"):
+            insert = re.match(r"INSERT\s*\((.*?)\)\s*VALUES\s*\((.*)\)\s*$", action, re.IGNORECASE | re.DOTALL)
+            if not insert:
+                raise ValueError(f"Unsupported MERGE insert action: {action}")
+            clauses.append({"kind": "insert", "condition": condition,
+                            "columns": insert.group(1), "values": insert.group(2)})
+        elif re.match(r"DELETE\b", action, re.IGNORECASE):
+            clauses.append({"kind": "delete", "condition": condition})
+        else:
+            update = re.match(r"UPDATE\s+SET\s+(.*)$", action, re.IGNORECASE | re.DOTALL)
+            if not update:
+                raise ValueError(f"Unsupported MERGE matched action: {action}")
+            clauses.append({"kind": "update", "condition": condition, "assignments": update.group(1)})
+
+    return {"target": _strip_table(head.group("target")), "talias": head.group("talias"), "source": source,
+            "salias": salias, "on": on, "clauses": clauses}
+
+
+def merge_to_sqlite(sql):
+    """
+    Translate a MERGE into SQLite statements: UPDATE ... FROM / DELETE for matched rows,
+    then INSERT ... SELECT ... WHERE NOT EXISTS for unmatched ones. Matched clauses run
+    first, which gives the same result as MERGE because they never change the join key.
+
+    Returns:
+        list of (kind, sqlite_sql) in execution order
+    """
+    merge = parse_merge(sql)
+    target, talias, salias, on = merge["target"], merge["talias"], merge["salias"], merge["on"]
+    source = merge["source"]
+    if not source.startswith("("):
+        source = _strip_table(source)
+
+    statements = []
+    for clause in merge["clauses"]:
+        condition = f" AND ({clause['condition']})" if clause["condition"] else ""
+        if clause["kind"] == "update":
+            assignments = []
+            for assignment in _split_top_level(clause["assignments"]):
+                column, expr = assignment.split("=", 1)
+                column = column.strip().split(".")[-1]  # SQLite does not allow target.col on the left
+                assignments.append(f"{column} = {expr.strip()}")
+            statements.append(("updated", (
+                f"UPDATE {target} AS {talias} SET {', '.join(assignments)} "
+                f"FROM {source} AS {salias} WHERE ({on}){condition}"
+            )))
+        elif clause["kind"] == "delete":
+            statements.append(("deleted", (
+                f"DELETE FROM {target} WHERE rowid IN (SELECT {talias}.rowid FROM {target} AS {talias} "
+                f"JOIN {source} AS {salias} ON ({on}){condition})"
+            )))
+        else:
+            statements.append(("inserted", (
+                f"INSERT INTO {target} ({clause['columns']}) SELECT {clause['values']} "
+                f"FROM {source} AS {salias} WHERE NOT EXISTS "
+                f"(SELECT 1 FROM {target} AS {talias} WHERE {on}){condition}"
+            )))
+    return statements
+
+
+class LocalCursor:
+    """DB-API cursor over SQLite that accepts the statements the pipeline sends to Snowflake."""
+
+    def __init__(self, sqlite_cursor, stages, connection=None):
+        self._cursor = sqlite_cursor
+        self._stages = stages
+        self._rows = None           # emulated result set (LIST / COPY / MERGE), else None
+        self._description = None
+        self._rowcount = -1
+        self.sfqid = None
+        self.connection = connection
+
+    @property
+    def description(self):
+        return self._description if self._rows is not None else self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._rowcount if self._rows is not None else self._cursor.rowcount
+
+    def _set_result(self, columns, rows, rowcount):
+        self._description = [(name, None, None, None, None, None, None) for name in columns]
+        self._rows = list(rows)
+        self._rowcount = rowcount
+
+    def execute(self, sql, params=None):
+        self._rows = None
+        list_match = _LIST_RE.match(sql)
+        if list_match:
+            return self._list_stage(list_match.group(1), list_match.group("pattern"))
+        copy_match = _COPY_RE.match(sql)
+        if copy_match:
+            return self._copy_into(copy_match)
+        if _MERGE_HEAD_RE.match(sql):
+            return self._merge(sql, params)
+        create_like = re.match(r"^\s*CREATE\s+(?:TRANSIENT\s+)?TABLE\s+IF\s+NOT\s+EXISTS\s+([\w.]+)\s+LIKE\s+([\w.]+)\s*;?\s*$",
+                               sql, re.IGNORECASE)
+        if create_like:
+            # Same columns and types, no constraints (like Snowflake, where they are not enforced)
+            table, source = (_strip_table(name) for name in create_like.groups())
+            self._cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT * FROM {source} WHERE 0")
+            return self
+        if re.match(r"^\s*ALTER\s+TABLE\s+\S+\s+CLUSTER\s+BY\b", sql, re.IGNORECASE):
+            return self  # clustering keys have no SQLite equivalent
+        add_column = re.match(r"^\s*ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+IF\s+NOT\s+EXISTS\s+(\w+)\s+(.*?);?\s*$",
+                              sql, re.IGNORECASE | re.DOTALL)
+        if add_column:
+            table, column, definition = add_column.groups()
+            if column.lower() in self._table_columns(table):
+                return self
+            sql = f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+
+        sql = translate_sql(sql)
+        if params is None:
+            self._cursor.execute(sql)
+        else:
+            self._cursor.execute(sql, params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._rows = None
+        self._cursor.executemany(translate_sql(sql), seq_of_params)
+        return self
+
+    def fetchone(self):
+        if self._rows is not None:
+            return self._rows.pop(0) if self._rows else None
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        if self._rows is not None:
+            size = size or 1
+            batch, self._rows = self._rows[:size], self._rows[size:]
+            return batch
+        if size is None:
+            return self._cursor.fetchmany()
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    # -- emulated Snowflake statements -------------------------------------------------
+
+    def _table_columns(self, table):
+        self._cursor.execute(f"PRAGMA table_info({_strip_table(table)})")
+        return [row[1].lower() for row in self._cursor.fetchall()]
+
+
+    def _stage_files(self, stage, pattern=None):
+        if stage not in self._stages:
+            raise ValueError(f"Unknown local stage @{stage}; configure it in local_backend.LOCAL_STAGES")
+        config = self._stages[stage]
+        files = []
+        for root, dirs, names in os.walk(config["path"]):
+            dirs.sort()  # subdirectories are listed as stage-relative paths, in a stable order
+            for name in sorted(names):
+                if not name.endswith(config["extension"]):
+                    continue
+                full_path = os.path.join(root, name)
+                relative = os.path.relpath(full_path, config["path"]).replace(os.sep, "/")
+                if pattern and not re.fullmatch(pattern, relative):
+                    continue
+                files.append((relative, full_path))
+        return files
+
+    def _list_stage(self, stage, pattern):
+        rows = []
+        for relative, full_path in self._stage_files(stage, pattern):
+            stat = os.stat(full_path)
+            # size + mtime stand in for the S3 etag; hashing multi-GB benchmark files would dominate the run
+            etag = hashlib.md5(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+            modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).strftime("%a, %d %b %Y %H:%M:%S GMT")
+            rows.append((f"{stage}/{relative}", stat.st_size, etag, modified))
+        self._set_result(("name", "size", "md5", "last_modified"), rows, len(rows))
+        return self
+
+    def _copy_into(self, match):
+        table = _strip_table(match.group("table"))
+        stage = match.group("stage")
+        options = match.group("options")
+
+        files_match = re.search(r"FILES\s*=\s*\((.*?)\)", options, re.IGNORECASE | re.DOTALL)
+        pattern_match = re.search(r"PATTERN\s*=\s*'([^']*)'", options, re.IGNORECASE)
+        if files_match:
+            wanted = {name.strip().strip("'\"") for name in files_match.group(1).split(",") if name.strip()}
+            files = [f for f in self._stage_files(stage) if f[0] in wanted]
+        else:
+            files = self._stage_files(stage, pattern_match.group(1) if pattern_match else None)
+
+        columns = self._table_columns(table)
+        by_name = re.search(r"MATCH_BY_COLUMN_NAME\s*=\s*CASE_INSENSITIVE", options, re.IGNORECASE) is not None
+        placeholders = ", ".join("?" for _ in columns)
+        insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+        # Default ON_ERROR = ABORT_STATEMENT: one bad file rolls back the whole COPY.
+        # ON_ERROR = SKIP_FILE: a bad file is rolled back on its own and reported as LOAD_FAILED.
+        skip_file = re.search(r"ON_ERROR\s*=\s*'?SKIP_FILE", options, re.IGNORECASE) is not None
+        self._cursor.execute("SAVEPOINT copy_into")
+        results = []
+        total_loaded = 0
+        for relative, full_path in files:
+            self._cursor.execute("SAVEPOINT copy_file")
+            try:
+                if full_path.endswith(".json"):
+                    rows = _read_json_rows(full_path, columns, by_name)
+                elif full_path.endswith(".parquet"):
+                    rows = _read_parquet_rows(full_path, columns)
+                else:
+                    rows = _read_csv_rows(full_path, columns)
+                self._cursor.executemany(insert_sql, rows)
+                self._cursor.execute("RELEASE copy_file")
+                results.append((f"{stage}/{relative}", "LOADED", len(rows), len(rows), 1, 0,
+                                None, None, None, None))
+                total_loaded += len(rows)
+            except Exception as e:
+                self._cursor.execute("ROLLBACK TO copy_file")
+                self._cursor.execute("RELEASE copy_file")
+                results.append((f"{stage}/{relative}", "LOAD_FAILED", 0, 0, 1, 1, str(e), None, None, None))
+        failed = [result for result in results if result[1] == "LOAD_FAILED"]
+        if failed and not skip_file:
+            self._cursor.execute("ROLLBACK TO copy_into")
+            self._cursor.execute("RELEASE copy_into")
+            raise RuntimeError(f"COPY INTO {table} failed for {len(failed)} file(s): {failed[0][6]}")
+        self._cursor.execute("RELEASE copy_into")
+        self._set_result(COPY_RESULT_COLUMNS, results, total_loaded)
+        return self
+
+    def _merge(self, sql, params):
+        counts = {"inserted": 0, "updated": 0, "deleted": 0}
+        for kind, statement in merge_to_sqlite(sql):
+            statement = translate_sql(statement)
+            if params is None:
+                self._cursor.execute(statement)
+            else:
+                self._cursor.execute(statement, params)
+            counts[kind] += max(self._cursor.rowcount, 0)
+        self._set_result(
+            ("number of rows inserted", "number of rows updated", "number of rows deleted"),
+            [(counts["inserted"], counts["updated"], counts["deleted"])],
+            sum(counts.values()),
+        )
+        return self
+
+
+def _read_csv_rows(path, columns):
+    """Rows of a headered CSV mapped positionally onto the table columns (csv_format skips the header)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [tuple(value if value != "" else None for value in row[:len(columns)]) +
+                (None,) * (len(columns) - len(row)) for row in reader]
+
+
+def _read_json_rows(path, columns, by_name):
+    """Rows of a JSON array / newline-delimited JSON file matched to table columns case-insensitively."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        records = json.loads(text)
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    rows = []
+    for record in records:
+        if by_name:
+            lowered = {key.lower(): value for key, value in record.items()}
+            rows.append(tuple(lowered.get(column) for column in columns))
+        else:
+            rows.append(tuple(record.values())[:len(columns)])
+    return rows
+
+
+def _read_parquet_rows(path, columns):
+    """Rows of a Parquet file matched to table columns by name (Parquet COPY with MATCH_BY_COLUMN_NAME)."""
+    frame = pq.read_table(path).to_pandas()
+    frame.columns = [column.lower() for column in frame.columns]
+    for column in frame.columns:
+        # Store timestamps as the same ISO-8601 UTC text the JSON stage loads
+        if isinstance(frame[column].dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    frame = frame.reindex(columns=columns).astype(object)
+    frame = frame.where(frame.notna(), None)
+    return list(frame.itertuples(index=False, name=None))
+
+
+class LocalConnection:
+    """Connection wrapper handing out LocalCursor objects, mirroring snowflake.connector's API."""
+
+    def __init__(self, sqlite_conn, stages, db_path=None):
+        self._conn = sqlite_conn
+        self._stages = stages
+        # Absolute database file (':memory:' as given); identifies the database, e.g. in query_cache keys
+        self.db_path = db_path if db_path in (None, ":memory:") else os.path.abspath(db_path)
+
+    def cursor(self):
+        return LocalCursor(self._conn.cursor(), self._stages, connection=self)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def _regexp_like(value, pattern):
+    # Snowflake's REGEXP_LIKE matches the whole value, as if the pattern were anchored
+    if value is None or pattern is None:
+        return None
+    return re.fullmatch(pattern, str(value)) is not None
+
+
+def _md5(value):
+    if value is None:
+        return None
+    return hashlib.md5(str(value).encode("utf-8")).hexdigest()
+
+
+def ensure_local_db(db_path=LOCAL_DB_PATH, seed_path=LOCAL_DB_SEED_PATH):
+    """
+    Seed the local working database from the tracked snapshot on first use, so local runs never write to it.
+
+    Returns:
+        db_path
+    """
+    if os.path.exists(db_path):
+        return db_path
+    db_dir = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(db_dir, exist_ok=True)
+    if not os.path.exists(seed_path):
+        return db_path
+    # Copied under a temporary name and renamed, so a concurrent connection never opens a partial copy
+    fd, tmp_path = tempfile.mkstemp(dir=db_dir, prefix=".marketing_pipeline.", suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(seed_path, tmp_path)
+        if not os.path.exists(db_path):
+            os.replace(tmp_path, db_path)
+            logging.info(f"Seeded local database {db_path} from {seed_path}.")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return db_path
+
+
+def connect_local(db_path=LOCAL_DB_PATH, stages=None):
+    """
+    Open a connection to the local SQLite stand-in (use ':memory:' for a throwaway database).
+
+    Args:
+        db_path: SQLite file path (the default working copy is seeded by ensure_local_db on first use)
+        stages: dict stage name -> {"path": directory, "extension": ".csv" | ".json"}, defaults to LOCAL_STAGES
+    """
+    if db_path == LOCAL_DB_PATH:
+        ensure_local_db(db_path)
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=60)
+    # Snowflake built-ins that SQLite lacks
+    conn.create_function("REGEXP_LIKE", 2, _regexp_like, deterministic=True)
+    conn.create_function("MD5", 1, _md5, deterministic=True)
+    for ddl in LOCAL_BOOTSTRAP_DDL:
+        conn.execute(ddl)
+    conn.commit()
+    logging.info(f"Connected to local SQLite backend at {db_path}.")
+    return LocalConnection(conn, dict(LOCAL_STAGES if stages is None else stages), db_path=db_path)
@@ -1,36 +1,178 @@
 # src/main.py
-from utils import get_snowflake_connection
-from data_ingestion import load_csv, load_json
+import argparse
+from functools import partial
+from utils import (
+    DEFAULT_BACKEND,
+    PIPELINE_BACKENDS,
+    close_connection_pool,
+    get_backend_connect,
+    get_connection_pool,
+    install_ingestion_log_handler,
+    shutdown_ingestion_log_handler,
+)
+from data_ingestion import COPY_PARALLELISM, load_csv, load_json
 import logging
 from dq_checks import run_dq_checks
-from transformations import load_dim_customer, load_fact_click_events
+from transformations import FACT_LATE_ARRIVAL_HOURS, load_dim_customer, load_fact_click_events
+from scheduler import DEFAULT_MAX_WORKERS, PipelineTask, run_pipeline_dag
+from instrumentation import write_metrics_files
+from parquet_export import export_tables
 
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def main():
-    conn = None
+# Steps that copy file groups on extra pooled connections (they can run at the same time)
+COPY_STEPS = ("load_csv", "load_json")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Marketing data ingestion pipeline.")
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="Truncate raw tables and reload every staged file instead of only new/changed files.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=PIPELINE_BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="Run against Snowflake or the local SQLite stand-in (data/local/marketing_pipeline.db, or PIPELINE_LOCAL_DB).",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help="Maximum number of independent steps to run concurrently.",
+    )
+    parser.add_argument(
+        "--copy-parallelism",
+        type=int,
+        default=COPY_PARALLELISM,
+        help="Size-balanced groups of staged files each ingestion step copies concurrently.",
+    )
+    parser.add_argument(
+        "--fact-lookback-hours",
+        type=int,
+        default=FACT_LATE_ARRIVAL_HOURS,
+        help="Late-arrival window the incremental fact_click_events MERGE re-scans before its watermark.",
+    )
+    parser.add_argument(
+        "--cluster-fact-by-date",
+        action="store_true",
+        help="Apply a TO_DATE(event_time) clustering key to fact_click_events.",
+    )
+    parser.add_argument(
+        "--customer-history",
+        action="store_true",
+        help="Also keep SCD type-2 history of dim_customer changes in dim_customer_history.",
+    )
+    parser.add_argument(
+        "--prevalidated-json",
+        action="store_true",
+        help="Load clickstream from the clean Parquet chunks written by json_prevalidation.py instead of the raw JSON stage.",
+    )
+    parser.add_argument(
+        "--export-parquet",
+        action="store_true",
+        help="Export new fact_click_events days to the date-partitioned Parquet dataset (data/exports, or PIPELINE_EXPORT_DIR).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Log the SQL each step would run against a fake cursor instead of connecting to Snowflake.",
+    )
+    return parser.parse_args(argv)
+
+def build_pipeline_tasks(full_refresh=False, fact_lookback_hours=FACT_LATE_ARRIVAL_HOURS, cluster_fact_by_date=False,
+                         customer_history=False, connection_pool=None, copy_parallelism=COPY_PARALLELISM,
+                         export_parquet=False, prevalidated_json=False):
+    """Pipeline steps and their dependencies (mirrors the DAG in airflow_dags/README.md)."""
+    # Ingestion steps copy file groups concurrently on extra connections from the same pool
+    copy_options = {"full_refresh": full_refresh, "connection_pool": connection_pool, "max_parallel": copy_parallelism}
+    # A full refresh also re-MERGEs all of history into the fact table instead of the watermark window
+    load_facts = partial(
+        load_fact_click_events,
+        incremental=not full_refresh,
+        lookback_hours=fact_lookback_hours,
+        cluster_by_event_date=cluster_fact_by_date,
+    )
+    tasks = [
+        PipelineTask("load_csv", partial(load_csv, **copy_options)),
+        PipelineTask("load_json", partial(load_json, prevalidated=prevalidated_json, **copy_options)),
+        PipelineTask("run_dq_checks", run_dq_checks, depends_on=("load_csv", "load_json")),
+        PipelineTask("load_dim_customer", partial(load_dim_customer, scd2=customer_history), depends_on=("run_dq_checks",)),
+        PipelineTask("load_fact_click_events", load_facts, depends_on=("run_dq_checks",)),
+    ]
+    if export_parquet:
+        # A full refresh may have re-MERGEd old days, so rewrite every partition
+        tasks.append(PipelineTask(
+            "export_parquet",
+            partial(export_tables, tables=("fact_click_events",), full=full_refresh),
+            depends_on=("load_fact_click_events",),
+        ))
+    return tasks
+
+def pipeline_pool_size(max_workers, copy_parallelism):
+    """
+    Connections the pipeline can hold at once: one per running step, plus copy_parallelism COPY
+    connections for each load step that may run concurrently with the others.
+    """
+    concurrent_copy_steps = min(max_workers, len(COPY_STEPS))
+    return max_workers + concurrent_copy_steps * copy_parallelism
+
+def main(full_refresh=False, max_workers=DEFAULT_MAX_WORKERS, dry_run=False,
+         fact_lookback_hours=FACT_LATE_ARRIVAL_HOURS, cluster_fact_by_date=False, customer_history=False,
+         backend=None, copy_parallelism=COPY_PARALLELISM, export_parquet=False, prevalidated_json=False):
     try:
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
+        logging.info(f"Starting data ingestion pipeline ({backend or DEFAULT_BACKEND} backend)...")
+        connect = get_backend_connect(backend)
 
-        logging.info("Starting data ingestion pipeline...")
+        # ingestion_logs rows are buffered and written in batches on a dedicated connection
+        if not dry_run:
+            install_ingestion_log_handler(connect=connect)
 
-        load_csv(cursor)
-        load_json(cursor)
-        run_dq_checks(cursor)
-        load_dim_customer(cursor)
-        load_fact_click_events(cursor)
+        # Each step checks out its own pooled connection so independent branches can overlap;
+        # every concurrent load step also needs copy_parallelism connections for its COPY groups
+        pool = None if dry_run else get_connection_pool(
+            connect=connect, max_size=pipeline_pool_size(max_workers, copy_parallelism))
+        run_pipeline_dag(
+            build_pipeline_tasks(
+                full_refresh=full_refresh,
+                fact_lookback_hours=fact_lookback_hours,
+                cluster_fact_by_date=cluster_fact_by_date,
+                customer_history=customer_history,
+                connection_pool=pool,
+                copy_parallelism=copy_parallelism,
+                export_parquet=export_parquet,
+                prevalidated_json=prevalidated_json,
+            ),
+            connection_pool=pool,
+            max_workers=max_workers,
+            dry_run=dry_run,
+        )
 
         logging.info("Pipeline completed successfully.")
 
     except Exception as e:
         logging.error(f"Pipeline failed: {e}")
     finally:
-        if conn:
-            conn.close()
-            logging.info("Snowflake connection closed.")
+        # Optional local JSON / Prometheus textfile sinks (PIPELINE_METRICS_JSON, PIPELINE_METRICS_PROM)
+        write_metrics_files()
+        shutdown_ingestion_log_handler()
+        close_connection_pool()
+        logging.info("Snowflake connections closed.")
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(
+        full_refresh=args.full_refresh,
+        max_workers=args.max_workers,
+        dry_run=args.dry_run,
+        fact_lookback_hours=args.fact_lookback_hours,
+        cluster_fact_by_date=args.cluster_fact_by_date,
+        customer_history=args.customer_history,
+        backend=args.backend,
+        copy_parallelism=args.copy_parallelism,
+        export_parquet=args.export_parquet,
+        prevalidated_json=args.prevalidated_json,
+    )
@@ -0,0 +1,270 @@
+# src/online_store.py
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# Warehouse-side helpers (utils, feature_engineering) are imported where used, so serving
+# processes that only need OnlineFeatureStore do not pull in the Snowflake connector
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Serving copy of the latest features: one SQLite file, one row per customer (overridable through the environment)
+ONLINE_STORE_PATH = os.getenv("PIPELINE_ONLINE_STORE", os.path.join(REPO_ROOT, "data", "online_features.db"))
+
+# In-process LRU cache settings for OnlineFeatureStore
+ONLINE_CACHE_SIZE = int(os.getenv("PIPELINE_ONLINE_CACHE_SIZE", "100000"))
+ONLINE_CACHE_TTL_SECONDS = float(os.getenv("PIPELINE_ONLINE_CACHE_TTL", "300"))
+
+# How often readers stat the store file to notice a republished copy
+SWAP_CHECK_SECONDS = 1.0
+
+# Customer ids bound per IN (...) lookup (SQLite's host-parameter limit is far higher)
+LOOKUP_BATCH_SIZE = 500
+
+
+def _features_wide(features_long):
+    """Pivot engineer_features' long output to one row per customer, one column per feature."""
+    features_long = features_long.rename(columns={"customer_id": "user_id"})
+    features_wide = features_long.pivot_table(index="user_id", columns="feature_name", values="feature_value",
+                                              aggfunc="last", dropna=False, observed=True)
+    features_wide.index = pd.to_numeric(features_wide.index, errors="coerce")
+    features_wide = features_wide[features_wide.index.notna()]
+    features_wide.index = features_wide.index.astype("int64")
+    return features_wide
+
+
+def publish_features(features_long, path=ONLINE_STORE_PATH):
+    """
+    Materialize a features_long frame (user_id, feature_name, feature_value, feature_date) or a
+    FeatureFrame into the online store.
+
+    The store is built in a temporary file next to path and moved over it with os.replace,
+    so readers see either the previous or the new store, never a partial one. Open
+    OnlineFeatureStore instances notice the swap and reopen.
+
+    Returns:
+        number of customers published
+    """
+    if hasattr(features_long, "to_long"):
+        features_long = features_long.to_long()
+    features_wide = _features_wide(features_long)
+    feature_names = [str(name) for name in features_wide.columns]
+    feature_dates = pd.to_datetime(features_long["feature_date"], errors="coerce") if len(features_long) else None
+    feature_date = feature_dates.max().strftime("%Y-%m-%d") if feature_dates is not None and feature_dates.notna().any() else None
+
+    store_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(store_dir, exist_ok=True)
+    # A unique name in the same directory (so os.replace stays atomic): concurrent publishers never share it
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; serving processes only need to read the store
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # Nothing reads the temporary file until it is swapped in, so skip journaling
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        columns = ", ".join(f'"{name}" REAL' for name in feature_names)
+        conn.execute(f"CREATE TABLE online_features (customer_id INTEGER PRIMARY KEY{', ' + columns if columns else ''})")
+        conn.execute("CREATE TABLE online_store_meta (feature_names TEXT, feature_date TEXT, published_at TEXT, customers INTEGER)")
+
+        # Plain Python values (None for missing) so sqlite3 can bind them
+        values = features_wide.astype(object).where(features_wide.notna(), None)
+        rows = zip(features_wide.index.tolist(), *(values[column].tolist() for column in features_wide.columns))
+        placeholders = ", ".join("?" for _ in range(len(feature_names) + 1))
+        conn.executemany(f"INSERT INTO online_features VALUES ({placeholders})", rows)
+        conn.execute(
+            "INSERT INTO online_store_meta VALUES (?, ?, ?, ?)",
+            (json.dumps(feature_names), feature_date, datetime.now(timezone.utc).isoformat(), len(features_wide)),
+        )
+        conn.commit()
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, path)
+
+    logging.info(f"Published {len(features_wide)} customers x {len(feature_names)} features "
+                 f"(feature_date {feature_date}) to online store {path}.")
+    return len(features_wide)
+
+
+def publish_latest_from_warehouse(cursor, path=ONLINE_STORE_PATH):
+    """Publish the newest feature_date partition of feature_engineered_iceberg (e.g. after the SQL engine ran)."""
+    from feature_engineering import iter_result_batches
+
+    cursor.execute("""
+    SELECT customer_id AS user_id, feature_name, feature_value, feature_date
+    FROM feature_engineered_iceberg
+    WHERE feature_date = (SELECT MAX(feature_date) FROM feature_engineered_iceberg)
+    """)
+    batches = list(iter_result_batches(cursor))
+    if not batches:
+        logging.warning("feature_engineered_iceberg is empty; online store not published.")
+        return 0
+    features_long = pd.concat(batches, ignore_index=True)
+    features_long["feature_value"] = pd.to_numeric(features_long["feature_value"], errors="coerce")
+    return publish_features(features_long, path)
+
+
+class OnlineFeatureStore:
+    """
+    Read side of the online store: batched customer_id lookups with an in-process LRU cache.
+
+    Cached entries expire after ttl_seconds, and the whole cache is dropped as soon as a
+    republished store file is swapped in, so lookups never mix two feature dates.
+
+    Usage:
+        store = OnlineFeatureStore()
+        store.get_features([1001, 1002])  # {1001: {"days_since_signup": 12.0, ...}, 1002: None}
+    """
+
+    def __init__(self, path=ONLINE_STORE_PATH, cache_size=ONLINE_CACHE_SIZE, ttl_seconds=ONLINE_CACHE_TTL_SECONDS):
+        self.path = path
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # customer_id -> (features or None, cached_at), most recently used on the right
+        self._conn = None
+        self._file_id = None
+        self._next_swap_check = 0.0
+        self.feature_names = []
+        self.feature_date = None
+        self._metrics = {"lookups": 0, "cache_hits": 0, "store_reads": 0, "reloads": 0}
+
+    def _open(self):
+        """(Re)open the current store file read-only (caller holds the lock)."""
+        if self._conn is not None:
+            self._conn.close()
+        stat = os.stat(self.path)
+        # The file is never modified in place (only replaced), so SQLite can skip locking entirely
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        feature_names, self.feature_date = self._conn.execute(
+            "SELECT feature_names, feature_date FROM online_store_meta").fetchone()
+        self.feature_names = json.loads(feature_names)
+        self._file_id = (stat.st_ino, stat.st_mtime_ns)
+        self._cache.clear()
+        self._metrics["reloads"] += 1
+
+    def _check_swap(self, now):
+        """Reopen when publish_features has replaced the file (checked at most every SWAP_CHECK_SECONDS)."""
+        if self._conn is not None and now < self._next_swap_check:
+            return
+        self._next_swap_check = now + SWAP_CHECK_SECONDS
+        stat = os.stat(self.path)
+        if self._conn is None or (stat.st_ino, stat.st_mtime_ns) != self._file_id:
+            self._open()
+
+    def _read(self, customer_ids):
+        """Fetch rows for customer_ids from the store file (caller holds the lock)."""
+        found = {}
+        columns = ", ".join(f'"{name}"' for name in self.feature_names)
+        select = f"SELECT customer_id{', ' + columns if columns else ''} FROM online_features"
+        for start in range(0, len(customer_ids), LOOKUP_BATCH_SIZE):
+            batch = customer_ids[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ", ".join("?" for _ in batch)
+            for row in self._conn.execute(f"{select} WHERE customer_id IN ({placeholders})", batch):
+                found[row[0]] = dict(zip(self.feature_names, row[1:]))
+        self._metrics["store_reads"] += 1
+        return found
+
+    def get_features(self, customer_ids):
+        """
+        Latest features for a batch of customers.
+
+        Args:
+            customer_ids: iterable of customer ids (ints or numeric strings)
+
+        Returns:
+            dict customer_id -> {feature_name: value}, or None for customers not in the store
+        """
+        customer_ids = [int(customer_id) for customer_id in customer_ids]
+        now = time.monotonic()
+        with self._lock:
+            self._check_swap(now)
+            self._metrics["lookups"] += len(customer_ids)
+
+            result = {}
+            missing = []
+            for customer_id in customer_ids:
+                entry = self._cache.get(customer_id)
+                if entry is not None and now - entry[1] <= self.ttl_seconds:
+                    self._cache.move_to_end(customer_id)
+                    result[customer_id] = entry[0]
+                    self._metrics["cache_hits"] += 1
+                else:
+                    missing.append(customer_id)
+
+            if missing:
+                found = self._read(missing)
+                for customer_id in missing:
+                    features = found.get(customer_id)
+                    result[customer_id] = features
+                    # Unknown customers are cached too, so repeated misses stay off the file
+                    self._cache[customer_id] = (features, now)
+                    self._cache.move_to_end(customer_id)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return result
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics, cached=len(self._cache), feature_date=self.feature_date)
+        metrics["hit_rate"] = round(metrics["cache_hits"] / metrics["lookups"], 4) if metrics["lookups"] else 0.0
+        return metrics
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._cache.clear()
+
+
+def parse_args(argv=None):
+    from utils import DEFAULT_BACKEND, PIPELINE_BACKENDS
+
+    parser = argparse.ArgumentParser(description="Publish to / query the online feature store.")
+    parser.add_argument("--path", default=ONLINE_STORE_PATH, help="Online store file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish = subparsers.add_parser("publish", help="Publish the newest feature_date from feature_engineered_iceberg")
+    publish.add_argument("--backend", choices=PIPELINE_BACKENDS, default=DEFAULT_BACKEND)
+
+    get = subparsers.add_parser("get", help="Look up features for customer ids")
+    get.add_argument("customer_ids", nargs="+", type=int)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "publish":
+        from utils import close_connection_pool, get_backend_connect, get_connection_pool
+
+        with get_connection_pool(connect=get_backend_connect(args.backend)).connection() as conn:
+            cursor = conn.cursor()
+            try:
+                publish_latest_from_warehouse(cursor, args.path)
+            finally:
+                cursor.close()
+        close_connection_pool()
+    else:
+        store = OnlineFeatureStore(args.path)
+        print(json.dumps(store.get_features(args.customer_ids), indent=2))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# src/parquet_export.py
+import argparse
+import logging
+import math
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils import DEFAULT_BACKEND, PIPELINE_BACKENDS, close_connection_pool, get_backend_connect, get_connection_pool, log_to_snowflake
+from feature_engineering import iter_result_batches
+from transformations import FACT_LATE_ARRIVAL_HOURS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Root of the exported datasets: <root>/<table>/<partition_column>=YYYY-MM-DD/part-00000.parquet
+EXPORT_ROOT = os.getenv("PIPELINE_EXPORT_DIR", os.path.join(REPO_ROOT, "data", "exports"))
+
+# Rows per Parquet row group; each row group carries min/max statistics readers can skip on
+EXPORT_ROW_GROUP_SIZE = 128 * 1024
+
+PARTITION_FILE_NAME = "part-00000.parquet"
+
+# Exported tables.
+#
+# Keys:
+#   partition_column   hive partition key written into the directory names
+#   range_column       source column the partition is taken from (one day = [date, date + 1))
+#   bound_format       strftime format of the range bounds (matches how the column compares as text)
+#   sort_by            row order inside a partition, so row-group statistics on it are tight
+#   refresh_days       already-exported days re-exported by incremental runs (late data, same-day reruns)
+#   schema             exported columns and their Arrow types
+EXPORT_TABLES = {
+    "fact_click_events": {
+        "partition_column": "event_date",
+        "range_column": "event_time",
+        "bound_format": "%Y-%m-%dT%H:%M:%SZ",
+        "sort_by": "event_time",
+        # Late events mostly arrive within FACT_LATE_ARRIVAL_HOURS; older ones reach the export with --full
+        "refresh_days": math.ceil(FACT_LATE_ARRIVAL_HOURS / 24),
+        "schema": pa.schema([
+            ("event_id", pa.string()),
+            ("user_id", pa.int64()),
+            ("event_type", pa.string()),
+            ("page_url", pa.string()),
+            ("duration_ms", pa.int64()),
+            ("event_time", pa.timestamp("us", tz="UTC")),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+        ]),
+    },
+    "feature_engineered_iceberg": {
+        "partition_column": "feature_date",
+        "range_column": "feature_date",
+        "bound_format": "%Y-%m-%d",
+        "sort_by": "customer_id",
+        # The daily job replaces today's partition on every run
+        "refresh_days": 0,
+        "schema": pa.schema([
+            ("customer_id", pa.int64()),
+            ("feature_id", pa.int64()),
+            ("feature_name", pa.string()),
+            ("feature_value", pa.float64()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+        ]),
+    },
+}
+
+
+def _table_dir(table, root):
+    return os.path.join(root, table)
+
+
+def _partition_dir(table, partition_date, root):
+    return os.path.join(_table_dir(table, root), f"{EXPORT_TABLES[table]['partition_column']}={partition_date:%Y-%m-%d}")
+
+
+def exported_partitions(table, root=EXPORT_ROOT):
+    """Dates of the partitions already written for table (sorted)."""
+    prefix = f"{EXPORT_TABLES[table]['partition_column']}="
+    table_dir = _table_dir(table, root)
+    if not os.path.isdir(table_dir):
+        return []
+    dates = []
+    for name in os.listdir(table_dir):
+        if name.startswith(prefix) and os.path.exists(os.path.join(table_dir, name, PARTITION_FILE_NAME)):
+            dates.append(pd.Timestamp(name[len(prefix):]))
+    return sorted(dates)
+
+
+def _to_arrow(frame, schema):
+    """Coerce a fetched batch (driver types, or text from the local backend) to the export schema."""
+    columns = {}
+    for field in schema:
+        values = frame[field.name]
+        if pa.types.is_timestamp(field.type):
+            values = pd.to_datetime(values, utc=True, errors="coerce", format="mixed")
+        elif pa.types.is_integer(field.type):
+            values = pd.to_numeric(values, errors="coerce").astype("Int64")
+        elif pa.types.is_floating(field.type):
+            values = pd.to_numeric(values, errors="coerce").astype("float64")
+        else:
+            values = values.astype("string")
+        columns[field.name] = pa.Array.from_pandas(values, type=field.type)
+    return pa.table(columns, schema=schema)
+
+
+def _utc_day(value):
+    """Midnight (naive UTC) of the day a driver-returned timestamp/date/ISO string falls on."""
+    value = pd.Timestamp(value)
+    return (value.tz_convert("UTC").tz_localize(None) if value.tzinfo else value).normalize()
+
+
+def _write_partition(table, partition_date, arrow_table, root):
+    """Write one partition file, replacing any previous export of that date atomically."""
+    partition_dir = _partition_dir(table, partition_date, root)
+    os.makedirs(partition_dir, exist_ok=True)
+    # Dot-prefixed, so dataset readers ignore it until it is swapped in
+    tmp_path = os.path.join(partition_dir, f".{PARTITION_FILE_NAME}.tmp")
+    pq.write_table(arrow_table, tmp_path, row_group_size=EXPORT_ROW_GROUP_SIZE, compression="zstd",
+                   write_statistics=True)
+    os.replace(tmp_path, os.path.join(partition_dir, PARTITION_FILE_NAME))
+
+
+def _remove_stale_partitions(table, scan_start, written, root):
+    """Delete exported partitions on or after scan_start that this export did not write (their days left the source)."""
+    written = set(written)
+    removed = [partition_date for partition_date in exported_partitions(table, root)
+               if partition_date >= scan_start and partition_date not in written]
+    for partition_date in removed:
+        shutil.rmtree(_partition_dir(table, partition_date, root), ignore_errors=True)
+    return removed
+
+
+def export_table(cursor, table, root=EXPORT_ROOT, full=False):
+    """
+    Export table to a date-partitioned Parquet dataset under root.
+
+    Incremental runs (full=False) only export days after the newest exported partition,
+    plus its last refresh_days days again; full=True rewrites every partition. Each day
+    is read with a range predicate on the source column, so Snowflake prunes to that
+    day's micro-partitions (fact_click_events can be clustered by TO_DATE(event_time)),
+    and days without rows are skipped with a MIN() lookup instead of being queried.
+    Once the scan has run to the end, exported partitions in the re-exported range
+    (every partition for full=True) whose day no longer has rows are removed.
+
+    Returns:
+        dict with the exported and removed partition dates and the row count
+    """
+    config = EXPORT_TABLES[table]
+    range_column = config["range_column"]
+    columns = [field.name for field in config["schema"]]
+
+    next_day_sql = f"SELECT MIN({range_column}) FROM {table} WHERE {range_column} >= %(lower)s"
+
+    existing = [] if full else exported_partitions(table, root)
+    lower = existing[-1] - pd.Timedelta(days=config["refresh_days"]) if existing else pd.Timestamp("1970-01-01")
+    scan_start = lower.normalize()
+
+    exported, total_rows, scan_complete = [], 0, False
+    while True:
+        # Jump straight to the next day that has rows
+        cursor.execute(next_day_sql, {"lower": lower.strftime(config["bound_format"])})
+        next_value = cursor.fetchone()[0]
+        if next_value is None:
+            scan_complete = True
+            break
+        partition_date = _utc_day(next_value)
+        if partition_date < lower.normalize():
+            # MIN() over the >= bound can only move forward; anything else (e.g. a dry-run cursor) ends the scan
+            break
+        next_date = lower = partition_date + pd.Timedelta(days=1)
+        cursor.execute(
+            f"""
+            SELECT {", ".join(columns)}
+            FROM {table}
+            WHERE {range_column} >= %(lower)s
+              AND {range_column} < %(upper)s
+            """,
+            {"lower": partition_date.strftime(config["bound_format"]), "upper": next_date.strftime(config["bound_format"])},
+        )
+        batches = list(iter_result_batches(cursor))
+        frame = pd.concat(batches, ignore_index=True) if batches else None
+        if frame is None or frame.empty:
+            continue
+
+        arrow_table = _to_arrow(frame, config["schema"]).sort_by(config["sort_by"])
+        _write_partition(table, partition_date, arrow_table, root)
+        exported.append(partition_date)
+        total_rows += arrow_table.num_rows
+
+    # Only a scan that saw every remaining day may prune (a dry-run cursor ends it early)
+    removed = _remove_stale_partitions(table, scan_start, exported, root) if scan_complete else []
+
+    logging.info(f"Exported {total_rows} {table} rows in {len(exported)} partition(s) to {_table_dir(table, root)}"
+                 f"{f'; removed {len(removed)} stale partition(s)' if removed else ''}.")
+    return {"partitions": exported, "removed": removed, "rows": total_rows}
+
+
+def export_tables(cursor, tables=tuple(EXPORT_TABLES), root=EXPORT_ROOT, full=False):
+    """Pipeline step: export each table, logging the outcome to ingestion_logs."""
+    try:
+        for table in tables:
+            result = export_table(cursor, table, root=root, full=full)
+            log_to_snowflake(cursor, "INFO", "export_parquet",
+                             f"{table}: exported {len(result['partitions'])} partition(s) to Parquet.",
+                             records_loaded=result["rows"])
+    except Exception as e:
+        logging.error(f"Error exporting tables to Parquet: {e}")
+        log_to_snowflake(cursor, "ERROR", "export_parquet", "Failed to export tables to Parquet", error_details=str(e))
+        raise
+
+
+def read_export(table, start_date=None, end_date=None, columns=None, row_filter=None, root=EXPORT_ROOT, as_arrow=False):
+    """
+    Read an exported table, touching only the partitions and columns asked for.
+
+    Args:
+        start_date / end_date: date-like inclusive bounds on the partition column; partitions
+            outside them are pruned by directory name without opening their files
+        columns: list or None - columns to read (the partition column is available too)
+        row_filter: pyarrow.dataset expression on the data columns, e.g. ds.field("user_id") == 1001;
+            row groups whose statistics rule it out are skipped
+        as_arrow: bool - return a pyarrow.Table instead of a pandas DataFrame
+    """
+    partition_column = EXPORT_TABLES[table]["partition_column"]
+    table_dir = _table_dir(table, root)
+    if not os.path.isdir(table_dir):
+        raise FileNotFoundError(f"No export of {table} under {root}")
+
+    dataset = ds.dataset(
+        table_dir,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([(partition_column, pa.date32())]), flavor="hive"),
+    )
+    conditions = [] if row_filter is None else [row_filter]
+    if start_date is not None:
+        conditions.append(ds.field(partition_column) >= pd.Timestamp(start_date).date())
+    if end_date is not None:
+        conditions.append(ds.field(partition_column) <= pd.Timestamp(end_date).date())
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    result = dataset.to_table(columns=columns, filter=expression)
+    return result if as_arrow else result.to_pandas()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export fact and feature tables to date-partitioned Parquet.")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES), default=list(EXPORT_TABLES))
+    parser.add_argument("--out", default=EXPORT_ROOT, help="Export root directory (or PIPELINE_EXPORT_DIR)")
+    parser.add_argument("--full", action="store_true",
+                        help="Rewrite every partition instead of only new ones, removing days no longer in the source.")
+    parser.add_argument(
+        "--backend",
+        choices=PIPELINE_BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="Run against Snowflake or the local SQLite stand-in (data/local/marketing_pipeline.db, or PIPELINE_LOCAL_DB).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(tables=tuple(EXPORT_TABLES), root=EXPORT_ROOT, full=False, backend=None):
+    logging.basicConfig(level=logging.INFO)
+    with get_connection_pool(connect=get_backend_connect(backend)).connection() as conn:
+        cursor = conn.cursor()
+        try:
+            export_tables(cursor, tables=tables, root=root, full=full)
+            conn.commit()
+        finally:
+            cursor.close()
+    close_connection_pool()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(tables=args.tables, root=args.out, full=args.full, backend=args.backend)
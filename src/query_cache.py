@@ -0,0 +1,252 @@
+# src/query_cache.py
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from transformations import DIM_CUSTOMER_WATERMARK
+
+# feature_engineering imports this module, so iter_result_batches is imported where used
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cached result sets: one Parquet file per query and database, named <query key>.<table versions key>.parquet
+QUERY_CACHE_DIR = os.getenv("PIPELINE_QUERY_CACHE_DIR", os.path.join(REPO_ROOT, "data", "query_cache"))
+
+# Least recently used entries are evicted once the cache directory grows past this size
+QUERY_CACHE_MAX_BYTES = int(os.getenv("PIPELINE_QUERY_CACHE_MAX_BYTES", str(512 * 2**20)))
+
+# PIPELINE_QUERY_CACHE=0 sends every lookup to the warehouse
+QUERY_CACHE_ENABLED = os.getenv("PIPELINE_QUERY_CACHE", "1") != "0"
+
+# Cacheable source tables and the query returning their current version. Whatever it returns
+# is part of the cache key, so any change to it re-queries every result read from the table.
+#
+# feature_catalog: row count plus its own last-modified column (the catalog MERGE only
+#   touches rows whose metadata changed).
+# dim_customer: row count plus the pipeline_watermarks mark load_dim_customer moves whenever
+#   its MERGE inserts or updates rows (set in the loader's transaction, unlike the buffered
+#   ingestion_logs entries).
+# A NULL component (empty catalog, no dim_customer mark yet) makes the read uncacheable.
+TABLE_VERSION_QUERIES = {
+    "feature_catalog": "SELECT COUNT(*), MAX(COALESCE(last_updated_at, created_at)) FROM feature_catalog",
+    "dim_customer": f"""
+    SELECT
+        (SELECT COUNT(*) FROM dim_customer),
+        (SELECT MAX(watermark_value) FROM pipeline_watermarks WHERE source_name = '{DIM_CUSTOMER_WATERMARK}')
+    """,
+}
+
+_SQL_TOKEN_RE = re.compile(r"('(?:[^']|'')*')|\s+")
+
+
+def normalize_sql(sql):
+    """Collapse whitespace outside string literals and drop a trailing semicolon, so reformatted copies share an entry."""
+    sql = _SQL_TOKEN_RE.sub(lambda match: match.group(1) or " ", sql).strip()
+    return sql.rstrip(";").rstrip()
+
+
+def _digest(value, length):
+    return hashlib.sha256(json.dumps(value, default=str, sort_keys=True).encode("utf-8")).hexdigest()[:length]
+
+
+def table_versions(cursor, tables):
+    """Current version of each source table, as {table: [values...]} (see TABLE_VERSION_QUERIES)."""
+    versions = {}
+    for table in sorted(tables):
+        cursor.execute(TABLE_VERSION_QUERIES[table])
+        versions[table] = [None if value is None else str(value) for value in cursor.fetchone()]
+    return versions
+
+
+def backend_identity(cursor):
+    """
+    The database a cursor reads, as part of the cache key, so two backends or databases never share entries.
+
+    Returns:
+        {"backend": "snowflake", "account", "database", "schema"} or {"backend": "local", "db_path"},
+        or None when the database cannot be identified (no connection, a ':memory:' database)
+    """
+    connection = getattr(cursor, "connection", None)
+    if connection is None:
+        return None
+    if hasattr(connection, "db_path"):
+        db_path = connection.db_path
+        return None if db_path in (None, ":memory:") else {"backend": "local", "db_path": db_path}
+    account = getattr(connection, "account", None)
+    if not account:
+        return None
+    return {"backend": "snowflake", "account": account, "database": getattr(connection, "database", None),
+            "schema": getattr(connection, "schema", None)}
+
+
+def _fetch_frame(cursor, batch_size):
+    from feature_engineering import FETCH_BATCH_SIZE, iter_result_batches
+
+    batches = list(iter_result_batches(cursor, batch_size or FETCH_BATCH_SIZE))
+    if batches:
+        return pd.concat(batches, ignore_index=True)
+    return pd.DataFrame(columns=[desc[0].lower() for desc in cursor.description])
+
+
+def _entries(cache_dir):
+    """(path, size, mtime) of every complete cache entry."""
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".parquet") and not name.startswith("."):
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime_ns))
+    return entries
+
+
+def evict_query_cache(cache_dir=QUERY_CACHE_DIR, max_bytes=QUERY_CACHE_MAX_BYTES):
+    """Remove least recently used entries (hits refresh a file's mtime) until the cache fits in max_bytes."""
+    entries = sorted(_entries(cache_dir), key=lambda entry: entry[2])
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for path, size, _ in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+    if evicted:
+        logging.info(f"Query cache: evicted {evicted} least recently used entr{'y' if evicted == 1 else 'ies'}.")
+    return evicted
+
+
+def _store(cache_dir, query_key, path, frame, max_bytes):
+    os.makedirs(cache_dir, exist_ok=True)
+    # Dot-prefixed until complete, so neither lookups nor eviction see a partial file
+    tmp_path = os.path.join(cache_dir, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    # Results of the same query at older table versions can never be served again
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{query_key}.") and os.path.join(cache_dir, name) != path:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass
+    evict_query_cache(cache_dir, max_bytes)
+
+
+def cached_query(cursor, sql, tables, params=None, batch_size=None, cache_dir=None,
+                 max_bytes=QUERY_CACHE_MAX_BYTES, enabled=None):
+    """
+    Run a read-only query through the local result cache.
+
+    The entry is keyed by the database (backend_identity), the normalized SQL and params,
+    plus the current version of every table the query reads, so it is served from disk
+    while those tables are unchanged and re-queried (and replaced) as soon as one of them
+    changes. Only the version lookups reach the warehouse on a hit. A query is not cached
+    when its database cannot be identified or a version component is NULL (e.g. no
+    watermark yet), since NULL cannot tell two table states apart.
+
+    Args:
+        sql: str - SELECT reading only from tables
+        tables: iterable of source table names, each listed in TABLE_VERSION_QUERIES
+        params: bound parameters, part of the key
+        cache_dir: str or None - None follows QUERY_CACHE_DIR (PIPELINE_QUERY_CACHE_DIR)
+        enabled: bool or None - None follows PIPELINE_QUERY_CACHE
+
+    Returns:
+        DataFrame with lower-case columns, as iter_result_batches would yield it concatenated
+    """
+    unknown = [table for table in tables if table not in TABLE_VERSION_QUERIES]
+    if unknown:
+        raise ValueError(f"No version query for {', '.join(unknown)}; add it to TABLE_VERSION_QUERIES before caching reads from it")
+
+    enabled = QUERY_CACHE_ENABLED if enabled is None else enabled
+    cache_dir = QUERY_CACHE_DIR if cache_dir is None else cache_dir
+    if not enabled:
+        cursor.execute(sql, params)
+        return _fetch_frame(cursor, batch_size)
+
+    identity = backend_identity(cursor)
+    if identity is None:
+        logging.info("Query cache bypassed: the cursor's database cannot be identified.")
+        cursor.execute(sql, params)
+        return _fetch_frame(cursor, batch_size)
+
+    try:
+        versions = table_versions(cursor, tables)
+    except Exception as e:
+        # A missing version source (e.g. no pipeline_watermarks yet) only costs the cache
+        logging.warning(f"Query cache bypassed: could not read table versions ({e}).")
+        cursor.execute(sql, params)
+        return _fetch_frame(cursor, batch_size)
+
+    unversioned = sorted(table for table, values in versions.items() if any(value is None for value in values))
+    if unversioned:
+        logging.info(f"Query cache bypassed: no version yet for {', '.join(unversioned)}.")
+        cursor.execute(sql, params)
+        return _fetch_frame(cursor, batch_size)
+
+    query_key = _digest([identity, normalize_sql(sql), params], 32)
+    path = os.path.join(cache_dir, f"{query_key}.{_digest(versions, 16)}.parquet")
+
+    try:
+        frame = pq.read_table(path).to_pandas()
+        os.utime(path)  # mark as recently used
+        logging.info(f"Query cache hit for {', '.join(sorted(tables))} ({len(frame)} rows from {path}).")
+        return frame
+    except FileNotFoundError:
+        pass
+    except (OSError, pa.ArrowException) as e:
+        logging.warning(f"Query cache entry {path} unreadable ({e}); re-querying.")
+
+    cursor.execute(sql, params)
+    frame = _fetch_frame(cursor, batch_size)
+    try:
+        _store(cache_dir, query_key, path, frame, max_bytes)
+        logging.info(f"Query cache miss for {', '.join(sorted(tables))}: cached {len(frame)} rows.")
+    except (OSError, pa.ArrowException) as e:
+        logging.warning(f"Could not cache query result in {cache_dir}: {e}")
+    return frame
+
+
+def clear_query_cache(cache_dir=QUERY_CACHE_DIR):
+    """Remove every cache entry; returns the number removed."""
+    entries = _entries(cache_dir)
+    for path, _, _ in entries:
+        os.remove(path)
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the local query result cache.")
+    parser.add_argument("--dir", default=QUERY_CACHE_DIR, help="Cache directory (or PIPELINE_QUERY_CACHE_DIR)")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached result.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.clear:
+        logging.info(f"Removed {clear_query_cache(args.dir)} cached result(s) from {args.dir}.")
+        return
+    entries = _entries(args.dir)
+    print(json.dumps({"dir": args.dir, "entries": len(entries), "bytes": sum(size for _, size, _ in entries),
+                      "max_bytes": QUERY_CACHE_MAX_BYTES}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
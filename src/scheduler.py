@@ -0,0 +1,207 @@
+# src/scheduler.py
+import logging
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from instrumentation import instrument_step
+
+# Default number of pipeline steps allowed to run at the same time
+DEFAULT_MAX_WORKERS = 4
+
+
+class PipelineTask:
+    """A pipeline step: a callable taking a cursor, plus the names of the steps it depends on."""
+
+    def __init__(self, name, func, depends_on=()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+    def __repr__(self):
+        return f"PipelineTask({self.name!r}, depends_on={self.depends_on!r})"
+
+
+class DryRunCursor:
+    """
+    Stand-in cursor that logs SQL instead of running it.
+
+    SELECTs return a single row of zeros sized to the select list, and MERGEs a zero
+    (inserted, updated, deleted) row like Snowflake's, so callers that unpack
+    fetchone() keep working; everything else returns empty results.
+    """
+
+    def __init__(self, task_name=None):
+        self.task_name = task_name
+        self.description = None
+        self.rowcount = 0
+        self._row = None
+
+    def execute(self, sql, params=None):
+        statement = " ".join(sql.split())
+        logging.info(f"[dry-run:{self.task_name}] {statement[:200]}")
+        width = 3 if re.match(r"MERGE\s", statement, re.IGNORECASE) else _select_width(statement)
+        self._row = (0,) * width if width else None
+        self.description = [(f"col{i}", None, None, None, None, None, None) for i in range(width)] or None
+        self.rowcount = 0
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        return self.execute(sql)
+
+    def fetchone(self):
+        return self._row
+
+    def fetchmany(self, size=None):
+        return []
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+def _select_width(statement):
+    """Number of top-level expressions in a SELECT list (0 if the statement is not a SELECT)."""
+    match = re.match(r"\s*SELECT\s+(.*?)\s+FROM\s", statement, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return 0
+    depth, width = 0, 1
+    for char in match.group(1):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            width += 1
+    return width
+
+
+def _validate_tasks(tasks):
+    """Fail fast on duplicate names, unknown dependencies and cycles."""
+    by_name = {}
+    for task in tasks:
+        if task.name in by_name:
+            raise ValueError(f"Duplicate pipeline task name: {task.name}")
+        by_name[task.name] = task
+
+    for task in tasks:
+        for dep in task.depends_on:
+            if dep not in by_name:
+                raise ValueError(f"Task '{task.name}' depends on unknown task '{dep}'")
+
+    # Kahn's algorithm: if we cannot order every task there is a cycle
+    remaining = {task.name: set(task.depends_on) for task in tasks}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between tasks: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return by_name
+
+
+def _run_task(task, connection_pool, dry_run):
+    """Run one instrumented task on a connection checked out of the pool and return its wall time in seconds."""
+    start = time.perf_counter()
+    if dry_run:
+        with instrument_step(task.name, DryRunCursor(task.name)) as metrics:
+            task.func(metrics["cursor"])
+        return time.perf_counter() - start
+
+    with connection_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # Every execute goes through an InstrumentedCursor; the step's metrics row commits with the step
+            with instrument_step(task.name, cursor) as metrics:
+                task.func(metrics["cursor"])
+            conn.commit()
+        finally:
+            cursor.close()
+    return time.perf_counter() - start
+
+
+def _skip_blocked_tasks(tasks, results):
+    """Mark pending tasks downstream of a failed (or skipped) task as skipped, transitively."""
+    changed = True
+    while changed:
+        changed = False
+        for task in tasks:
+            if results[task.name]["status"] != "pending":
+                continue
+            blocked_by = [dep for dep in task.depends_on if results[dep]["status"] in ("failed", "skipped")]
+            if blocked_by:
+                results[task.name]["status"] = "skipped"
+                logging.warning(f"Step {task.name} skipped (blocked by: {', '.join(blocked_by)}).")
+                changed = True
+
+
+def run_pipeline_dag(tasks, connection_pool=None, max_workers=DEFAULT_MAX_WORKERS, dry_run=False):
+    """
+    Run pipeline tasks in dependency order, overlapping independent branches on a thread pool.
+
+    Args:
+        tasks: list of PipelineTask
+        connection_pool: utils.ConnectionPool each step checks its connection out of (ignored when dry_run)
+        max_workers: int - maximum number of steps running concurrently
+        dry_run: bool - run every step against a DryRunCursor that only logs SQL
+
+    Returns:
+        dict of task name -> {"status": "success" | "failed" | "skipped", "seconds": float or None}
+
+    Raises:
+        The first task exception, once every task not downstream of a failure has run
+        (the failed tasks' transitive dependents are skipped).
+    """
+    if connection_pool is None and not dry_run:
+        raise ValueError("connection_pool is required unless dry_run=True")
+
+    _validate_tasks(tasks)
+    results = {task.name: {"status": "pending", "seconds": None} for task in tasks}
+    pipeline_start = time.perf_counter()
+    first_error = None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline") as executor:
+        running = {}
+        while True:
+            _skip_blocked_tasks(tasks, results)
+
+            # Submit every pending task whose dependencies all succeeded
+            for task in tasks:
+                if results[task.name]["status"] != "pending":
+                    continue
+                if all(results[dep]["status"] == "success" for dep in task.depends_on):
+                    logging.info(f"Starting step {task.name}...")
+                    results[task.name]["status"] = "running"
+                    future = executor.submit(_run_task, task, connection_pool, dry_run)
+                    running[future] = task.name
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    seconds = future.result()
+                    results[name].update(status="success", seconds=round(seconds, 3))
+                    logging.info(f"Step {name} finished in {seconds:.2f}s.")
+                except Exception as e:
+                    results[name]["status"] = "failed"
+                    logging.error(f"Step {name} failed: {e}")
+                    if first_error is None:
+                        first_error = e
+
+    total = time.perf_counter() - pipeline_start
+    summary = ", ".join(
+        f"{name}={result['seconds']}s" if result["seconds"] is not None else f"{name}={result['status']}"
+        for name, result in results.items()
+    )
+    logging.info(f"Pipeline step timings: {summary}; total wall clock {total:.2f}s.")
+
+    if first_error is not None:
+        raise first_error
+    return results
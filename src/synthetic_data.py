@@ -0,0 +1,158 @@
+# src/synthetic_data.py
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+# Value pools matching the shape of data/raw/mock_*.{csv,json}
+FIRST_NAMES = ["Agathe", "Frasco", "Slade", "Andria", "Maribel", "Tobe", "Hal", "Lorrie", "Vinny", "Odette"]
+LAST_NAMES = ["Cagan", "Grollmann", "Henryson", "Tassell", "Brisson", "Kemble", "Ord", "Pinner", "Vasey", "Wyeth"]
+EMAIL_DOMAINS = ["buzzfeed.com", "bloglovin.com", "slashdot.org", "archive.org", "example.com"]
+REGIONS = ["East", "West", "North", "South"]
+EVENT_TYPES = ["click", "page_view", "add_to_cart", "form_submit", "purchase"]
+URL_HOSTS = ["http://usnews.com", "https://trellian.com", "https://cafepress.com", "https://cnn.com", "https://shop.example.com"]
+URL_PATHS = ["/cras/mi.aspx", "/est/risus/auctor.json", "/odio/consequat/varius.html", "/habitasse/platea.jpg", "/cart"]
+
+# Events generated (and held in memory) per chunk while writing clickstream files
+EVENT_CHUNK_SIZE = 500_000
+
+
+def generate_customers(n_customers, out_path, seed=42, signup_days=730):
+    """
+    Write a customer demographics CSV with the same header and date format as the mock file.
+
+    Returns:
+        numpy array of the generated customer_ids
+    """
+    rng = np.random.default_rng(seed)
+    customer_ids = rng.permutation(np.arange(1, n_customers + 1)) + 1000
+    first = np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), n_customers)]
+    last = np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), n_customers)]
+    today = pd.Timestamp.today().normalize()
+    signup = today - pd.to_timedelta(rng.integers(0, signup_days, n_customers), unit="D")
+
+    customers = pd.DataFrame({
+        "customer_id": customer_ids,
+        "first_name": first,
+        "last_name": last,
+        "email": pd.Series(first).str.lower().str[0] + pd.Series(last).str.lower()
+                 + customer_ids.astype(str) + "@" + np.array(EMAIL_DOMAINS)[rng.integers(0, len(EMAIL_DOMAINS), n_customers)],
+        "region": np.array(REGIONS)[rng.integers(0, len(REGIONS), n_customers)],
+        "signup_date": signup.strftime("%Y/%m/%d"),
+    })
+    customers.to_csv(out_path, index=False)
+    logging.info(f"Wrote {n_customers} customers to {out_path}.")
+    return customer_ids
+
+
+def _activity_cdf(n_customers, skew):
+    """Zipf-like activity: the k-th most active user gets weight 1 / k**skew (skew=0 means uniform)."""
+    weights = 1.0 / np.arange(1, n_customers + 1, dtype="float64") ** skew
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def _uuid_strings(rng, n):
+    """n uuid4-shaped strings (8-4-4-4-12 hex groups) from one random byte buffer."""
+    hex_ids = pd.Series(np.frombuffer(rng.bytes(16 * n).hex().encode(), dtype="S32").astype(str))
+    return (hex_ids.str[:8] + "-" + hex_ids.str[8:12] + "-4" + hex_ids.str[13:16] + "-a"
+            + hex_ids.str[17:20] + "-" + hex_ids.str[20:])
+
+
+def _event_lines(rng, customer_ids, cdf, n_events, history_days):
+    """One chunk of clickstream events, already serialized as JSON objects (one per line)."""
+    now = np.datetime64(pd.Timestamp.now(tz="UTC").tz_localize(None).floor("s"), "s")
+    event_ids = _uuid_strings(rng, n_events)
+    # numpy formats datetime64[s] as ISO 8601 far faster than strftime
+    seconds_ago = rng.integers(0, history_days * 86400, n_events).astype("timedelta64[s]")
+    timestamps = pd.Series(np.datetime_as_string(now - seconds_ago)) + "Z"
+    user_ids = pd.Series(customer_ids[np.searchsorted(cdf, rng.random(n_events))]).astype(str)
+    event_types = pd.Series(np.array(EVENT_TYPES)[rng.integers(0, len(EVENT_TYPES), n_events)])
+    page_urls = (pd.Series(np.array(URL_HOSTS)[rng.integers(0, len(URL_HOSTS), n_events)])
+                 + pd.Series(np.array(URL_PATHS)[rng.integers(0, len(URL_PATHS), n_events)])
+                 + "?id=" + pd.Series(rng.integers(0, 10_000, n_events)).astype(str))
+    durations = pd.Series(rng.integers(50, 6000, n_events)).astype(str)
+    # Pool values never need JSON escaping, so plain concatenation is valid JSON and far faster than json.dumps
+    return ('{"event_id":"' + event_ids + '","timestamp":"' + timestamps + '","user_id":' + user_ids
+            + ',"event_type":"' + event_types + '","page_url":"' + page_urls + '","duration_ms":' + durations + "}")
+
+
+def generate_clickstream(customer_ids, n_events, out_dir, seed=42, skew=1.1, events_per_file=1_000_000,
+                         history_days=180):
+    """
+    Write clickstream events as JSON-array files (one object per line, like the mock file).
+
+    Memory stays bounded by EVENT_CHUNK_SIZE regardless of n_events; files are split every
+    events_per_file events so the stage has many files, as a production bucket would.
+
+    Returns:
+        list of written file paths
+    """
+    rng = np.random.default_rng(seed + 1)
+    cdf = _activity_cdf(len(customer_ids), skew)
+    # Shuffle which customers are the heavy users
+    active_order = rng.permutation(customer_ids)
+
+    paths = []
+    written = 0
+    file_index = 0
+    while written < n_events:
+        file_events = min(events_per_file, n_events - written)
+        path = os.path.join(out_dir, f"clickstream_{file_index:05d}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[")
+            remaining = file_events
+            while remaining:
+                chunk_size = min(EVENT_CHUNK_SIZE, remaining)
+                if remaining != file_events:
+                    f.write(",\n")
+                f.write(",\n".join(_event_lines(rng, active_order, cdf, chunk_size, history_days)))
+                remaining -= chunk_size
+            f.write("]")
+        paths.append(path)
+        written += file_events
+        file_index += 1
+        logging.info(f"Wrote {file_events} events to {path} ({written}/{n_events}).")
+    return paths
+
+
+def generate_dataset(out_dir, n_customers=10_000, n_events=100_000, seed=42, skew=1.1,
+                     events_per_file=1_000_000, history_days=180):
+    """
+    Generate a schema-identical customer CSV and clickstream JSON files under out_dir.
+
+    Returns:
+        dict with csv_dir, json_dir (usable as local stage paths) and file lists
+    """
+    csv_dir = os.path.join(out_dir, "csv")
+    json_dir = os.path.join(out_dir, "json")
+    os.makedirs(csv_dir, exist_ok=True)
+    os.makedirs(json_dir, exist_ok=True)
+
+    customers_path = os.path.join(csv_dir, "customer_demographics.csv")
+    customer_ids = generate_customers(n_customers, customers_path, seed=seed)
+    json_paths = generate_clickstream(customer_ids, n_events, json_dir, seed=seed, skew=skew,
+                                      events_per_file=events_per_file, history_days=history_days)
+    return {"csv_dir": csv_dir, "json_dir": json_dir, "csv_files": [customers_path], "json_files": json_paths}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic customer/clickstream data at scale.")
+    parser.add_argument("--out", default="data/synthetic", help="Output directory")
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=100_000, help="Number of click events (10K to 100M)")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for per-user activity (0 = uniform)")
+    parser.add_argument("--events-per-file", type=int, default=1_000_000)
+    parser.add_argument("--history-days", type=int, default=180)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    generate_dataset(args.out, n_customers=args.customers, n_events=args.events, seed=args.seed, skew=args.skew,
+                     events_per_file=args.events_per_file, history_days=args.history_days)
+
+
+if __name__ == "__main__":
+    main()
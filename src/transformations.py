@@ -1,46 +1,164 @@
 import logging
+import pandas as pd
 from utils import log_to_snowflake
+from watermarks import ensure_watermark_tables, get_high_watermark, set_high_watermark
+
+# dim_customer definition
+DIM_CUSTOMER_DDL = """
+CREATE TABLE IF NOT EXISTS dim_customer (
+    customer_id VARCHAR PRIMARY KEY,
+    first_name VARCHAR,
+    email VARCHAR,
+    signup_date DATE,
+    region VARCHAR,
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    row_hash VARCHAR
+);
+"""
+
+# Tables created before row_hash existed get the column added in place
+DIM_CUSTOMER_ROW_HASH_DDL = "ALTER TABLE dim_customer ADD COLUMN IF NOT EXISTS row_hash VARCHAR;"
+
+# Optional SCD type-2 history: one row per version of a customer, the live one flagged is_current
+DIM_CUSTOMER_HISTORY_DDL = """
+CREATE TABLE IF NOT EXISTS dim_customer_history (
+    customer_id VARCHAR,
+    first_name VARCHAR,
+    email VARCHAR,
+    signup_date DATE,
+    region VARCHAR,
+    row_hash VARCHAR,
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    valid_to TIMESTAMP,
+    is_current BOOLEAN DEFAULT TRUE
+);
+"""
+
+# Tracked attributes: a change to any of them changes row_hash and triggers an UPDATE
+DIM_CUSTOMER_HASH_COLUMNS = ("first_name", "email", "signup_date", "region")
+
+
+def _row_hash_sql(columns):
+    """MD5 over the '|'-joined columns, NULLs as empty strings (|| works in Snowflake and SQLite alike)."""
+    parts = " || '|' || ".join(f"COALESCE(CAST({column} AS VARCHAR), '')" for column in columns)
+    return f"MD5({parts})"
+
+
+# Deduplicated customers with their row hash, shared by the dim MERGE and the history maintenance
+DIM_CUSTOMER_SOURCE_SQL = f"""
+SELECT customer_id, first_name, email, signup_date, region,
+       {_row_hash_sql(DIM_CUSTOMER_HASH_COLUMNS)} AS row_hash
+FROM (
+    SELECT DISTINCT customer_id, first_name, email, signup_date, region
+    FROM raw_customer_demographics
+    WHERE customer_id IS NOT NULL
+) AS deduped
+"""
+
+# pipeline_watermarks source name for the time dim_customer last had rows inserted or updated
+# (part of its version in query_cache)
+DIM_CUSTOMER_WATERMARK = "dim_customer"
+
+# pipeline_watermarks source name for the newest raw_clickstream.loaded_at merged into fact_click_events
+FACT_WATERMARK = "fact_click_events_loaded_at"
+
+# Incremental MERGEs match target events down to this many hours before the oldest new event,
+# so a re-delivered event whose event_time moved back a little still matches its fact row
+FACT_LATE_ARRIVAL_HOURS = 48
+
+# Clustering by event date lets Snowflake prune micro-partitions outside the MERGE window
+FACT_CLUSTER_BY_SQL = "ALTER TABLE fact_click_events CLUSTER BY (TO_DATE(event_time));"
+
+
+def _fact_window_start(oldest_event_time, lookback_hours):
+    """Lower target event_time bound for an incremental MERGE: oldest new event minus the lookback, as ISO UTC."""
+    mark = pd.Timestamp(oldest_event_time)
+    if mark.tzinfo is None:
+        mark = mark.tz_localize("UTC")
+    window_start = mark.tz_convert("UTC") - pd.Timedelta(hours=lookback_hours)
+    # Floor to the second so the bound is never later than an event stored without fractions
+    return window_start.floor("s").strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _update_customer_history(cursor):
+    """
+    SCD type-2 maintenance: close the current version of every customer whose hash changed,
+    then open a new current version for customers that no longer have one (changed or new).
+    """
+    cursor.execute(DIM_CUSTOMER_HISTORY_DDL)
+
+    close_sql = f"""
+    MERGE INTO dim_customer_history AS target
+    USING ({DIM_CUSTOMER_SOURCE_SQL}) AS source
+    ON target.customer_id = source.customer_id AND target.is_current = TRUE
+    WHEN MATCHED AND target.row_hash IS DISTINCT FROM source.row_hash THEN
+        UPDATE SET
+            target.valid_to = CURRENT_TIMESTAMP(),
+            target.is_current = FALSE;
+    """
+    cursor.execute(close_sql)
+
+    open_sql = f"""
+    INSERT INTO dim_customer_history (customer_id, first_name, email, signup_date, region, row_hash)
+    SELECT source.customer_id, source.first_name, source.email, source.signup_date, source.region, source.row_hash
+    FROM ({DIM_CUSTOMER_SOURCE_SQL}) AS source
+    LEFT JOIN dim_customer_history AS current_version
+        ON current_version.customer_id = source.customer_id AND current_version.is_current = TRUE
+    WHERE current_version.customer_id IS NULL;
+    """
+    cursor.execute(open_sql)
 
 # Load and populate the dimension table for customer data
-def load_dim_customer(cursor):
+def load_dim_customer(cursor, scd2=False):
+    """
+    Hash-diff upsert of raw_customer_demographics into dim_customer.
+
+    Matched rows are only rewritten when their row_hash changed, so an unchanged
+    dimension costs a join but no micro-partition rewrites.
+
+    Args:
+        scd2: bool - also keep SCD type-2 history in dim_customer_history
+    """
     logging.info("Populating dim_customer...")
 
     try:
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS dim_customer (
-            customer_id VARCHAR PRIMARY KEY,
-            first_name VARCHAR,
-            email VARCHAR,
-            signup_date DATE,
-            region VARCHAR,
-            is_active BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """
-        cursor.execute(create_table_sql)
+        cursor.execute(DIM_CUSTOMER_DDL)
+        cursor.execute(DIM_CUSTOMER_ROW_HASH_DDL)
 
-        merge_sql = """
+        # Rows from before row_hash existed have a NULL hash, which counts as changed and backfills it
+        merge_sql = f"""
         MERGE INTO dim_customer AS target
-        USING (
-            SELECT DISTINCT customer_id, first_name, email, signup_date, region
-            FROM raw_customer_demographics
-            WHERE customer_id IS NOT NULL
-        ) AS source
+        USING ({DIM_CUSTOMER_SOURCE_SQL}) AS source
         ON target.customer_id = source.customer_id
-        WHEN MATCHED THEN
+        WHEN MATCHED AND target.row_hash IS DISTINCT FROM source.row_hash THEN
             UPDATE SET
                 target.first_name = source.first_name,
                 target.email = source.email,
                 target.signup_date = source.signup_date,
-                target.region = source.region
+                target.region = source.region,
+                target.row_hash = source.row_hash
         WHEN NOT MATCHED THEN
-            INSERT (customer_id, first_name, email, signup_date, region)
-            VALUES (source.customer_id, source.first_name, source.email, source.signup_date, source.region);
+            INSERT (customer_id, first_name, email, signup_date, region, row_hash)
+            VALUES (source.customer_id, source.first_name, source.email, source.signup_date, source.region, source.row_hash);
         """
         cursor.execute(merge_sql)
+        # MERGE returns one row: number of rows inserted, number of rows updated
+        inserted, updated = cursor.fetchone()[:2]
+
+        cursor.execute("SELECT COUNT(DISTINCT customer_id) FROM raw_customer_demographics WHERE customer_id IS NOT NULL")
+        unchanged = max(cursor.fetchone()[0] - inserted - updated, 0)
+
+        if inserted or updated:
+            ensure_watermark_tables(cursor)
+            set_high_watermark(cursor, DIM_CUSTOMER_WATERMARK, pd.Timestamp.now(tz="UTC").strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
+
+        if scd2:
+            _update_customer_history(cursor)
 
-        logging.info("dim_customer table populated successfully.")
-        log_to_snowflake(cursor, "INFO", "load_dim_customer", "dim_customer loaded successfully.")
+        summary = f"{inserted} inserted, {updated} updated, {unchanged} unchanged"
+        logging.info(f"dim_customer table populated successfully ({summary}).")
+        log_to_snowflake(cursor, "INFO", "load_dim_customer", f"dim_customer loaded successfully ({summary}).",
+                         records_loaded=inserted + updated)
 
     except Exception as e:
         logging.error(f"Error populating dim_customer: {e}")
@@ -48,7 +166,18 @@ def load_dim_customer(cursor):
         raise
 
 # Load and populate the fact table for click event data
-def load_fact_click_events(cursor):
+def load_fact_click_events(cursor, incremental=True, lookback_hours=FACT_LATE_ARRIVAL_HOURS, cluster_by_event_date=False):
+    """
+    MERGE new click events into fact_click_events.
+
+    Args:
+        incremental: bool - MERGE only raw_clickstream rows loaded since the last run (loaded_at at
+            or after the watermark), however old their events are, and bound the target side by
+            event_time >= (oldest of those events - lookback_hours), so the MERGE joins the new
+            rows instead of the whole history. Falls back to a full MERGE when no watermark exists yet.
+        lookback_hours: int - target-side slack below the oldest new event
+        cluster_by_event_date: bool - (re)apply the TO_DATE(event_time) clustering key
+    """
     logging.info("Populating fact_click_events...")
 
     try:
@@ -65,8 +194,34 @@ def load_fact_click_events(cursor):
         );
         """
         cursor.execute(create_table_sql)
+        if cluster_by_event_date:
+            cursor.execute(FACT_CLUSTER_BY_SQL)
+        ensure_watermark_tables(cursor)
+
+        loaded_since = get_high_watermark(cursor, FACT_WATERMARK) if incremental else None
+        params = {"loaded_since": loaded_since}
+        loaded_filter = "AND LOADED_AT >= %(loaded_since)s" if loaded_since is not None else ""
 
-        insert_sql = """
+        # The newest load this run covers; capped at now so a bad clock can never park the watermark in the future
+        cursor.execute(f"""
+        SELECT MIN(TIMESTAMP), MAX(LOADED_AT)
+        FROM MARKETING_DATE.STAGE_DATE.RAW_CLICKSTREAM
+        WHERE EVENT_ID IS NOT NULL AND LOADED_AT <= CURRENT_TIMESTAMP()
+        {loaded_filter}
+        """, params)
+        oldest_event, new_mark = cursor.fetchone()
+        if loaded_since is not None and oldest_event is None:
+            logging.info(f"No raw_clickstream rows loaded since {loaded_since}; fact_click_events is up to date.")
+            log_to_snowflake(cursor, "INFO", "load_fact_click_events",
+                             f"No new raw_clickstream rows since {loaded_since}.", records_loaded=0)
+            return
+
+        # Bounding the target by event_time lets Snowflake prune its partitions; a new row for an
+        # already-loaded event is still matched there, so nothing is duplicated
+        window_start = _fact_window_start(oldest_event, lookback_hours) if loaded_since is not None else None
+        params["window_start"] = window_start
+        target_filter = "AND target.event_time >= %(window_start)s" if window_start else ""
+        insert_sql = f"""
         MERGE INTO fact_click_events AS target
         USING (
             SELECT
@@ -78,16 +233,24 @@ def load_fact_click_events(cursor):
                 TIMESTAMP
             FROM MARKETING_DATE.STAGE_DATE.RAW_CLICKSTREAM
             WHERE EVENT_ID IS NOT NULL
+            {loaded_filter}
         ) AS source
         ON target.event_id = source.EVENT_ID
+        {target_filter}
         WHEN NOT MATCHED THEN
             INSERT (event_id, user_id, event_type, page_url, duration_ms, event_time)
             VALUES (source.EVENT_ID, source.USER_ID, source.EVENT_TYPE, source.PAGE_URL, source.DURATION_MS, source.TIMESTAMP);
         """
-        cursor.execute(insert_sql)
+        cursor.execute(insert_sql, params)
+        records_loaded = cursor.rowcount
+
+        # Rows loaded at the mark itself are merged again next run (>=), which the MERGE makes harmless
+        if new_mark is not None:
+            set_high_watermark(cursor, FACT_WATERMARK, new_mark)
 
-        logging.info("fact_click_events table populated successfully.")
-        log_to_snowflake(cursor, "INFO", "load_fact_click_events", "fact_click_events loaded successfully.", records_loaded=cursor.rowcount)
+        mode = f"incremental, rows loaded since {loaded_since}" if loaded_since is not None else "full"
+        logging.info(f"fact_click_events table populated successfully ({mode} MERGE).")
+        log_to_snowflake(cursor, "INFO", "load_fact_click_events", f"fact_click_events loaded successfully ({mode} MERGE).", records_loaded=records_loaded)
 
     except Exception as e:
         logging.error(f"Error populating fact_click_events: {e}")
@@ -1,5 +1,13 @@
 # src/utils.py
+import functools
+import json
 import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import snowflake.connector
 from dotenv import load_dotenv
 import os
@@ -24,11 +32,443 @@ def get_snowflake_connection():
         raise
 
 
-    
+# Execution backend: "snowflake" (the warehouse) or "local" (SQLite stand-in in local_backend.py)
+PIPELINE_BACKENDS = ("snowflake", "local")
+DEFAULT_BACKEND = os.getenv("PIPELINE_BACKEND", "snowflake")
+LOCAL_DB_ENV_VAR = "PIPELINE_LOCAL_DB"
+
+
+def get_backend_connect(backend=None):
+    """
+    Return the connection factory for a backend.
+
+    Args:
+        backend: "snowflake" or "local" (defaults to PIPELINE_BACKEND, else "snowflake").
+            "local" connects to PIPELINE_LOCAL_DB, defaulting to the gitignored working copy
+            data/local/marketing_pipeline.db (seeded from the tracked data/marketing_pipeline.db),
+            and reads stage files from data/raw.
+    """
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend == "snowflake":
+        return get_snowflake_connection
+    if backend == "local":
+        # Imported lazily so Snowflake runs never touch the local backend module
+        from local_backend import LOCAL_DB_PATH, connect_local
+        db_path = os.getenv(LOCAL_DB_ENV_VAR, LOCAL_DB_PATH)
+        return functools.partial(connect_local, db_path)
+    raise ValueError(f"Unknown pipeline backend '{backend}'; expected one of {PIPELINE_BACKENDS}")
+
+
+# Pool sizing defaults (overridable through the environment)
+DEFAULT_POOL_SIZE = int(os.getenv("PIPELINE_POOL_SIZE", "4"))
+DEFAULT_POOL_IDLE_SECONDS = float(os.getenv("PIPELINE_POOL_IDLE_SECONDS", "300"))
+DEFAULT_POOL_CHECKOUT_TIMEOUT = float(os.getenv("PIPELINE_POOL_CHECKOUT_TIMEOUT", "60"))
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections shared by the pipeline steps.
+
+    Connections are created lazily by the pluggable connect callable (Snowflake by
+    default, any DB-API factory such as local_backend.connect_local in tests),
+    health-checked on checkout and closed after sitting idle for max_idle_seconds.
+
+    Usage:
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+    """
+
+    def __init__(self, connect, max_size=DEFAULT_POOL_SIZE, max_idle_seconds=DEFAULT_POOL_IDLE_SECONDS,
+                 checkout_timeout=DEFAULT_POOL_CHECKOUT_TIMEOUT, health_check_sql="SELECT 1"):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.checkout_timeout = checkout_timeout
+        self.health_check_sql = health_check_sql
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (connection, returned_at) pairs, most recently returned on the right
+        self._size = 0        # open connections, idle or checked out
+        self._closed = False
+        self._metrics = {
+            "checkouts": 0,
+            "connections_created": 0,
+            "connections_evicted": 0,
+            "failed_health_checks": 0,
+            "saturated_checkouts": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "peak_in_use": 0,
+        }
+
+    def _evict_idle(self):
+        """Close connections idle for longer than max_idle_seconds (caller holds the lock)."""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.max_idle_seconds:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._metrics["connections_evicted"] += 1
+            self._close_quietly(conn)
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.health_check_sql)
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logging.warning(f"Pooled connection failed health check, discarding it: {e}")
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logging.warning(f"Error closing pooled connection: {e}")
+
+    def acquire(self):
+        """Check out a healthy connection, waiting up to checkout_timeout if the pool is saturated."""
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        waited = False
+
+        while True:
+            conn, create = None, False
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                self._evict_idle()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f"Timed out after {self.checkout_timeout}s waiting for a pooled connection "
+                            f"(pool size {self.max_size})"
+                        )
+                    waited = True
+                    self._lock.wait(remaining)
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            # Connect / health-check outside the lock so other threads are not blocked on I/O
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._metrics["connections_created"] += 1
+            elif not self._is_healthy(conn):
+                self._close_quietly(conn)
+                with self._lock:
+                    self._size -= 1
+                    self._metrics["failed_health_checks"] += 1
+                    self._lock.notify()
+                continue
+
+            wait_seconds = time.monotonic() - start
+            with self._lock:
+                m = self._metrics
+                m["checkouts"] += 1
+                m["saturated_checkouts"] += int(waited)
+                m["total_wait_seconds"] += wait_seconds
+                m["max_wait_seconds"] = max(m["max_wait_seconds"], wait_seconds)
+                m["peak_in_use"] = max(m["peak_in_use"], self._size - len(self._idle))
+            return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool (or close it when discard is True or the pool is closed)."""
+        with self._lock:
+            if discard or self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it; rolls back on error."""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def metrics(self):
+        """Snapshot of pool counters plus current in-use / idle counts and saturation."""
+        with self._lock:
+            snapshot = dict(self._metrics)
+            in_use = self._size - len(self._idle)
+            snapshot.update(
+                max_size=self.max_size,
+                in_use=in_use,
+                idle=len(self._idle),
+                saturation=round(in_use / self.max_size, 3),
+                avg_wait_seconds=round(snapshot["total_wait_seconds"] / snapshot["checkouts"], 6)
+                if snapshot["checkouts"] else 0.0,
+            )
+        return snapshot
+
+    def close(self):
+        """Close idle connections and refuse new checkouts; checked-out connections close on release."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._lock.notify_all()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_connection_pool(connect=None, max_size=None):
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    Args:
+        connect: callable returning a new connection (defaults to the PIPELINE_BACKEND factory)
+        max_size: int or None - pool size used when the pool is created
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool._closed:
+            _default_pool = ConnectionPool(
+                connect or get_backend_connect(),
+                max_size=max_size or DEFAULT_POOL_SIZE,
+            )
+        return _default_pool
+
+
+def close_connection_pool():
+    """Close the process-wide pool (if any) and log its metrics."""
+    global _default_pool
+    with _default_pool_lock:
+        pool, _default_pool = _default_pool, None
+    if pool is not None:
+        logging.info(f"Connection pool metrics: {pool.metrics()}")
+        pool.close()
+
+
+# Buffered ingestion_logs sink settings (overridable through the environment)
+LOG_BATCH_SIZE = int(os.getenv("PIPELINE_LOG_BATCH_SIZE", "100"))
+LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("PIPELINE_LOG_FLUSH_INTERVAL", "2.0"))
+LOG_FALLBACK_PATH = os.getenv(
+    "PIPELINE_LOG_FALLBACK_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "ingestion_logs_fallback.jsonl"),
+)
+
+# Records sent to this logger end up in ingestion_logs (via SnowflakeLogHandler once installed)
+INGESTION_LOGGER_NAME = "pipeline.ingestion_logs"
+
+INGESTION_LOG_INSERT_SQL = """
+INSERT INTO ingestion_logs (log_timestamp, log_level, step_name, message, records_loaded, error_details)
+VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+class SnowflakeLogHandler(logging.Handler):
+    """
+    logging.Handler that buffers records and writes them to ingestion_logs in batches.
+
+    A background thread flushes whenever batch_size records are queued, every
+    flush_interval seconds, and on close(). It writes on its own connection (never a
+    pipeline cursor) and appends rows to a local JSON-lines file if the insert fails.
+    """
+
+    def __init__(self, connect, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL_SECONDS,
+                 fallback_path=LOG_FALLBACK_PATH, max_queue_size=10000):
+        super().__init__()
+        self._connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fallback_path = fallback_path
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._conn = None
+        self._stop = threading.Event()
+        self._flush_requested = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="ingestion-log-writer", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def _to_row(record):
+        log_timestamp = datetime.fromtimestamp(record.created, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+        return (
+            log_timestamp,
+            record.levelname,
+            getattr(record, "step_name", record.funcName),
+            record.getMessage(),
+            getattr(record, "records_loaded", None),
+            getattr(record, "error_details", None),
+        )
+
+    def emit(self, record):
+        try:
+            self._queue.put_nowait(self._to_row(record))
+        except queue.Full:
+            # Never block pipeline work on logging; spill straight to the local file instead
+            self._write_fallback([self._to_row(record)], "log queue full")
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        batch = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                row = self._queue.get(timeout=timeout)
+                if row is None:
+                    self._queue.task_done()  # wake-up from close()
+                else:
+                    batch.append(row)
+            except queue.Empty:
+                pass
+
+            stopping = self._stop.is_set()
+            due = (len(batch) >= self.batch_size
+                   or time.monotonic() - last_flush >= self.flush_interval
+                   or self._flush_requested.is_set()
+                   or stopping)
+            if due:
+                # Drain whatever else is already queued so one flush covers it
+                while len(batch) < self.batch_size or stopping:
+                    try:
+                        row = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if row is None:
+                        self._queue.task_done()
+                    else:
+                        batch.append(row)
+                if batch:
+                    self._write_batch(batch)
+                    for _ in batch:
+                        self._queue.task_done()
+                    batch = []
+                last_flush = time.monotonic()
+                if self._queue.empty():
+                    self._flush_requested.clear()
+            if stopping and self._queue.empty() and not batch:
+                break
+
+    def _write_batch(self, rows):
+        try:
+            if self._conn is None:
+                self._conn = self._connect()
+            cursor = self._conn.cursor()
+            try:
+                cursor.executemany(INGESTION_LOG_INSERT_SQL, rows)
+                self._conn.commit()
+            finally:
+                cursor.close()
+        except Exception as e:
+            self._write_fallback(rows, str(e))
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+
+    def _write_fallback(self, rows, reason):
+        """Append rows the warehouse did not accept to the local fallback file."""
+        logging.getLogger(__name__).error(f"Failed to insert {len(rows)} log(s) into Snowflake ({reason}); "
+                                          f"writing them to {self.fallback_path}")
+        try:
+            os.makedirs(os.path.dirname(self.fallback_path), exist_ok=True)
+            with self.lock, open(self.fallback_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    keys = ("log_timestamp", "log_level", "step_name", "message", "records_loaded", "error_details")
+                    f.write(json.dumps(dict(zip(keys, row)), default=str) + "\n")
+        except OSError as e:
+            logging.getLogger(__name__).error(f"Could not write fallback log file: {e}")
+
+    def flush(self):
+        """Block until every record queued so far has been written (or spilled to the fallback file)."""
+        if self._worker.is_alive():
+            self._flush_requested.set()
+            self._queue.join()
+
+    def close(self):
+        self._stop.set()
+        # Wake the writer now instead of after its flush_interval wait
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._worker.join()
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+        super().close()
+
+
+_ingestion_log_handler = None
+
+
+def install_ingestion_log_handler(connect=None, **handler_kwargs):
+    """
+    Route log_to_snowflake through a buffered SnowflakeLogHandler.
+
+    Args:
+        connect: callable returning a dedicated connection for log writes (defaults to the PIPELINE_BACKEND factory)
+        handler_kwargs: batch_size, flush_interval, fallback_path, max_queue_size
+    """
+    global _ingestion_log_handler
+    if _ingestion_log_handler is not None:
+        return _ingestion_log_handler
+
+    handler = SnowflakeLogHandler(connect or get_backend_connect(), **handler_kwargs)
+    logger = logging.getLogger(INGESTION_LOGGER_NAME)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False  # callers already log locally; this logger only feeds ingestion_logs
+    logger.addHandler(handler)
+    _ingestion_log_handler = handler
+    return handler
+
+
+def shutdown_ingestion_log_handler():
+    """Flush and detach the buffered handler installed by install_ingestion_log_handler."""
+    global _ingestion_log_handler
+    handler, _ingestion_log_handler = _ingestion_log_handler, None
+    if handler is not None:
+        logging.getLogger(INGESTION_LOGGER_NAME).removeHandler(handler)
+        handler.close()
+
+
 def log_to_snowflake(cursor, log_level, step_name, message, records_loaded=None, error_details=None):
     """
     Insert a log record into the Snowflake ingestion_logs table.
 
+    When a buffered SnowflakeLogHandler is installed the record is queued and the
+    cursor is not used; otherwise the row is inserted synchronously on the cursor.
+
     Args:
         cursor: Snowflake cursor object
         log_level: str - e.g., 'INFO', 'ERROR'
@@ -37,6 +477,15 @@ def log_to_snowflake(cursor, log_level, step_name, message, records_loaded=None,
         records_loaded: int or None - number of records processed
         error_details: str or None - error info if any
     """
+    if _ingestion_log_handler is not None:
+        level = logging.getLevelName(log_level)
+        logging.getLogger(INGESTION_LOGGER_NAME).log(
+            level if isinstance(level, int) else logging.INFO,
+            message,
+            extra={"step_name": step_name, "records_loaded": records_loaded, "error_details": error_details},
+        )
+        return
+
     insert_sql = """
     INSERT INTO ingestion_logs (log_level, step_name, message, records_loaded, error_details)
     VALUES (%s, %s, %s, %s, %s)
@@ -0,0 +1,141 @@
+# src/watermarks.py
+import json
+import logging
+
+# Per-file load state for each ingested source (one row per staged file)
+FILE_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS ingestion_file_state (
+    source_name VARCHAR,
+    file_name VARCHAR,
+    file_size NUMBER,
+    file_md5 VARCHAR,
+    last_modified VARCHAR,
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Single high-water mark per source (e.g. max event timestamp processed)
+HIGH_WATERMARK_DDL = """
+CREATE TABLE IF NOT EXISTS pipeline_watermarks (
+    source_name VARCHAR PRIMARY KEY,
+    watermark_value VARCHAR,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def ensure_watermark_tables(cursor):
+    """Create the watermark state tables if they do not exist."""
+    cursor.execute(FILE_STATE_DDL)
+    cursor.execute(HIGH_WATERMARK_DDL)
+
+
+def stage_location(cursor, stage):
+    """Return the URL an external stage points at (e.g. s3://bucket/prefix/), or None for an internal stage."""
+    cursor.execute(f"DESC STAGE {stage}")
+    for parent_property, property_name, _, property_value, *_ in cursor.fetchall():
+        if parent_property == "STAGE_LOCATION" and property_name == "URL" and property_value:
+            urls = json.loads(property_value)  # e.g. '["s3://bucket/prefix/"]'
+            return urls[0] if urls else None
+    return None
+
+
+def relative_stage_path(name, location=None):
+    """
+    Turn a LIST / COPY file name into its path relative to the stage, the form FILES = (...) expects.
+
+    External stages list full URLs (s3://bucket/prefix/sub/file.json, under location); internal
+    stages list the stage name followed by the path (my_stage/sub/file.json).
+    """
+    if "://" in name:
+        if not location or not name.startswith(location):
+            raise ValueError(f"Staged file {name} is not under the stage location {location}")
+        return name[len(location):].lstrip("/")
+    return name.split("/", 1)[1] if "/" in name else name
+
+
+def list_stage_files(cursor, stage, pattern=None):
+    """
+    List files in a stage, including files in its subdirectories.
+
+    Returns:
+        list of dicts with file_name (path relative to the stage), stage_path (the name as LIST
+        and COPY report it), file_size, file_md5, last_modified
+    """
+    list_sql = f"LIST @{stage}/"
+    if pattern:
+        list_sql += f" PATTERN = '{pattern}'"
+    cursor.execute(list_sql)
+    listed = cursor.fetchall()
+
+    location = stage_location(cursor, stage) if any("://" in row[0] for row in listed) else None
+    files = []
+    for name, size, md5, last_modified in listed:
+        files.append({
+            "file_name": relative_stage_path(name, location),
+            "stage_path": name,
+            "file_size": size,
+            "file_md5": md5,
+            "last_modified": last_modified,
+        })
+    return files
+
+
+def get_file_state(cursor, source_name):
+    """Return {file_name: (file_size, file_md5)} for files already loaded for a source."""
+    cursor.execute(
+        "SELECT file_name, file_size, file_md5 FROM ingestion_file_state WHERE source_name = %s",
+        (source_name,),
+    )
+    return {file_name: (size, md5) for file_name, size, md5 in cursor.fetchall()}
+
+
+def find_new_or_changed_files(staged_files, file_state):
+    """Keep staged files that were never loaded or whose size/etag differs from the recorded state."""
+    pending = []
+    for staged in staged_files:
+        recorded = file_state.get(staged["file_name"])
+        if recorded is None or recorded != (staged["file_size"], staged["file_md5"]):
+            pending.append(staged)
+    return pending
+
+
+def record_loaded_files(cursor, source_name, files, replace_all=False):
+    """Upsert the load state for files just copied; replace_all clears the source's state first (full refresh)."""
+    if replace_all:
+        cursor.execute("DELETE FROM ingestion_file_state WHERE source_name = %s", (source_name,))
+    if not files:
+        return
+
+    if not replace_all:
+        for file in files:
+            cursor.execute(
+                "DELETE FROM ingestion_file_state WHERE source_name = %s AND file_name = %s",
+                (source_name, file["file_name"]),
+            )
+
+    insert_sql = """
+    INSERT INTO ingestion_file_state (source_name, file_name, file_size, file_md5, last_modified)
+    VALUES (%s, %s, %s, %s, %s)
+    """
+    cursor.executemany(insert_sql, [
+        (source_name, f["file_name"], f["file_size"], f["file_md5"], f["last_modified"])
+        for f in files
+    ])
+    logging.info(f"Recorded load state for {len(files)} file(s) of {source_name}.")
+
+
+def get_high_watermark(cursor, source_name):
+    """Return the stored high-water mark for a source, or None if it has never been set."""
+    cursor.execute("SELECT watermark_value FROM pipeline_watermarks WHERE source_name = %s", (source_name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def set_high_watermark(cursor, source_name, watermark_value):
+    """Store (or move) the high-water mark for a source."""
+    cursor.execute("DELETE FROM pipeline_watermarks WHERE source_name = %s", (source_name,))
+    cursor.execute(
+        "INSERT INTO pipeline_watermarks (source_name, watermark_value) VALUES (%s, %s)",
+        (source_name, None if watermark_value is None else str(watermark_value)),
+    )
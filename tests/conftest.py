@@ -0,0 +1,8 @@
+# tests/conftest.py
+import os
+import sys
+
+# Pipeline modules import each other as top-level modules (from utils import ...), as when run from src/
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,166 @@
+# tests/test_data_ingestion.py
+import json
+
+import pytest
+
+import data_ingestion
+from data_ingestion import _failed_results, _is_retryable, _parse_copy_results, load_json
+from local_backend import LOCAL_STAGES, connect_local
+from watermarks import get_file_state, list_stage_files, relative_stage_path
+
+
+def _event(event_id, user_id, **fields):
+    event = {"event_id": event_id, "timestamp": "2026-10-16T10:00:00Z", "user_id": user_id,
+             "event_type": "click", "page_url": "https://www.example.com/", "duration_ms": 100}
+    event.update(fields)
+    return event
+
+
+def _write_events(path, events):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(events))
+
+
+class _CopyResultCursor:
+    """Stands in for a cursor holding a Snowflake COPY INTO result set."""
+
+    def __init__(self, rows):
+        self.description = [(name,) for name in ("file", "status", "rows_loaded", "errors_seen", "first_error")]
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+def _raw_events(cursor):
+    cursor.execute("SELECT event_id, user_id, duration_ms FROM raw_clickstream ORDER BY event_id")
+    return cursor.fetchall()
+
+
+def _record_copies(monkeypatch, copy_group=None):
+    """Record the files each COPY is asked for (first attempts and retries); copy_group replaces the real one."""
+    calls = []
+    copy_group = copy_group or data_ingestion._copy_group
+
+    def recording_copy_group(cursor, copy_into_sql, files):
+        calls.append([f["file_name"] for f in files])
+        return copy_group(cursor, copy_into_sql, files)
+
+    monkeypatch.setattr(data_ingestion, "_copy_group", recording_copy_group)
+    monkeypatch.setattr(data_ingestion, "COPY_RETRY_BACKOFF_SECONDS", 0)
+    return calls
+
+
+@pytest.fixture
+def stage(tmp_path):
+    stage_dir = tmp_path / "clickstream"
+    stage_dir.mkdir()
+    stages = dict(LOCAL_STAGES, my_json_stage={"path": str(stage_dir), "extension": ".json"})
+    cursor = connect_local(str(tmp_path / "pipeline.db"), stages=stages).cursor()
+    return cursor, stage_dir
+
+
+def test_same_file_name_in_two_subdirectories_loads_both(stage):
+    cursor, stage_dir = stage
+    _write_events(stage_dir / "a" / "clicks.json", [_event("e1", 1)])
+    _write_events(stage_dir / "b" / "clicks.json", [_event("e2", 2)])
+    _write_events(stage_dir / "clicks.json", [_event("e3", 3)])
+
+    assert [f["file_name"] for f in list_stage_files(cursor, "my_json_stage")] == [
+        "clicks.json", "a/clicks.json", "b/clicks.json"]
+    load_json(cursor)
+
+    cursor.execute("SELECT event_id FROM raw_clickstream ORDER BY event_id")
+    assert [row[0] for row in cursor.fetchall()] == ["e1", "e2", "e3"]
+    assert sorted(get_file_state(cursor, "load_json")) == ["a/clicks.json", "b/clicks.json", "clicks.json"]
+
+
+def test_external_stage_urls_map_to_stage_relative_paths():
+    location = "s3://bucket/landing/"
+    assert relative_stage_path("s3://bucket/landing/a/clicks.json", location) == "a/clicks.json"
+    assert relative_stage_path("my_json_stage/a/clicks.json") == "a/clicks.json"
+    with pytest.raises(ValueError):
+        relative_stage_path("s3://other-bucket/a/clicks.json", location)
+
+    files = [{"file_name": name, "stage_path": location + name} for name in ("a/clicks.json", "b/clicks.json")]
+    cursor = _CopyResultCursor([
+        ("s3://bucket/landing/a/clicks.json", "LOADED", 5, 0, None),
+        ("s3://bucket/landing/b/clicks.json", "LOAD_FAILED", 0, 1, "bad row"),
+    ])
+    results = _parse_copy_results(cursor, files)
+
+    assert results["a/clicks.json"]["rows_loaded"] == 5
+    assert results["b/clicks.json"]["status"] == "LOAD_FAILED"
+
+
+def test_changed_file_is_the_only_one_copied_and_updates_its_rows(stage, monkeypatch):
+    cursor, stage_dir = stage
+    copied = _record_copies(monkeypatch)
+    _write_events(stage_dir / "clicks_1.json", [_event("e1", 1), _event("e2", 2)])
+    _write_events(stage_dir / "clicks_2.json", [_event("e3", 3)])
+    load_json(cursor)
+    assert copied == [["clicks_1.json", "clicks_2.json"]]
+
+    # The new version of clicks_1.json changes e2 and adds e4
+    _write_events(stage_dir / "clicks_1.json", [_event("e1", 1), _event("e2", 2, duration_ms=2500), _event("e4", 4)])
+    load_json(cursor)
+
+    assert copied[1:] == [["clicks_1.json"]]
+    assert _raw_events(cursor) == [("e1", 1, 100), ("e2", 2, 2500), ("e3", 3, 100), ("e4", 4, 100)]
+
+    # Nothing changed: no COPY at all
+    load_json(cursor)
+    assert len(copied) == 2
+
+
+def test_skipped_file_is_reported_and_not_recorded(stage):
+    cursor, stage_dir = stage
+    _write_events(stage_dir / "good.json", [_event("e1", 1)])
+    (stage_dir / "bad.json").write_text('[{"event_id": "e2", ')
+
+    load_json(cursor)
+
+    assert _raw_events(cursor) == [("e1", 1, 100)]
+    assert list(get_file_state(cursor, "load_json")) == ["good.json"]
+    cursor.execute("SELECT message FROM ingestion_logs WHERE log_level = 'ERROR' AND step_name = 'load_json'")
+    errors = [row[0] for row in cursor.fetchall()]
+    assert len(errors) == 1 and errors[0].startswith("File bad.json failed to load into load_json")
+
+    # Fixing the file gets it loaded by the next incremental run
+    _write_events(stage_dir / "bad.json", [_event("e2", 2)])
+    load_json(cursor)
+    assert sorted(get_file_state(cursor, "load_json")) == ["bad.json", "good.json"]
+
+
+def test_transient_failures_are_retried_and_data_errors_are_not(stage, monkeypatch):
+    cursor, stage_dir = stage
+    _write_events(stage_dir / "clicks_1.json", [_event("e1", 1)])
+    _write_events(stage_dir / "clicks_2.json", [_event("e2", 2)])
+    errors = {"clicks_1.json": ConnectionError("connection reset"), "clicks_2.json": ValueError("bad data")}
+    copy_group = data_ingestion._copy_group
+
+    def failing_first_attempt(cursor, copy_into_sql, files):
+        # The first COPY fails every file; retries go through to the real COPY
+        if len(copied) == 1:
+            results = {}
+            for f in files:
+                results.update(_failed_results([f], errors[f["file_name"]]))
+            return results
+        return copy_group(cursor, copy_into_sql, files)
+
+    copied = _record_copies(monkeypatch, failing_first_attempt)
+    load_json(cursor)
+
+    assert copied == [["clicks_1.json", "clicks_2.json"], ["clicks_1.json"]]
+    assert _raw_events(cursor) == [("e1", 1, 100)]
+    assert list(get_file_state(cursor, "load_json")) == ["clicks_1.json"]
+
+
+def test_only_transient_errors_are_retryable():
+    class ProgrammingError(Exception):
+        """Named like the DB-API class the Snowflake connector raises for bad SQL."""
+
+    assert _is_retryable(ConnectionError("connection reset"))
+    assert _is_retryable(TimeoutError("pool checkout timed out"))
+    assert not _is_retryable(ProgrammingError("invalid identifier"))
+    assert not _is_retryable(ValueError("bad data"))
@@ -0,0 +1,32 @@
+# tests/test_dq_checks.py
+from dq_checks import DQ_CHECKS, run_dq_checks
+from local_backend import connect_local
+
+
+def _raw_tables(cursor, customers, events):
+    cursor.execute("CREATE TABLE raw_customer_demographics (customer_id INTEGER, first_name VARCHAR, last_name VARCHAR, "
+                   "email VARCHAR, region VARCHAR, signup_date DATE)")
+    cursor.execute("CREATE TABLE raw_clickstream (event_id VARCHAR, timestamp TIMESTAMP_LTZ, user_id INTEGER, "
+                   "event_type VARCHAR, page_url VARCHAR, duration_ms INTEGER)")
+    cursor.executemany("INSERT INTO raw_customer_demographics VALUES (%s, %s, %s, %s, %s, %s)", customers)
+    cursor.executemany("INSERT INTO raw_clickstream VALUES (%s, %s, %s, %s, %s, %s)", events)
+
+
+def test_referential_check_uses_the_customers_loaded_in_this_run():
+    # No dim_customer yet: the check must not depend on the previous run's dimension
+    cursor = connect_local(":memory:").cursor()
+    _raw_tables(
+        cursor,
+        customers=[(1, "Ann", "Lee", "ann@example.com", "East", "2024/01/01"),
+                   (2, "Bo", "Kim", "bo@example.com", "West", "2024/02/01")],
+        events=[("e1", "2024-03-01T10:00:00Z", 1, "click", "https://example.com/a", 10),
+                ("e2", "2024-03-01T11:00:00Z", 2, "view", "https://example.com/b", 20),
+                ("e3", "2024-03-01T12:00:00Z", 3, "view", "https://example.com/c", 30)],
+    )
+
+    results = {name: (status, value) for name, status, value, _ in run_dq_checks(cursor)}
+
+    assert results["Clickstream user_id in raw_customer_demographics check"] == ("FAILED", 1)
+    assert results["Unique event_id check"] == ("PASSED", 0)
+    assert results["Email format check"] == ("PASSED", 0)
+    assert len(results) == sum(len(checks) for checks in DQ_CHECKS.values())
@@ -0,0 +1,89 @@
+# tests/test_feature_backfill.py
+import pandas as pd
+import pytest
+
+import query_cache
+from feature_backfill import (
+    _chunk_activity,
+    _date_range,
+    _write_chunk,
+    compute_backfill_chunk,
+    load_customers,
+    load_daily_activity,
+)
+from feature_engineering import engineer_features
+from feature_registry import ACTIVITY_LOOKBACK_DAYS
+from local_backend import connect_local
+
+EVENTS = [
+    (1, "2026-06-01T08:00:00Z"),
+    (1, "2026-09-30T23:59:59Z"),
+    (2, "2026-10-02T00:00:00Z"),   # midnight: visible from 2026-10-03, not on 2026-10-02
+    (2, "2026-10-02T17:30:00Z"),
+    (3, "2026-07-01T12:00:00Z"),   # drops out of the 90-day window during the range
+    (4, "2026-10-03T06:15:00Z"),   # a click before the signup date
+    (9, "2026-10-01T10:00:00Z"),   # not a customer
+]
+CUSTOMERS = [(1, "2025-01-15"), (2, "2026-09-30"), (3, "2026-03-01"), (4, "2026-10-04"), (5, None)]
+FEATURE_MAP = {"days_since_signup": 1, "days_since_last_activity": 2}
+
+
+@pytest.fixture
+def cursor(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_cache, "QUERY_CACHE_ENABLED", False)
+    cursor = connect_local(str(tmp_path / "pipeline.db")).cursor()
+    cursor.execute("CREATE TABLE fact_click_events (event_id VARCHAR, user_id NUMBER, event_time TIMESTAMP_LTZ)")
+    cursor.executemany("INSERT INTO fact_click_events VALUES (%s, %s, %s)",
+                       [(f"e{i}", user_id, event_time) for i, (user_id, event_time) in enumerate(EVENTS)])
+    cursor.execute("CREATE TABLE dim_customer (customer_id VARCHAR, signup_date DATE)")
+    cursor.executemany("INSERT INTO dim_customer VALUES (%s, %s)", CUSTOMERS)
+    return cursor
+
+
+def _as_of(feature_date):
+    """What the daily run on feature_date would have read: its 90-day events and the customers signed up by then."""
+    events = pd.DataFrame(EVENTS, columns=["user_id", "event_time"])
+    event_time = pd.to_datetime(events["event_time"], utc=True).dt.tz_localize(None)
+    window_start = feature_date - pd.Timedelta(days=ACTIVITY_LOOKBACK_DAYS)
+    events = events[(event_time >= window_start) & (event_time < feature_date)]
+    customers = pd.DataFrame(CUSTOMERS, columns=["user_id", "signup_date"])
+    signup = pd.to_datetime(customers["signup_date"])
+    customers = customers[signup.isna() | (signup <= feature_date)]
+    return engineer_features(events, customers, as_of=feature_date)
+
+
+def _sorted(frame):
+    return frame.sort_values(["feature_name", "user_id"]).reset_index(drop=True)
+
+
+def test_backfill_chunk_matches_the_daily_run_on_each_date(cursor):
+    feature_dates = _date_range("2026-09-28", "2026-10-05")
+    daily_activity = load_daily_activity(cursor, feature_dates[0], feature_dates[-1])
+    customer_ids, signup_ns, signup_missing = load_customers(cursor)
+
+    chunk = compute_backfill_chunk(feature_dates, _chunk_activity(daily_activity, feature_dates),
+                                   customer_ids, signup_ns, signup_missing)
+
+    for feature_date in feature_dates:
+        backfilled = chunk[chunk["feature_date"] == feature_date]
+        pd.testing.assert_frame_equal(_sorted(backfilled), _sorted(_as_of(feature_date)), check_dtype=False)
+
+
+def test_rerunning_a_chunk_replaces_its_date_partitions(cursor):
+    feature_dates = _date_range("2026-10-01", "2026-10-02")
+    daily_activity = load_daily_activity(cursor, feature_dates[0], feature_dates[-1])
+    chunk = compute_backfill_chunk(feature_dates, daily_activity, *load_customers(cursor))
+    assert _write_chunk(cursor, chunk, FEATURE_MAP) == len(chunk)
+
+    # A rerun of the second date only, with different values
+    rerun = chunk[chunk["feature_date"] == feature_dates[1]].copy()
+    rerun["feature_value"] = 1.0
+    _write_chunk(cursor, rerun, FEATURE_MAP)
+
+    cursor.execute("SELECT feature_date, COUNT(*), SUM(feature_value) FROM feature_engineered_iceberg "
+                   "GROUP BY feature_date ORDER BY feature_date")
+    first_date = chunk[chunk["feature_date"] == feature_dates[0]]
+    assert cursor.fetchall() == [
+        ("2026-10-01", len(first_date), first_date["feature_value"].sum()),
+        ("2026-10-02", len(rerun), float(len(rerun))),
+    ]
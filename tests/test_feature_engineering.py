@@ -0,0 +1,106 @@
+# tests/test_feature_engineering.py
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import query_cache
+from data_ingestion import load_csv, load_json
+from feature_engineering import _utc_timestamp, engineer_features, load_raw_data
+from feature_registry import MISSING_FEATURE_VALUE, compute_features_in_warehouse
+from local_backend import LOCAL_STAGES, REPO_ROOT, connect_local
+from transformations import load_dim_customer, load_fact_click_events
+
+MOCK_CLICKSTREAM = os.path.join(REPO_ROOT, "data", "raw", "mock_clickstream_data.json")
+
+
+def _mock_events():
+    """The bundled clickstream, shifted by whole days so its newest event was yesterday (inside the 90-day window)."""
+    with open(MOCK_CLICKSTREAM) as f:
+        events = json.load(f)
+    newest = max(pd.Timestamp(event["timestamp"]) for event in events)
+    shift = (pd.Timestamp.now(tz="UTC").normalize() - pd.Timedelta(days=1)) - newest.normalize()
+    for event in events:
+        event["timestamp"] = (pd.Timestamp(event["timestamp"]) + shift).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return events
+
+
+def _load_batch(cursor, stage_dir, name, events):
+    with open(os.path.join(stage_dir, name), "w") as f:
+        json.dump(events, f)
+    load_json(cursor)
+    load_fact_click_events(cursor, incremental=False)
+
+
+def _sorted(frame):
+    return frame.sort_values("user_id").reset_index(drop=True)
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_cache, "QUERY_CACHE_ENABLED", False)
+    stage_dir = tmp_path / "clickstream"
+    stage_dir.mkdir()
+    stages = dict(LOCAL_STAGES, my_json_stage={"path": str(stage_dir), "extension": ".json"})
+    cursor = connect_local(str(tmp_path / "pipeline.db"), stages=stages).cursor()
+    load_csv(cursor)
+    load_dim_customer(cursor)
+    return cursor, str(stage_dir)
+
+
+def test_incremental_last_activity_matches_full_recompute(pipeline):
+    cursor, stage_dir = pipeline
+    events = _mock_events()
+    # Two loads; the second also carries late events older than ones already folded into the state
+    _load_batch(cursor, stage_dir, "clicks_1.json", events[:60])
+    incremental_events, _ = load_raw_data(cursor, incremental=True)
+    full_events, _ = load_raw_data(cursor, incremental=False)
+    pd.testing.assert_frame_equal(_sorted(incremental_events), _sorted(full_events))
+
+    _load_batch(cursor, stage_dir, "clicks_2.json", events[60:])
+    incremental_events, incremental_customers = load_raw_data(cursor, incremental=True)
+    full_events, full_customers = load_raw_data(cursor, incremental=False)
+
+    assert 0 < len(full_events) < len({event["user_id"] for event in events})
+    pd.testing.assert_frame_equal(_sorted(incremental_events), _sorted(full_events))
+    pd.testing.assert_frame_equal(incremental_customers, full_customers)
+
+    # The state itself (not just its 90-day slice) equals a recompute over every event
+    cursor.execute("SELECT user_id, last_event_time FROM user_last_activity ORDER BY user_id")
+    state = cursor.fetchall()
+    cursor.execute("SELECT user_id, MAX(event_time) FROM fact_click_events GROUP BY user_id ORDER BY user_id")
+    assert state == cursor.fetchall()
+
+
+def test_created_at_marks_compare_as_timestamps():
+    # As text the offset form sorts first, although it is the later instant
+    assert _utc_timestamp("2026-10-17 14:14:34-07:00") > _utc_timestamp("2026-10-17 21:14:33.900")
+    assert _utc_timestamp("2026-10-17 14:14:33-07:00") == _utc_timestamp("2026-10-17T21:14:33Z")
+
+
+def test_sql_engine_matches_pandas_engine_on_utc_today(pipeline):
+    cursor, stage_dir = pipeline
+    # The mock clicks and customers share no ids; point the clicks at customers so both features have values
+    cursor.execute("SELECT customer_id FROM dim_customer ORDER BY customer_id")
+    customer_ids = [int(row[0]) for row in cursor.fetchall()]
+    events = _mock_events()
+    for i, event in enumerate(events):
+        event["user_id"] = customer_ids[i % len(customer_ids)]
+    _load_batch(cursor, stage_dir, "clicks.json", events)
+    events_df, customers_df = load_raw_data(cursor)  # also refreshes the state the SQL engine reads
+    compute_features_in_warehouse(cursor)
+
+    cursor.execute("SELECT customer_id, feature_name, feature_value, feature_date FROM feature_engineered_iceberg")
+    written = pd.DataFrame(cursor.fetchall(), columns=["user_id", "feature_name", "feature_value", "feature_date"])
+    assert set(written["feature_date"]) == {pd.Timestamp.now(tz="UTC").strftime("%Y-%m-%d")}
+
+    expected = engineer_features(events_df, customers_df)
+    written["user_id"] = written["user_id"].astype("int64")
+    assert (written["feature_value"] != MISSING_FEATURE_VALUE).sum() > len(customer_ids)
+    key = ["user_id", "feature_name"]
+    pd.testing.assert_frame_equal(
+        written.sort_values(key).reset_index(drop=True)[key + ["feature_value"]],
+        expected.sort_values(key).reset_index(drop=True)[key + ["feature_value"]],
+        check_dtype=False,
+    )
@@ -0,0 +1,29 @@
+# tests/test_feature_frame.py
+import numpy as np
+import pandas as pd
+
+from feature_frame import FeatureFrame
+
+
+def test_more_than_127_features_keep_their_names():
+    user_ids = np.array([10, 20, 30])
+    features = {f"feature_{i}": np.full(len(user_ids), i, dtype="float64") for i in range(200)}
+    frame = FeatureFrame.from_features(user_ids, features, "2026-10-17")
+
+    assert frame.feature_name.codes.dtype == np.int16
+    assert frame.feature_name.codes.min() == 0
+
+    features_long = frame.to_long()
+    assert (features_long["feature_name"].astype(str) == [f"feature_{int(v)}" for v in features_long["feature_value"]]).all()
+
+    table = frame.to_arrow()
+    names = table.column("feature_name").to_pylist()
+    assert names[-1] == "feature_199"
+    assert names == features_long["feature_name"].astype(str).tolist()
+    assert len(FeatureFrame.from_long(features_long)) == len(frame) == 600
+
+
+def test_small_frames_keep_int8_codes():
+    frame = FeatureFrame.from_features(np.array([1, 2]), {"a": [1.0, 2.0], "b": [3.0, 4.0]}, pd.Timestamp("2026-10-17"))
+    assert frame.feature_name.codes.dtype == np.int8
+    assert frame.to_long()["feature_name"].astype(str).tolist() == ["a", "a", "b", "b"]
@@ -0,0 +1,51 @@
+# tests/test_instrumentation.py
+import tracemalloc
+
+import instrumentation
+from instrumentation import instrument_step
+from local_backend import connect_local
+
+
+def test_rows_metric_counts_only_dml(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_run_metrics", [])
+    cursor = connect_local(":memory:").cursor()
+    cursor.execute("CREATE TABLE t (id INTEGER)")
+
+    with instrument_step("dml_vs_select", cursor) as metrics:
+        metrics["cursor"].executemany("INSERT INTO t VALUES (%s)", [(1,), (2,), (3,)])
+        metrics["cursor"].execute("UPDATE t SET id = id + 10 WHERE id > 1")
+        metrics["cursor"].execute("SELECT id FROM t")
+        metrics["cursor"].fetchall()
+
+    assert metrics["rows"] == 5
+    assert len(metrics["queries"]) == 3
+
+
+def test_memory_tracking_is_opt_in(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_run_metrics", [])
+    monkeypatch.setattr(instrumentation, "TRACE_MEMORY", False)
+    with instrument_step("untraced") as metrics:
+        assert not tracemalloc.is_tracing()
+    assert metrics["peak_memory_bytes"] is None
+    # The process peak RSS is recorded either way
+    assert metrics["peak_rss_bytes"] > 0
+
+    monkeypatch.setattr(instrumentation, "TRACE_MEMORY", True)
+    with instrument_step("traced") as metrics:
+        assert tracemalloc.is_tracing()
+    assert metrics["peak_memory_bytes"] is not None
+    assert not tracemalloc.is_tracing()
+
+
+def test_peak_rss_reaches_the_prometheus_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation, "_run_metrics", [])
+    monkeypatch.setattr(instrumentation, "TRACE_MEMORY", False)
+    with instrument_step("untraced"):
+        pass
+
+    prom_path = tmp_path / "pipeline.prom"
+    instrumentation.write_metrics_files(json_path=None, prom_path=str(prom_path))
+
+    text = prom_path.read_text()
+    assert 'pipeline_step_peak_rss_bytes{step="untraced"}' in text
+    assert 'pipeline_step_peak_memory_bytes{step="untraced"}' not in text
@@ -0,0 +1,122 @@
+# tests/test_json_prevalidation.py
+import json
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+from json_prevalidation import InvalidJSONFileError, iter_json_records, prevalidate_dir, prevalidate_file
+
+
+def _event(i, **fields):
+    event = {"event_id": f"e{i}", "timestamp": f"2026-10-0{i % 9 + 1}T10:00:00Z", "user_id": 100 + i,
+             "event_type": "click", "page_url": f"https://example.com/{i}", "duration_ms": 10 * i}
+    event.update(fields)
+    return event
+
+
+def _write_ndjson(path, events):
+    with open(path, "w") as f:
+        f.writelines(json.dumps(event) + "\n" for event in events)
+
+
+def _rejects(out_dir, name):
+    with open(os.path.join(out_dir, "rejects", f"{name}.rejects.jsonl")) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_pretty_printed_array_is_parsed_across_block_boundaries(tmp_path):
+    events = [_event(i) for i in range(5)]
+    path = tmp_path / "clicks.json"
+    path.write_text(json.dumps(events, indent=2))
+
+    records = list(iter_json_records(str(path), block_bytes=7))
+
+    assert records == [(event, None) for event in events]
+
+
+def test_malformed_array_rejects_the_whole_file(tmp_path):
+    out_dir = str(tmp_path / "out")
+    path = tmp_path / "clicks.json"
+    path.write_text(json.dumps([_event(1), _event(2)], indent=2))
+    assert prevalidate_file(str(path), out_dir=out_dir)["clean"] == 2
+
+    # A broken element inside a pretty-printed array: line-by-line resync would emit fragments
+    path.write_text(json.dumps([_event(1), _event(2), _event(3)], indent=2).replace('"e2",', '"e2"'))
+    with pytest.raises(InvalidJSONFileError):
+        list(iter_json_records(str(path)))
+
+    stats = prevalidate_file(str(path), out_dir=out_dir, batch_size=1)
+
+    assert (stats["clean"], stats["chunks"]) == (0, [])
+    assert [reject["reason"] for reject in _rejects(out_dir, "clicks")] == ["invalid_json_file"]
+    assert os.listdir(os.path.join(out_dir, "clean")) == []
+
+
+def test_ndjson_rejects_only_the_bad_line(tmp_path):
+    path = tmp_path / "clicks.json"
+    path.write_text(json.dumps(_event(1)) + "\n{not json\n" + json.dumps(_event(2)) + "\n")
+
+    stats = prevalidate_file(str(path), out_dir=str(tmp_path / "out"))
+
+    assert (stats["records"], stats["clean"], stats["rejected"]) == (3, 2, 1)
+    assert _rejects(str(tmp_path / "out"), "clicks") == [
+        {"source": str(path), "reason": "invalid_json", "record": "{not json"}]
+
+
+def test_unchanged_sources_are_skipped_and_unchanged_chunks_kept(tmp_path):
+    out_dir = str(tmp_path / "out")
+    path = str(tmp_path / "clicks.json")
+    _write_ndjson(path, [_event(i) for i in range(4)])
+    # A source whose name extends this one's must keep its own chunks
+    _write_ndjson(str(tmp_path / "clicks_2.json"), [_event(9)])
+    other = prevalidate_file(str(tmp_path / "clicks_2.json"), out_dir=out_dir, batch_size=2)
+
+    first = prevalidate_file(path, out_dir=out_dir, batch_size=2)
+    mtimes = {chunk: os.stat(chunk).st_mtime_ns for chunk in first["chunks"]}
+    assert len(mtimes) == 2 and not first["skipped"]
+
+    again = prevalidate_file(path, out_dir=out_dir, batch_size=2)
+    assert again["skipped"] and again["chunks"] == first["chunks"]
+    assert {chunk: os.stat(chunk).st_mtime_ns for chunk in again["chunks"]} == mtimes
+
+    # Appending a record rewrites the source: the first chunk's rows are unchanged, so its file is too
+    _write_ndjson(path, [_event(i) for i in range(5)])
+    changed = prevalidate_file(path, out_dir=out_dir, batch_size=2)
+    assert not changed["skipped"] and len(changed["chunks"]) == 3
+    assert changed["chunks"][:2] == first["chunks"]
+    assert {chunk: os.stat(chunk).st_mtime_ns for chunk in changed["chunks"][:2]} == mtimes
+
+    # Shrinking the source drops its surplus chunks, and only its own
+    _write_ndjson(path, [_event(0)])
+    shrunk = prevalidate_file(path, out_dir=out_dir, batch_size=2)
+    assert sorted(os.listdir(os.path.join(out_dir, "clean"))) == sorted(
+        os.path.basename(chunk) for chunk in shrunk["chunks"] + other["chunks"])
+
+
+def test_null_user_id_is_kept_like_the_raw_load(tmp_path):
+    path = str(tmp_path / "clicks.json")
+    _write_ndjson(path, [_event(1, user_id=None), _event(2, user_id="abc"), _event(3)])
+
+    stats = prevalidate_file(path, out_dir=str(tmp_path / "out"))
+
+    assert (stats["clean"], stats["rejected"]) == (2, 1)
+    assert [reject["reason"] for reject in _rejects(str(tmp_path / "out"), "clicks")] == ["invalid_user_id"]
+    assert pq.read_table(stats["chunks"][0]).column("user_id").to_pylist() == [None, 103]
+
+
+def test_same_file_name_in_two_subdirectories_keeps_both_outputs(tmp_path):
+    input_dir, out_dir = tmp_path / "raw", str(tmp_path / "out")
+    for folder, events in (("a", [_event(1), _event(2)]), ("b", [_event(3)])):
+        (input_dir / folder).mkdir(parents=True)
+        _write_ndjson(str(input_dir / folder / "clicks.json"), events)
+
+    first = prevalidate_dir(str(input_dir), out_dir=out_dir)
+    again = prevalidate_dir(str(input_dir), out_dir=out_dir)
+
+    assert [stats["clean"] for stats in first.values()] == [2, 1]
+    assert all(stats["skipped"] for stats in again.values())
+    chunks = [chunk for stats in again.values() for chunk in stats["chunks"]]
+    assert [os.path.relpath(chunk, out_dir) for chunk in chunks] == [
+        os.path.join("clean", "a", "clicks_00000.parquet"), os.path.join("clean", "b", "clicks_00000.parquet")]
+    assert [pq.read_table(chunk).column("event_id").to_pylist() for chunk in chunks] == [["e1", "e2"], ["e3"]]
@@ -0,0 +1,44 @@
+# tests/test_local_backend.py
+import os
+
+from local_backend import connect_local, ensure_local_db, translate_sql
+
+
+def test_working_copy_is_seeded_once_and_leaves_the_snapshot_alone(tmp_path):
+    seed_path = str(tmp_path / "snapshot.db")
+    conn = connect_local(seed_path)
+    conn.cursor().execute("CREATE TABLE seeded (id INTEGER)")
+    conn.commit()
+    conn.close()
+    snapshot = open(seed_path, "rb").read()
+
+    db_path = str(tmp_path / "local" / "pipeline.db")
+    assert ensure_local_db(db_path, seed_path) == db_path
+    conn = connect_local(db_path)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO seeded VALUES (1)")
+    conn.commit()
+
+    # An existing working copy is never re-seeded
+    ensure_local_db(db_path, seed_path)
+    cursor.execute("SELECT COUNT(*) FROM seeded")
+    assert cursor.fetchone()[0] == 1
+    conn.close()
+
+    assert open(seed_path, "rb").read() == snapshot
+    assert os.listdir(tmp_path / "local") == ["pipeline.db"]
+
+
+def test_three_part_names_are_rewritten_outside_string_literals_only():
+    sql = translate_sql("SELECT * FROM MARKETING_DATE.STAGE_DATE.RAW_CLICKSTREAM "
+                        "WHERE page_url LIKE '%www.example.com%' AND note = 'see a.b.c'")
+
+    assert sql == "SELECT * FROM RAW_CLICKSTREAM WHERE page_url LIKE '%www.example.com%' AND note = 'see a.b.c'"
+
+
+def test_regexp_like_matches_the_whole_value(tmp_path):
+    cursor = connect_local(str(tmp_path / "pipeline.db")).cursor()
+    cursor.execute("SELECT REGEXP_LIKE('user@example.com', '[a-z]+'), REGEXP_LIKE('user', '[a-z]+'), "
+                   "REGEXP_LIKE('https://example.com', 'https?://.+')")
+
+    assert cursor.fetchone() == (0, 1, 1)
@@ -0,0 +1,47 @@
+# tests/test_online_store.py
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from online_store import OnlineFeatureStore, publish_features
+
+
+def _features(value):
+    return pd.DataFrame({
+        "user_id": [1, 1, 2, 2],
+        "feature_name": ["days_since_signup", "days_since_last_activity"] * 2,
+        "feature_value": [float(value)] * 4,
+        "feature_date": pd.Timestamp("2026-10-17"),
+    })
+
+
+def test_concurrent_publishes_each_use_their_own_temp_file(tmp_path):
+    path = str(tmp_path / "online_features.db")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(lambda value: publish_features(_features(value), path), range(8))) == [2] * 8
+
+    assert os.listdir(tmp_path) == ["online_features.db"]
+    store = OnlineFeatureStore(path)
+    features = store.get_features([1, 2, 3])
+    assert features[3] is None
+    assert features[1] == features[2]
+    assert features[1]["days_since_signup"] in range(8)
+    store.close()
+
+
+def test_failed_publish_keeps_the_previous_store(tmp_path):
+    path = str(tmp_path / "online_features.db")
+    publish_features(_features(1), path)
+
+    broken = _features(2)
+    broken["feature_name"] = ['bad"name', "other"] * 2  # unquotable column name: CREATE TABLE fails
+    with pytest.raises(sqlite3.OperationalError):
+        publish_features(broken, path)
+
+    assert os.listdir(tmp_path) == ["online_features.db"]
+    store = OnlineFeatureStore(path)
+    assert store.get_features([1])[1]["days_since_signup"] == 1.0
+    store.close()
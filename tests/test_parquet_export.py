@@ -0,0 +1,68 @@
+# tests/test_parquet_export.py
+import pandas as pd
+import pyarrow.dataset as ds
+
+from local_backend import connect_local
+from parquet_export import export_table, exported_partitions, read_export
+from scheduler import DryRunCursor
+
+EVENTS = [
+    ("e1", 1, "click", "https://example.com/a", 10, "2026-10-01T08:00:00Z", "2026-10-01 09:00:00"),
+    ("e2", 2, "view", "https://example.com/b", 20, "2026-10-01T23:59:59Z", "2026-10-02 00:10:00"),
+    ("e3", 1, "view", "https://example.com/c", 30, "2026-10-03T12:00:00Z", "2026-10-03 12:05:00"),
+    ("e4", 3, "click", "https://example.com/d", 40, "2026-10-05T00:00:00Z", "2026-10-05 00:01:00"),
+]
+
+
+def _source(tmp_path):
+    cursor = connect_local(str(tmp_path / "pipeline.db")).cursor()
+    cursor.execute("CREATE TABLE fact_click_events (event_id VARCHAR, user_id NUMBER, event_type VARCHAR, "
+                   "page_url VARCHAR, duration_ms NUMBER, event_time TIMESTAMP_LTZ, created_at TIMESTAMP)")
+    cursor.executemany("INSERT INTO fact_click_events VALUES (%s, %s, %s, %s, %s, %s, %s)", EVENTS)
+    return cursor
+
+
+def test_export_round_trips_through_read_export(tmp_path):
+    cursor = _source(tmp_path)
+    root = str(tmp_path / "exports")
+
+    result = export_table(cursor, "fact_click_events", root=root, full=True)
+    assert result["rows"] == len(EVENTS)
+    assert result["partitions"] == [pd.Timestamp(day) for day in ("2026-10-01", "2026-10-03", "2026-10-05")]
+
+    exported = read_export("fact_click_events", root=root).sort_values("event_id").reset_index(drop=True)
+    assert exported["event_id"].tolist() == [event[0] for event in EVENTS]
+    assert exported["user_id"].tolist() == [event[1] for event in EVENTS]
+    assert exported["duration_ms"].tolist() == [event[4] for event in EVENTS]
+    assert exported["event_time"].tolist() == [pd.Timestamp(event[5]) for event in EVENTS]
+    assert [str(day) for day in exported["event_date"]] == ["2026-10-01", "2026-10-01", "2026-10-03", "2026-10-05"]
+
+    # Partition and row-filter pruning
+    window = read_export("fact_click_events", start_date="2026-10-02", end_date="2026-10-04", root=root)
+    assert window["event_id"].tolist() == ["e3"]
+    user_1 = read_export("fact_click_events", columns=["event_id"], row_filter=ds.field("user_id") == 1, root=root)
+    assert sorted(user_1["event_id"]) == ["e1", "e3"]
+
+
+def test_full_export_removes_days_no_longer_in_the_source(tmp_path):
+    cursor = _source(tmp_path)
+    root = str(tmp_path / "exports")
+    export_table(cursor, "fact_click_events", root=root, full=True)
+
+    cursor.execute("DELETE FROM fact_click_events WHERE event_id = 'e3'")
+    result = export_table(cursor, "fact_click_events", root=root, full=True)
+
+    assert result["removed"] == [pd.Timestamp("2026-10-03")]
+    assert exported_partitions("fact_click_events", root) == [pd.Timestamp("2026-10-01"), pd.Timestamp("2026-10-05")]
+    assert sorted(read_export("fact_click_events", root=root)["event_id"]) == ["e1", "e2", "e4"]
+
+
+def test_dry_run_export_never_removes_partitions(tmp_path):
+    cursor = _source(tmp_path)
+    root = str(tmp_path / "exports")
+    export_table(cursor, "fact_click_events", root=root, full=True)
+
+    result = export_table(DryRunCursor("export_parquet"), "fact_click_events", root=root, full=True)
+
+    assert result == {"partitions": [], "removed": [], "rows": 0}
+    assert len(exported_partitions("fact_click_events", root)) == 3
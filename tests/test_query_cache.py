@@ -0,0 +1,49 @@
+# tests/test_query_cache.py
+import os
+
+from local_backend import connect_local
+from query_cache import backend_identity, cached_query
+from transformations import DIM_CUSTOMER_WATERMARK
+from watermarks import ensure_watermark_tables, set_high_watermark
+
+CUSTOMERS_SQL = "SELECT customer_id, region FROM dim_customer ORDER BY customer_id"
+
+
+def _database(path, region, watermark="2026-10-17T00:00:00Z"):
+    conn = connect_local(str(path))
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE dim_customer (customer_id VARCHAR, region VARCHAR)")
+    cursor.execute("INSERT INTO dim_customer VALUES ('1', %s)", (region,))
+    ensure_watermark_tables(cursor)
+    if watermark is not None:
+        set_high_watermark(cursor, DIM_CUSTOMER_WATERMARK, watermark)
+    conn.commit()
+    return cursor
+
+
+def test_databases_with_equal_versions_do_not_share_entries(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    east = _database(tmp_path / "east.db", "East")
+    west = _database(tmp_path / "west.db", "West")
+    assert backend_identity(east) != backend_identity(west)
+
+    assert cached_query(east, CUSTOMERS_SQL, ("dim_customer",), cache_dir=cache_dir, enabled=True)["region"].tolist() == ["East"]
+    assert cached_query(west, CUSTOMERS_SQL, ("dim_customer",), cache_dir=cache_dir, enabled=True)["region"].tolist() == ["West"]
+    assert len(os.listdir(cache_dir)) == 2
+
+    # Unchanged versions serve the entry from disk (only the loaders move them, not this edit)
+    east.execute("DELETE FROM dim_customer")
+    east.execute("INSERT INTO dim_customer VALUES ('2', 'North')")
+    assert cached_query(east, CUSTOMERS_SQL, ("dim_customer",), cache_dir=cache_dir, enabled=True)["region"].tolist() == ["East"]
+
+
+def test_null_version_and_unidentified_databases_are_not_cached(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    unversioned = _database(tmp_path / "pipeline.db", "East", watermark=None)
+    assert cached_query(unversioned, CUSTOMERS_SQL, ("dim_customer",), cache_dir=cache_dir, enabled=True)["region"].tolist() == ["East"]
+
+    in_memory = _database(":memory:", "West")
+    assert backend_identity(in_memory) is None
+    assert cached_query(in_memory, CUSTOMERS_SQL, ("dim_customer",), cache_dir=cache_dir, enabled=True)["region"].tolist() == ["West"]
+
+    assert not os.path.exists(cache_dir)
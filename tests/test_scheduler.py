@@ -0,0 +1,108 @@
+# tests/test_scheduler.py
+import threading
+
+import pytest
+
+from scheduler import DryRunCursor, PipelineTask, run_pipeline_dag
+
+
+def _recording_task(order, lock, name, fail=False):
+    def run(cursor):
+        cursor.execute(f"SELECT '{name}' FROM dual")
+        with lock:
+            order.append(name)
+        if fail:
+            raise RuntimeError(f"{name} failed")
+    return run
+
+
+def test_tasks_run_after_their_dependencies():
+    order, lock = [], threading.Lock()
+    tasks = [
+        PipelineTask("load_dim", _recording_task(order, lock, "load_dim"), depends_on=("dq",)),
+        PipelineTask("dq", _recording_task(order, lock, "dq"), depends_on=("load_csv", "load_json")),
+        PipelineTask("load_csv", _recording_task(order, lock, "load_csv")),
+        PipelineTask("load_json", _recording_task(order, lock, "load_json")),
+    ]
+    results = run_pipeline_dag(tasks, dry_run=True, max_workers=2)
+
+    assert {result["status"] for result in results.values()} == {"success"}
+    assert order.index("dq") > max(order.index("load_csv"), order.index("load_json"))
+    assert order.index("load_dim") > order.index("dq")
+
+
+def test_cycle_is_rejected_before_anything_runs():
+    order, lock = [], threading.Lock()
+    tasks = [
+        PipelineTask("a", _recording_task(order, lock, "a"), depends_on=("c",)),
+        PipelineTask("b", _recording_task(order, lock, "b"), depends_on=("a",)),
+        PipelineTask("c", _recording_task(order, lock, "c"), depends_on=("b",)),
+        PipelineTask("d", _recording_task(order, lock, "d")),
+    ]
+    with pytest.raises(ValueError, match="cycle"):
+        run_pipeline_dag(tasks, dry_run=True)
+    assert order == []
+
+
+def test_unknown_dependency_and_duplicate_names_are_rejected():
+    with pytest.raises(ValueError, match="unknown task"):
+        run_pipeline_dag([PipelineTask("a", lambda cursor: None, depends_on=("missing",))], dry_run=True)
+    with pytest.raises(ValueError, match="Duplicate"):
+        run_pipeline_dag([PipelineTask("a", lambda cursor: None), PipelineTask("a", lambda cursor: None)], dry_run=True)
+
+
+def test_failure_skips_only_transitive_dependents():
+    order, lock = [], threading.Lock()
+    tasks = [
+        PipelineTask("load_csv", _recording_task(order, lock, "load_csv", fail=True)),
+        PipelineTask("dq", _recording_task(order, lock, "dq"), depends_on=("load_csv",)),
+        PipelineTask("load_dim", _recording_task(order, lock, "load_dim"), depends_on=("dq",)),
+        # Independent branch, including a step that only becomes ready after the failure
+        PipelineTask("load_json", _recording_task(order, lock, "load_json")),
+        PipelineTask("export", _recording_task(order, lock, "export"), depends_on=("load_json",)),
+    ]
+    with pytest.raises(RuntimeError, match="load_csv failed"):
+        run_pipeline_dag(tasks, dry_run=True, max_workers=1)
+
+    assert "dq" not in order and "load_dim" not in order
+    assert order.index("export") > order.index("load_json")
+
+
+def test_failure_logs_failed_and_skipped_steps(caplog):
+    tasks = [
+        PipelineTask("a", _recording_task([], threading.Lock(), "a", fail=True)),
+        PipelineTask("b", lambda cursor: None, depends_on=("a",)),
+        PipelineTask("c", lambda cursor: None, depends_on=("b",)),
+        PipelineTask("d", lambda cursor: None),
+    ]
+    with caplog.at_level("INFO"), pytest.raises(RuntimeError):
+        run_pipeline_dag(tasks, dry_run=True)
+
+    assert "Step a failed: a failed" in caplog.text
+    assert "Step b skipped (blocked by: a)" in caplog.text
+    assert "Step c skipped (blocked by: b)" in caplog.text
+    assert "Step d finished" in caplog.text
+    assert "a=failed, b=skipped, c=skipped" in caplog.text
+
+
+def test_dry_run_cursor_shapes_select_and_merge_results():
+    cursor = DryRunCursor("t")
+    cursor.execute("SELECT COUNT(*), MAX(x) FROM t")
+    assert cursor.fetchone() == (0, 0)
+    cursor.execute("MERGE INTO t USING s ON t.id = s.id WHEN MATCHED THEN DELETE")
+    assert cursor.fetchone() == (0, 0, 0)
+    cursor.execute("DELETE FROM t")
+    assert cursor.fetchone() is None
+
+
+def test_pool_covers_every_concurrent_load_and_its_copy_groups():
+    from main import COPY_STEPS, build_pipeline_tasks, pipeline_pool_size
+
+    pool = object()
+    copying = [task.name for task in build_pipeline_tasks(connection_pool=pool)
+               if getattr(task.func, "keywords", {}).get("connection_pool") is pool]
+    assert tuple(copying) == COPY_STEPS
+
+    # load_csv and load_json together hold 2 x (1 + 4) connections while 2 more steps can run
+    assert pipeline_pool_size(max_workers=4, copy_parallelism=4) == 12
+    assert pipeline_pool_size(max_workers=1, copy_parallelism=4) == 5
@@ -0,0 +1,51 @@
+# tests/test_transformations.py
+import json
+
+import pandas as pd
+import pytest
+
+from data_ingestion import load_json
+from local_backend import LOCAL_STAGES, connect_local
+from transformations import FACT_WATERMARK, load_fact_click_events
+from watermarks import get_high_watermark
+
+
+def _events(prefix, start, count):
+    return [{"event_id": f"{prefix}{i}", "timestamp": (start + pd.Timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+             "user_id": i, "event_type": "click", "page_url": "https://www.example.com/", "duration_ms": 10}
+            for i in range(count)]
+
+
+@pytest.fixture
+def load(tmp_path):
+    stage_dir = tmp_path / "clickstream"
+    stage_dir.mkdir()
+    stages = dict(LOCAL_STAGES, my_json_stage={"path": str(stage_dir), "extension": ".json"})
+    cursor = connect_local(str(tmp_path / "pipeline.db"), stages=stages).cursor()
+
+    def load_file(name, events):
+        (stage_dir / name).write_text(json.dumps(events))
+        load_json(cursor)
+        load_fact_click_events(cursor)
+        cursor.execute("SELECT event_id FROM fact_click_events ORDER BY event_id")
+        return [row[0] for row in cursor.fetchall()]
+
+    return cursor, load_file
+
+
+def test_late_file_is_merged_however_old_its_events_are(load):
+    cursor, load_file = load
+    today = pd.Timestamp.now(tz="UTC").floor("h")
+    assert load_file("today.json", _events("t", today - pd.Timedelta(hours=2), 2)) == ["t0", "t1"]
+
+    # Far older than the 48h lookback, but loaded after the last fact run
+    assert load_file("late.json", _events("l", today - pd.Timedelta(days=30), 2)) == ["l0", "l1", "t0", "t1"]
+
+
+def test_future_dated_event_does_not_move_the_watermark_past_now(load):
+    cursor, load_file = load
+    today = pd.Timestamp.now(tz="UTC").floor("h")
+    load_file("future.json", _events("f", today + pd.Timedelta(days=365), 1))
+    assert pd.Timestamp(get_high_watermark(cursor, FACT_WATERMARK), tz="UTC") <= pd.Timestamp.now(tz="UTC")
+
+    assert load_file("today.json", _events("t", today, 1)) == ["f0", "t0"]
@@ -0,0 +1,169 @@
+# tests/test_utils.py
+import json
+import logging
+import sqlite3
+import time
+
+import pytest
+
+from local_backend import connect_local
+from utils import ConnectionPool, SnowflakeLogHandler
+
+
+class FakeConnection:
+    """Minimal DB-API connection whose health check can be made to fail."""
+
+    def __init__(self, number):
+        self.number = number
+        self.broken = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn.broken:
+            raise sqlite3.OperationalError("connection reset")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+def _factory():
+    created = []
+
+    def connect():
+        created.append(FakeConnection(len(created)))
+        return created[-1]
+    return connect, created
+
+
+def test_pool_reuses_released_connections():
+    connect, created = _factory()
+    pool = ConnectionPool(connect, max_size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert second is first
+    assert len(created) == 1
+    metrics = pool.metrics()
+    assert metrics["checkouts"] == 2 and metrics["connections_created"] == 1 and metrics["idle"] == 1
+
+
+def test_pool_checkout_times_out_when_saturated():
+    connect, _ = _factory()
+    pool = ConnectionPool(connect, max_size=1, checkout_timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    pool.release(held)
+    assert pool.acquire() is held
+
+
+def test_pool_discards_connections_failing_the_health_check():
+    connect, created = _factory()
+    pool = ConnectionPool(connect, max_size=1)
+    with pool.connection() as conn:
+        pass
+    conn.broken = True
+
+    with pool.connection() as replacement:
+        assert replacement is not conn
+    assert conn.closed
+    assert len(created) == 2
+    assert pool.metrics()["failed_health_checks"] == 1
+
+
+def test_pool_evicts_idle_connections():
+    connect, created = _factory()
+    pool = ConnectionPool(connect, max_size=2, max_idle_seconds=0.01)
+    with pool.connection() as conn:
+        pass
+    time.sleep(0.05)
+
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert conn.closed
+    assert pool.metrics()["connections_evicted"] == 1
+
+
+def test_pool_rolls_back_and_keeps_connection_on_step_error():
+    connect, created = _factory()
+    pool = ConnectionPool(connect, max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("step failed")
+
+    assert conn.rollbacks == 1 and not conn.closed
+    with pool.connection() as again:
+        assert again is conn
+
+
+def test_pool_close_refuses_checkouts():
+    connect, created = _factory()
+    pool = ConnectionPool(connect, max_size=1)
+    with pool.connection():
+        pass
+    pool.close()
+
+    assert created[0].closed
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+
+def _record(message, step_name="load_csv", records_loaded=None):
+    record = logging.LogRecord("pipeline.ingestion_logs", logging.INFO, __file__, 0, message, None, None)
+    record.step_name = step_name
+    record.records_loaded = records_loaded
+    return record
+
+
+def test_log_handler_writes_batches_to_ingestion_logs(tmp_path):
+    db_path = str(tmp_path / "logs.db")
+    handler = SnowflakeLogHandler(lambda: connect_local(db_path), batch_size=10, flush_interval=60,
+                                  fallback_path=str(tmp_path / "fallback.jsonl"))
+    for i in range(3):
+        handler.emit(_record(f"message {i}", records_loaded=i))
+    handler.flush()
+    handler.close()
+
+    rows = sqlite3.connect(db_path).execute(
+        "SELECT step_name, message, records_loaded FROM ingestion_logs ORDER BY log_id").fetchall()
+    assert rows == [("load_csv", "message 0", 0), ("load_csv", "message 1", 1), ("load_csv", "message 2", 2)]
+    assert not (tmp_path / "fallback.jsonl").exists()
+
+
+def test_log_handler_spills_to_fallback_file_when_insert_fails(tmp_path):
+    def unavailable():
+        raise sqlite3.OperationalError("warehouse unavailable")
+
+    fallback_path = tmp_path / "logs" / "fallback.jsonl"
+    handler = SnowflakeLogHandler(unavailable, batch_size=10, flush_interval=60, fallback_path=str(fallback_path))
+    handler.emit(_record("first", records_loaded=5))
+    handler.emit(_record("second", step_name="load_json"))
+    handler.close()
+
+    rows = [json.loads(line) for line in fallback_path.read_text(encoding="utf-8").splitlines()]
+    assert [(row["step_name"], row["message"], row["records_loaded"]) for row in rows] == [
+        ("load_csv", "first", 5), ("load_json", "second", None)]
+    assert all(row["log_level"] == "INFO" for row in rows)